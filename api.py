@@ -1,18 +1,127 @@
 import sys
 import os
+import time
+import asyncio
 import uvicorn
 import pandas as pd
 import numpy as np
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional
+from sqlalchemy import text
 
 sys.path.append(os.getcwd())
 from models.coach import LoLCoach
-from database import get_engine
+from models.registry import POINTERS, RegistryWatcher, ShadowStats, load_bundle, list_versions, get_pointer, read_manifest
+from models.coach_cache import ensure_coach_cache_table, get_or_compute_analyses_async
+from models.predictor import ensure_prediction_columns
+from models.explainability import format_attribution
+from models.monitoring import monitor_report
+from models.ranking import ensure_ranking_table, read_ranking, read_friends_ranking, format_ranking
+from etl.players import PLAYER_TABLE, ensure_player_table, search_players, resolve_player, resolve_players, split_riot_id, normalize_search_key
+from etl.versions import GLOBAL_SCOPE, RANKING_SCOPE, PLAYERS_SCOPE, ensure_version_table, read_versions
+from database import get_async_engine, dispose_async_engine
+from response_cache import ResponseCache, etag_matches, server_timing
+from profiling import Timer, process_memory_mb, child_pids
+from config import settings
 
-app = FastAPI(title="Analytics do Vale API", version="16.7.0") 
-coach = LoLCoach()
+# Endpoints assíncronos: o I/O vai pelo pool asyncpg (database.get_async_engine) e só o
+# trabalho de CPU (coach, montagem do histórico) ocupa o threadpool.
+_player_state = None
+
+async def _ensure_tables():
+    """DDL das tabelas auxiliares (síncrona, 1x por processo) numa thread, fora do event loop."""
+    global _player_state
+    if _player_state is None:
+        def _create():
+            ensure_ranking_table(); ensure_coach_cache_table(); ensure_version_table(); ensure_prediction_columns()
+            return ensure_player_table()
+        _player_state = await run_in_threadpool(_create)
+    return _player_state
+
+# --- MODELOS EM PRODUÇÃO (registro com troca a quente) ---
+# Cada requisição pega a referência de `_models['current']` uma vez; o watcher só troca a
+# referência depois que o bundle novo terminou de carregar (requisições em voo seguem no antigo).
+# A carga inicial acontece no lifespan (não no import), em paralelo com a DDL das tabelas.
+_models = {'current': None, 'shadow': None, 'shadow_stats': None, 'loaded_at': None}
+# No modo pré-fork (serve.py) o master carrega antes do fork e é dono do watcher: os workers
+# herdam o bundle copy-on-write e são reciclados quando um ponteiro muda.
+_prefork = {'master_pid': None}
+_shadow_slot = asyncio.Semaphore(1)  # No máximo 1 shadow scoring por vez; excedentes são pulados
+_background = set()
+
+def _on_registry_change(pointer, version):
+    """Chamado na thread do watcher: carrega tudo e só então troca a referência."""
+    if pointer == 'CURRENT':
+        _models['current'] = LoLCoach(load_bundle(version))
+        _models['loaded_at'] = time.time()
+        response_cache.clear()  # Históricos em cache foram calculados com o modelo anterior
+    else:
+        _models['shadow'] = LoLCoach(load_bundle(version)) if version else None
+        _models['shadow_stats'] = ShadowStats(version) if version else None
+
+def preload_models():
+    """Carga no master do modo pré-fork (antes do fork); os workers não recarregam no lifespan."""
+    for pointer in POINTERS:
+        version = get_pointer(pointer)
+        if pointer == 'CURRENT' or version: _on_registry_change(pointer, version)
+    _prefork['master_pid'] = os.getpid()
+
+async def _startup_tables():
+    try: await _ensure_tables()
+    except Exception as e: print(f"⚠️ Tabelas auxiliares não verificadas no startup: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    watcher = None
+    if _prefork['master_pid']:  # Worker pré-fork: bundle herdado do master
+        await _startup_tables()
+    else:
+        watcher = RegistryWatcher(_on_registry_change)
+        await asyncio.gather(_startup_tables(), run_in_threadpool(_on_registry_change, 'CURRENT', watcher.seen['CURRENT']))
+        if watcher.seen['SHADOW']: await run_in_threadpool(_on_registry_change, 'SHADOW', watcher.seen['SHADOW'])
+        app.state.registry_watcher = watcher.start()
+    yield
+    if watcher: watcher.stop()
+    await dispose_async_engine()
+
+app = FastAPI(title="Analytics do Vale API", version="16.7.0", lifespan=lifespan) 
+
+# --- CACHE DE RESPOSTAS ---
+# O Streamlit reexecuta o script a cada clique; respostas iguais saem da memória (ou viram 304).
+CACHE_DEFAULTS = {'max_entries': 512, 'max_mb': 64, 'version_poll_s': 1.0,
+                  'ttl': {'history': 300, 'ranking': 120, 'search': 60}}
+CACHE_CFG = {**CACHE_DEFAULTS, **((settings.get('api') or {}).get('cache') or {})}
+CACHE_TTL = {**CACHE_DEFAULTS['ttl'], **(CACHE_CFG.get('ttl') or {})}
+response_cache = ResponseCache(max_entries=CACHE_CFG['max_entries'], max_bytes=int(CACHE_CFG['max_mb'] * 1024 * 1024))
+_versions_seen = {}  # escopo -> (versão, instante da leitura)
+
+async def _current_versions(scopes):
+    """Versões atuais dos escopos; relê do banco no máximo a cada `version_poll_s` segundos."""
+    now = time.monotonic()
+    stale = [s for s in scopes if s not in _versions_seen or now - _versions_seen[s][1] > CACHE_CFG['version_poll_s']]
+    if stale:
+        async with get_async_engine().connect() as conn:
+            fresh = await conn.run_sync(read_versions, stale)
+        _versions_seen.update({s: (v, now) for s, v in fresh.items()})
+    return {s: _versions_seen[s][0] for s in scopes}
+
+async def _cache_lookup(key):
+    """Entrada do cache se ainda estiver no prazo E nenhum dos seus escopos tiver versão nova."""
+    entry = response_cache.get(key)
+    if entry is not None and await _current_versions(list(entry.versions)) == entry.versions: return entry
+    if entry is not None: response_cache.invalidate(key)
+    return None
+
+def _cached_response(request, entry, status, timings=None):
+    """Corpo do cache + ETag; tempos por etapa só no cabeçalho (fora do corpo e do ETag)."""
+    headers = {'ETag': entry.etag, 'Cache-Control': 'no-cache', 'X-Cache': status}
+    if timings: headers['Server-Timing'] = server_timing(timings)
+    if etag_matches(request.headers.get('if-none-match'), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type='application/json', headers=headers)
 
 # --- MODELOS ---
 class MatchSummary(BaseModel):
@@ -62,243 +171,322 @@ class RankingEntry(BaseModel):
     avg_ai_score: float
     ranking_score: float
 
+class PlayerSearchResult(BaseModel):
+    puuid: str
+    riot_id: str
+    game_name: Optional[str] = None
+    tag_line: Optional[str] = None
+    region: Optional[str] = None
+    last_seen_ts: Optional[int] = None
+
 class FriendsList(BaseModel):
     summoners: List[str]
 
 # --- ENDPOINTS ---
 @app.get("/")
-def health_check(): return {"status": "online", "version": "16.7.0"}
+async def health_check(): return {"status": "online", "version": "16.7.0"}
+
+@app.get("/cache/stats")
+async def cache_stats(): return response_cache.stats()
+
+@app.get("/models")
+async def models_status(request: Request):
+    """Versões carregadas (produção e sombra), ponteiros do registro e comparação do shadow scoring."""
+    current, shadow, stats = _models['current'], _models['shadow'], _models['shadow_stats']
+    watcher = getattr(request.app.state, 'registry_watcher', None)
+    versions = await run_in_threadpool(list_versions)
+    manifest = await run_in_threadpool(read_manifest, current.bundle_version) if current.bundle_version in versions else None
+    return {
+        'current': {'version': current.bundle_version, 'coach_version': current.model_version, 'formats': current.bundle_formats,
+                    'loaded_at': _models['loaded_at'], 'training': (manifest or {}).get('training')},
+        'shadow': {'version': shadow.bundle_version, 'coach_version': shadow.model_version,
+                   'comparison': stats.summary() if stats else None} if shadow else None,
+        'registry': {'versions': versions, 'CURRENT': get_pointer('CURRENT'), 'SHADOW': get_pointer('SHADOW')},
+        'watcher': {'poll_s': watcher.poll_s, 'last_check': watcher.last_check, 'last_error': watcher.last_error} if watcher else None,
+    }
+
+def _frame_records(df):
+    """DataFrame -> lista de dicts serializável (NaN -> null, datas -> ISO)."""
+    df = df.assign(bucket=df['bucket'].astype(str))
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+@app.get("/monitoring")
+async def monitoring_status(version: Optional[str] = None, window: Optional[str] = None):
+    """Brier/ECE por janela e segmento e PSI das features, a partir dos agregados do monitor (O(bins))."""
+    try:
+        report = await run_in_threadpool(monitor_report, version, window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'version': report['version'], 'window': report['window'], 'alerts': report['alerts'],
+            'metrics': _frame_records(report['metrics']), 'drift': _frame_records(report['drift'])}
+
+@app.get("/workers")
+async def workers_status():
+    """Memória por processo (RSS/PSS/shared/private, MB). No pré-fork, master + todos os workers."""
+    master = _prefork['master_pid']
+    pids = [master] + child_pids(master) if master else [os.getpid()]
+    processes = [{'pid': pid, 'role': 'master' if pid == master else 'worker', 'self': pid == os.getpid(),
+                  **process_memory_mb(pid)} for pid in pids]
+    pss = [p['pss'] for p in processes if p['pss'] is not None]
+    return {'mode': 'prefork' if master else 'single', 'workers': sum(p['role'] == 'worker' for p in processes),
+            'processes': processes, 'total_pss_mb': round(sum(pss), 1) if pss else None}
+
+async def _shadow_score(shadow, stats, matches_df, puuid, served):
+    """Roda a versão SHADOW nas mesmas partidas e só registra a diferença: nunca altera a resposta."""
+    if _shadow_slot.locked():
+        stats.skipped += 1
+        return
+    async with _shadow_slot:
+        try:
+            stats.record(served, await run_in_threadpool(shadow.analyze_matches, matches_df, puuid))
+        except Exception as e:
+            stats.fail(e)
+
+def _resolve_player(conn, name, region=None):
+    """Nome (ou Nome#TAG) -> (puuid, nome) pelo diretório indexado; tabela fato só se o diretório estiver vazio."""
+    player = resolve_player(conn, name, region)
+    if player is not None: return player
+    if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {PLAYER_TABLE})")).scalar(): return None
+    row = conn.execute(text("SELECT puuid, summoner_name FROM fact_match_player_performance WHERE summoner_name ILIKE :name LIMIT 1"),
+                       {"name": split_riot_id(name)[0]}).first()
+    return (row[0], row[1]) if row else None
+
+_search_adapter = TypeAdapter(List[PlayerSearchResult])
+
+@app.get("/players/search", response_model=List[PlayerSearchResult])
+async def search_players_endpoint(request: Request, q: str, limit: int = 10, region: Optional[str] = None):
+    """Autocomplete de jogadores (prefixo + trigramas no dim_player)."""
+    if len(q.strip()) < 2: return []
+    limit = min(max(limit, 1), 25)
+    key = ('search', normalize_search_key(q), limit, (region or '').upper())
+    try:
+        entry = await _cache_lookup(key)
+        if entry is not None: return _cached_response(request, entry, 'HIT')
+
+        state = await _ensure_tables()
+        versions = await _current_versions([GLOBAL_SCOPE, PLAYERS_SCOPE])  # Lidas ANTES dos dados
+        async with get_async_engine().connect() as conn:
+            rows = await conn.run_sync(search_players, q, limit=limit, region=region, use_trgm=state['trgm'])
+        results = [{**r, 'riot_id': f"{r['game_name']}#{r['tag_line']}" if r['tag_line'] else r['game_name']} for r in rows]
+        entry = response_cache.put(key, _search_adapter.dump_json(_search_adapter.validate_python(results)), versions, CACHE_TTL['search'])
+        return _cached_response(request, entry, 'MISS')
+    except Exception as e:
+        print(f"Erro na busca de jogadores: {e}")
+        return []
 
 @app.get("/player/{region}/{name}/history", response_model=PlayerHistoryResponse)
-def get_player_history(region: str, name: str, limit: int = 10):
-    engine = get_engine()
+async def get_player_history(request: Request, region: str, name: str, limit: int = 10):
+    async_engine = get_async_engine()
+    coach, shadow, shadow_stats = _models['current'], _models['shadow'], _models['shadow_stats']
+    timings = {}
+    key = ('history', region.upper(), name.strip().lower(), limit)
     try:
-        query_user = f"SELECT DISTINCT puuid, summoner_name FROM fact_match_player_performance WHERE summoner_name ILIKE '{name}' LIMIT 1"
-        with engine.connect() as conn: user_df = pd.read_sql(query_user, conn)
-        
-        if user_df.empty: raise HTTPException(status_code=404, detail="Jogador não encontrado.")
-        puuid = user_df.iloc[0]['puuid']
-        real_name = user_df.iloc[0]['summoner_name']
+        entry = await _cache_lookup(key)
+        if entry is not None: return _cached_response(request, entry, 'HIT')
 
-        query_match_ids = f"SELECT match_id, game_start_timestamp FROM fact_match_player_performance WHERE puuid = '{puuid}' ORDER BY game_start_timestamp DESC LIMIT 30"
-        with engine.connect() as conn: match_ids_df = pd.read_sql(query_match_ids, conn)
+        await _ensure_tables()
+        with Timer() as t_total:
+            # 1 conexão do pool assíncrono, 3 consultas; nenhuma thread presa esperando o banco
+            async with async_engine.connect() as conn:
+                with Timer() as t:
+                    player = await conn.run_sync(_resolve_player, name, region)
+                timings['db_user_ms'] = round(t.seconds * 1000, 1)
 
-        history = []; scores = []; archetypes = []; risks = []; scores_win = []; scores_loss = []; risks_win = []; risks_loss = []
+                if player is None: raise HTTPException(status_code=404, detail="Jogador não encontrado.")
+                puuid, real_name = player
+                versions = await _current_versions([GLOBAL_SCOPE, puuid])  # Lidas ANTES das partidas
 
-        for idx, row_match in match_ids_df.iterrows():
-            m_id = row_match['match_id']
-            query_full_match = f"SELECT * FROM fact_match_player_performance WHERE match_id = '{m_id}'"
-            with engine.connect() as conn: full_match_df = pd.read_sql(query_full_match, conn)
-            
-            analysis = coach.analyze_match_context(full_match_df, puuid)
-            
-            if analysis:
-                target_row = full_match_df[full_match_df['puuid'] == puuid].iloc[0]
-                
-                # Stats Calc
-                raw_duration = target_row.get('game_duration_sec', target_row.get('game_duration', 1800))
-                duration_min = max(1, raw_duration / 60)
-                if 'total_cs' in target_row: total_cs = target_row['total_cs']
-                else: total_cs = target_row.get('total_minions_killed', 0) + target_row.get('neutral_minions_killed', 0)
-                cs_min_real = round(total_cs / duration_min, 1)
-
-                k = int(target_row.get('kills', 0)); d = int(target_row.get('deaths', 0)); a = int(target_row.get('assists', 0))
-                kda_ratio = round((k + a) / max(1, d), 2)
-                kda_str = f"{k}/{d}/{a}"
-                my_team_id = target_row['team_id']
-                team_stats = full_match_df[full_match_df['team_id'] == my_team_id]
-                total_team_kills = team_stats['kills'].sum()
-                kp_percent = int(((k + a) / max(1, total_team_kills)) * 100)
-
-                sc = analysis['score']
-                rk = analysis.get('risk_label', 'Normal') # Fallback seguro
-                scores.append(sc); archetypes.append(analysis['archetype_label']); risks.append(rk)
-                
-                if target_row['win']: scores_win.append(sc); risks_win.append(rk)
-                else: scores_loss.append(sc); risks_loss.append(rk)
-                
-                if idx < limit:
-                    history.append({
-                        "match_id": m_id,
-                        "champion": target_row['champion_name'],
-                        "role": target_row['team_position'],
-                        "win": bool(target_row['win']),
-                        "ai_score": sc,
-                        "archetype": analysis['archetype_label'],
-                        "verdict_short": analysis['verdict'],
-                        "match_tag": analysis['match_tag'],
-                        "date": str(row_match['game_start_timestamp']),
-                        "extra_context": { 
-                            "duration": analysis.get('duration_label', '-'),
-                            "type": analysis.get('game_type_label', '-'),
-                            "risk": rk,
-                            "opportunity": analysis.get('opportunity', {}),
-                            "factors": analysis.get('factors', {}),
-                            "timeline": analysis['timeline'],
-                            "feeding_cause": analysis.get('feeding_cause'),
-                            "context": analysis.get('context', {}),
-                            "lane_verdict": analysis.get('context', {}).get('lane_verdict', '-'),
-                            "win_prob": analysis.get('ai_prediction', 50),
-                            "cs_min": cs_min_real,
-                            "kda_str": kda_str,
-                            "kda_ratio": kda_ratio,
-                            "kp": kp_percent
-                        }
-                    })
-
-        tags = []; comp_stats = PlayerComparisonStats(avg_score_win=0, avg_score_loss=0, risk_win="-", risk_loss="-"); percentile_label = "N/A"
-        narrative = "Dados insuficientes."
-        confidence_label = "Baixa"
-
-        if scores:
-            avg_s = np.mean(scores); std_s = np.std(scores)
-            dom_arch = max(set(archetypes), key=archetypes.count) if archetypes else "Flexível"
-            if std_s < 10: consist = "🎯 Alta (Robô)"
-            elif std_s < 20: consist = "⚖️ Normal"
-            else: consist = "🎢 Volátil"
-
-            if avg_s > 80: percentile_label = "Top 5% (Elite)"
-            elif avg_s > 70: percentile_label = "Top 20% (Sólido)"
-            elif avg_s > 50: percentile_label = "Acima da Média"
-            else: percentile_label = "Abaixo da Média"
-
-            high_risk_count = sum(1 for r in risks if "Crítico" in r or "Alta" in r)
-            if high_risk_count >= len(risks) * 0.3: tags.append("⚠️ Padrão de Alto Risco")
-            if len(scores) >= 3 and np.mean(scores[:3]) < 40: tags.append("❄️ Sequência Fria")
-            
-            s_win = np.mean(scores_win) if scores_win else 0
-            s_loss = np.mean(scores_loss) if scores_loss else 0
-            r_win = max(set(risks_win), key=risks_win.count) if risks_win else "-"
-            r_loss = max(set(risks_loss), key=risks_loss.count) if risks_loss else "-"
-            
-            comp_stats = PlayerComparisonStats(avg_score_win=round(float(s_win), 1), avg_score_loss=round(float(s_loss), 1), risk_win=r_win.split(" ")[1] if " " in r_win else r_win, risk_loss=r_loss.split(" ")[1] if " " in r_loss else r_loss)
-            
-            n_games = len(scores)
-            if n_games >= 20: confidence_label = "Alta (Verificada)"
-            elif n_games >= 10: confidence_label = "Média"
-            
-            trend = "estável"
-            if len(scores) >= 5:
-                recent = np.mean(scores[:5]); old = np.mean(scores[5:]) if len(scores) > 5 else recent
-                if recent > old + 5: trend = "em ascensão"
-                elif recent < old - 5: trend = "em queda recente"
-            narrative = f"Nas últimas {n_games} partidas, seu impacto foi **{trend}**. Seu estilo principal é **{dom_arch}**."
+                with Timer() as t:
+                    query_match_ids = text("SELECT match_id, game_start_timestamp FROM fact_match_player_performance WHERE puuid = :puuid ORDER BY game_start_timestamp DESC LIMIT 30")
+                    match_rows = (await conn.execute(query_match_ids, {"puuid": puuid})).mappings().all()
+
+                    # Todas as partidas numa única ida ao banco (o coach precisa de DataFrame)
+                    query_matches = text("SELECT * FROM fact_match_player_performance WHERE match_id = ANY(:ids)")
+                    result = await conn.execute(query_matches, {"ids": [r['match_id'] for r in match_rows]})
+                    all_matches_df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
 
-        else:
-            avg_s = 0; consist = "-"; dom_arch = "-"; tags = []
+                    # Atribuições gravadas junto da predição (busca pela PK; nenhum trabalho de modelo aqui)
+                    query_attr = text("""SELECT match_id, win_probability, attr_features, attr_values, attr_base
+                                         FROM fact_match_predictions WHERE puuid = :puuid AND match_id = ANY(:ids)""")
+                    attributions = {r['match_id']: format_attribution(r['attr_features'], r['attr_values'], r['attr_base'], r['win_probability'])
+                                    for r in (await conn.execute(query_attr, {"puuid": puuid, "ids": [r['match_id'] for r in match_rows][:limit]})).mappings()}
+                timings['db_matches_ms'] = round(t.seconds * 1000, 1)
 
-        profile = PlayerProfileStats(
-            dominant_archetype=dom_arch, avg_score=round(float(avg_s), 1), score_percentile=percentile_label,
-            consistency=consist, total_games=len(match_ids_df), tags=tags, comparison=comp_stats,
-            analysis_confidence=confidence_label, narrative_summary=narrative
-        )
+            # Cache persistente primeiro; só as partidas ausentes passam pelo coach (em lote, numa thread)
+            analyses = await get_or_compute_analyses_async(coach, async_engine, all_matches_df, puuid, timings) if not all_matches_df.empty else {}
+            if shadow is not None and analyses:
+                task = asyncio.create_task(_shadow_score(shadow, shadow_stats, all_matches_df, puuid, analyses))
+                _background.add(task); task.add_done_callback(_background.discard)
 
-        return {"summoner_name": real_name, "profile": profile, "matches": history}
+            with Timer() as t_assemble:
+                def _assemble():
+                    matches_by_id = {m_id: g for m_id, g in all_matches_df.groupby('match_id', sort=False)}
+                    return _assemble_history(real_name, puuid, match_rows, matches_by_id, analyses, limit, attributions)
+                response = await run_in_threadpool(_assemble)
+            timings['assemble_ms'] = round(t_assemble.seconds * 1000, 1)
+        timings['total_ms'] = round(t_total.seconds * 1000, 1)
+        timings['matches'] = len(match_rows)
+        # Tempos por etapa no Server-Timing: no corpo mudariam o ETag a cada recálculo (sem 304)
+        body = PlayerHistoryResponse.model_validate(response).model_dump_json().encode()
+        return _cached_response(request, response_cache.put(key, body, versions, CACHE_TTL['history']), 'MISS', timings)
 
+    except HTTPException: raise
     except Exception as e: 
         print(f"Erro Fatal: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _assemble_history(real_name, puuid, match_rows, matches_by_id, analyses, limit, attributions=None):
+    """Monta o histórico e o perfil a partir das análises já calculadas (sem I/O)."""
+    history = []; scores = []; archetypes = []; risks = []; scores_win = []; scores_loss = []; risks_win = []; risks_loss = []
+
+    for idx, row_match in enumerate(match_rows):
+        m_id = row_match['match_id']
+        full_match_df = matches_by_id.get(m_id)
+        analysis = analyses.get(m_id)
+        
+        if analysis:
+            target_row = full_match_df[full_match_df['puuid'] == puuid].iloc[0]
+            
+            # Stats Calc
+            raw_duration = target_row.get('game_duration_sec', target_row.get('game_duration', 1800))
+            duration_min = max(1, raw_duration / 60)
+            if 'total_cs' in target_row: total_cs = target_row['total_cs']
+            else: total_cs = target_row.get('total_minions_killed', 0) + target_row.get('neutral_minions_killed', 0)
+            cs_min_real = round(total_cs / duration_min, 1)
+
+            k = int(target_row.get('kills', 0)); d = int(target_row.get('deaths', 0)); a = int(target_row.get('assists', 0))
+            kda_ratio = round((k + a) / max(1, d), 2)
+            kda_str = f"{k}/{d}/{a}"
+            my_team_id = target_row['team_id']
+            team_stats = full_match_df[full_match_df['team_id'] == my_team_id]
+            total_team_kills = team_stats['kills'].sum()
+            kp_percent = int(((k + a) / max(1, total_team_kills)) * 100)
+
+            sc = analysis['score']
+            rk = analysis.get('risk_label', 'Normal') # Fallback seguro
+            scores.append(sc); archetypes.append(analysis['archetype_label']); risks.append(rk)
+            
+            if target_row['win']: scores_win.append(sc); risks_win.append(rk)
+            else: scores_loss.append(sc); risks_loss.append(rk)
+            
+            if idx < limit:
+                history.append({
+                    "match_id": m_id,
+                    "champion": target_row['champion_name'],
+                    "role": target_row['team_position'],
+                    "win": bool(target_row['win']),
+                    "ai_score": sc,
+                    "archetype": analysis['archetype_label'],
+                    "verdict_short": analysis['verdict'],
+                    "match_tag": analysis['match_tag'],
+                    "date": str(row_match['game_start_timestamp']),
+                    "extra_context": { 
+                        "duration": analysis.get('duration_label', '-'),
+                        "type": analysis.get('game_type_label', '-'),
+                        "risk": rk,
+                        "opportunity": analysis.get('opportunity', {}),
+                        "factors": analysis.get('factors', {}),
+                        "timeline": analysis['timeline'],
+                        "feeding_cause": analysis.get('feeding_cause'),
+                        "context": analysis.get('context', {}),
+                        "lane_verdict": analysis.get('context', {}).get('lane_verdict', '-'),
+                        "win_prob": analysis.get('ai_prediction', 50),
+                        "cs_min": cs_min_real,
+                        "kda_str": kda_str,
+                        "kda_ratio": kda_ratio,
+                        "kp": kp_percent,
+                        "attribution": (attributions or {}).get(m_id)
+                    }
+                })
+
+    tags = []; comp_stats = PlayerComparisonStats(avg_score_win=0, avg_score_loss=0, risk_win="-", risk_loss="-"); percentile_label = "N/A"
+    narrative = "Dados insuficientes."
+    confidence_label = "Baixa"
+
+    if scores:
+        avg_s = np.mean(scores); std_s = np.std(scores)
+        dom_arch = max(set(archetypes), key=archetypes.count) if archetypes else "Flexível"
+        if std_s < 10: consist = "🎯 Alta (Robô)"
+        elif std_s < 20: consist = "⚖️ Normal"
+        else: consist = "🎢 Volátil"
+
+        if avg_s > 80: percentile_label = "Top 5% (Elite)"
+        elif avg_s > 70: percentile_label = "Top 20% (Sólido)"
+        elif avg_s > 50: percentile_label = "Acima da Média"
+        else: percentile_label = "Abaixo da Média"
+
+        high_risk_count = sum(1 for r in risks if "Crítico" in r or "Alta" in r)
+        if high_risk_count >= len(risks) * 0.3: tags.append("⚠️ Padrão de Alto Risco")
+        if len(scores) >= 3 and np.mean(scores[:3]) < 40: tags.append("❄️ Sequência Fria")
+        
+        s_win = np.mean(scores_win) if scores_win else 0
+        s_loss = np.mean(scores_loss) if scores_loss else 0
+        r_win = max(set(risks_win), key=risks_win.count) if risks_win else "-"
+        r_loss = max(set(risks_loss), key=risks_loss.count) if risks_loss else "-"
+        
+        comp_stats = PlayerComparisonStats(avg_score_win=round(float(s_win), 1), avg_score_loss=round(float(s_loss), 1), risk_win=r_win.split(" ")[1] if " " in r_win else r_win, risk_loss=r_loss.split(" ")[1] if " " in r_loss else r_loss)
+        
+        n_games = len(scores)
+        if n_games >= 20: confidence_label = "Alta (Verificada)"
+        elif n_games >= 10: confidence_label = "Média"
+        
+        trend = "estável"
+        if len(scores) >= 5:
+            recent = np.mean(scores[:5]); old = np.mean(scores[5:]) if len(scores) > 5 else recent
+            if recent > old + 5: trend = "em ascensão"
+            elif recent < old - 5: trend = "em queda recente"
+        narrative = f"Nas últimas {n_games} partidas, seu impacto foi **{trend}**. Seu estilo principal é **{dom_arch}**."
+
+    else:
+        avg_s = 0; consist = "-"; dom_arch = "-"; tags = []
+
+    profile = PlayerProfileStats(
+        dominant_archetype=dom_arch, avg_score=round(float(avg_s), 1), score_percentile=percentile_label,
+        consistency=consist, total_games=len(match_rows), tags=tags, comparison=comp_stats,
+        analysis_confidence=confidence_label, narrative_summary=narrative
+    )
+
+    return {"summoner_name": real_name, "profile": profile, "matches": history}
+
+_ranking_adapter = TypeAdapter(List[RankingEntry])
+
 @app.get("/ranking", response_model=List[RankingEntry])
-def get_ranking(role: Optional[str] = None):
-    engine = get_engine()
-    where_clause = f"WHERE UPPER(p.team_position) = '{role.upper()}'" if role and role != "TODOS" else ""
-    query = f"""
-    SELECT p.summoner_name, COALESCE(p.team_position, 'UNKNOWN') as main_role, COUNT(p.match_id) as games, 
-    AVG(CASE WHEN p.win = true THEN 1 ELSE 0 END) as win_rate, AVG(CAST(pred.ai_score AS FLOAT)) as real_avg_score, 
-    STDDEV(CAST(p.gold_diff_at_15 AS FLOAT)) as volatility_proxy 
-    FROM fact_match_player_performance p
-    LEFT JOIN fact_match_predictions pred ON p.match_id = pred.match_id AND p.puuid = pred.puuid
-    {where_clause} GROUP BY p.summoner_name, p.team_position HAVING COUNT(p.match_id) >= 1 ORDER BY games DESC LIMIT 200
-    """
+async def get_ranking(request: Request, role: Optional[str] = None):
+    role = role.upper() if role and role.upper() != "TODOS" else None
+    key = ('ranking', role)
     try:
-        with engine.connect() as conn: df = pd.read_sql(query, conn)
-        if df.empty: return []
-        ranking_list = []
-        for i, row in df.iterrows():
-            wr = float(row['win_rate']); games = int(row['games']); volatility = float(row['volatility_proxy']) if pd.notnull(row['volatility_proxy']) else 1000
-            db_score = row['real_avg_score']
-            ai_score = float(db_score) if pd.notnull(db_score) and db_score > 0 else min(max(70 + (wr * 20), 0), 100)
-            final_score = (ai_score * 0.6) + (wr * 100 * 0.3) + (np.log1p(games) * 5)
-            if volatility < 800: consist = "🔒 Alta"
-            elif volatility < 1500: consist = "⚖️ Média"
-            else: consist = "🎲 Volátil"
-            if games >= 50: reliab = "🟢 Verificado"
-            elif games >= 20: reliab = "🟡 Moderado"
-            else: reliab = "🔴 Amostra Baixa"
-            if wr >= 0.65: trend = "📈 Subindo"
-            elif wr <= 0.45: trend = "📉 Caindo"
-            else: trend = "➖ Estável"
-            ranking_list.append({"rank": 0,"summoner_name": row['summoner_name'],"region": "KR","main_role": row['main_role'],"consistency_label": consist,"reliability_label": reliab,"trend": trend,"games_played": games,"win_rate": wr,"avg_ai_score": round(ai_score, 1),"ranking_score": round(final_score, 1)})
-        ranking_list.sort(key=lambda x: x['ranking_score'], reverse=True)
-        for idx, item in enumerate(ranking_list): item['rank'] = idx + 1
-        return ranking_list[:50]
-    except: return []
+        entry = await _cache_lookup(key)
+        if entry is not None: return _cached_response(request, entry, 'HIT')
+
+        await _ensure_tables()
+        versions = await _current_versions([GLOBAL_SCOPE, RANKING_SCOPE])
+        # Leitura indexada do rollup (mantido pelo run_predictions), sem GROUP BY na tabela fato
+        async with get_async_engine().connect() as conn:
+            rows = await conn.run_sync(read_ranking, role=role)
+        body = _ranking_adapter.dump_json(_ranking_adapter.validate_python(format_ranking(rows, region="KR")))
+        return _cached_response(request, response_cache.put(key, body, versions, CACHE_TTL['ranking']), 'MISS')
+    except Exception as e:
+        print(f"Erro no ranking: {e}")
+        return []
 
 @app.post("/ranking/friends", response_model=List[RankingEntry])
-def get_custom_ranking(payload: FriendsList):
+async def get_custom_ranking(request: Request, payload: FriendsList):
     """Endpoint dedicado para a Liga Privada (Busca customizada)"""
-    engine = get_engine()
     if not payload.summoners: return []
-    
-    # Sanitiza nomes para SQL e busca independente de maiúscula/minúscula
-    names_clean = [n.lower().strip() for n in payload.summoners]
-    names_sql = "', '".join(names_clean)
-    
-    # Query otimizada: Busca APENAS os amigos, sem limite de Top 200
-    query = f"""
-    SELECT p.summoner_name, COALESCE(p.team_position, 'UNKNOWN') as main_role, COUNT(p.match_id) as games, 
-    AVG(CASE WHEN p.win = true THEN 1 ELSE 0 END) as win_rate, AVG(CAST(pred.ai_score AS FLOAT)) as real_avg_score, 
-    STDDEV(CAST(p.gold_diff_at_15 AS FLOAT)) as volatility_proxy 
-    FROM fact_match_player_performance p
-    LEFT JOIN fact_match_predictions pred ON p.match_id = pred.match_id AND p.puuid = pred.puuid
-    WHERE LOWER(p.summoner_name) IN ('{names_sql}')
-    GROUP BY p.summoner_name, p.team_position 
-    HAVING COUNT(p.match_id) >= 1
-    """
+    key = ('friends', tuple(sorted({n.strip().lower() for n in payload.summoners})))
     
     try:
-        with engine.connect() as conn: df = pd.read_sql(query, conn)
-        if df.empty: return []
-        
-        ranking_list = []
-        for i, row in df.iterrows():
-            # Lógica de Cálculo Idêntica ao Ranking Global
-            wr = float(row['win_rate']); games = int(row['games']); volatility = float(row['volatility_proxy']) if pd.notnull(row['volatility_proxy']) else 1000
-            db_score = row['real_avg_score']
-            ai_score = float(db_score) if pd.notnull(db_score) and db_score > 0 else min(max(70 + (wr * 20), 0), 100)
-            final_score = (ai_score * 0.6) + (wr * 100 * 0.3) + (np.log1p(games) * 5)
-            
-            if volatility < 800: consist = "🔒 Alta"
-            elif volatility < 1500: consist = "⚖️ Média"
-            else: consist = "🎲 Volátil"
-            
-            if games >= 50: reliab = "🟢 Verificado"
-            elif games >= 20: reliab = "🟡 Moderado"
-            else: reliab = "🔴 Amostra Baixa"
-            
-            if wr >= 0.65: trend = "📈 Subindo"
-            elif wr <= 0.45: trend = "📉 Caindo"
-            else: trend = "➖ Estável"
-            
-            ranking_list.append({
-                "rank": 0,
-                "summoner_name": row['summoner_name'],
-                "region": "BR1", # Assumindo BR para lista de amigos
-                "main_role": row['main_role'],
-                "consistency_label": consist,
-                "reliability_label": reliab,
-                "trend": trend,
-                "games_played": games,
-                "win_rate": wr,
-                "avg_ai_score": round(ai_score, 1),
-                "ranking_score": round(final_score, 1)
-            })
-            
-        ranking_list.sort(key=lambda x: x['ranking_score'], reverse=True)
-        for idx, item in enumerate(ranking_list): item['rank'] = idx + 1
-        
-        return ranking_list
+        entry = await _cache_lookup(key)
+        if entry is not None: return _cached_response(request, entry, 'HIT')
+
+        await _ensure_tables()
+        versions = await _current_versions([GLOBAL_SCOPE, RANKING_SCOPE, PLAYERS_SCOPE])
+        # Nomes -> puuids pelo diretório indexado; depois leitura do rollup pela chave primária
+        async with get_async_engine().connect() as conn:
+            puuids = await conn.run_sync(resolve_players, payload.summoners)
+            rows = await conn.run_sync(read_friends_ranking, puuids=puuids, names=payload.summoners)
+        body = _ranking_adapter.dump_json(_ranking_adapter.validate_python(format_ranking(rows, region="BR1"))) # Assumindo BR para lista de amigos
+        return _cached_response(request, response_cache.put(key, body, versions, CACHE_TTL['ranking']), 'MISS')
         
     except Exception as e:
         print(f"Erro no ranking amigos: {e}")
@@ -44,12 +44,25 @@ st.markdown("""
 if 'target_summoner' not in st.session_state: st.session_state.target_summoner = None
 if 'active_match_id' not in st.session_state: st.session_state.active_match_id = None
 
+def _api_get(path, params=None):
+    """GET condicional: reenvia o ETag da última resposta; se a API devolver 304, reaproveita o JSON guardado."""
+    store = st.session_state.setdefault('api_etags', {})
+    key = (path, tuple(sorted((params or {}).items())))
+    cached = store.get(key)
+    r = requests.get(f"{API_URL}{path}", params=params, headers={'If-None-Match': cached[0]} if cached else {})
+    if r.status_code == 304 and cached: return cached[1]
+    data = r.json()
+    if r.ok and r.headers.get('ETag'):
+        if len(store) >= 50: store.pop(next(iter(store)))
+        store[key] = (r.headers['ETag'], data)
+    return data
+
 def get_history(name, region="KR"):
-    try: return requests.get(f"{API_URL}/player/{region}/{name}/history").json()
+    try: return _api_get(f"/player/{region}/{name}/history")
     except: return None
 
 def get_ranking(role="TODOS"):
-    try: return requests.get(f"{API_URL}/ranking", params={"role": role}).json()
+    try: return _api_get("/ranking", params={"role": role})
     except: return []
 
 def render_intensity_dots(level): return "●" * level + "○" * (3 - level)
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import subprocess
+
+sys.path.append(os.getcwd())
+
+# Perfil de inicialização: custo de import de cada módulo e de carga de cada artefato.
+# Cada medição roda num interpretador novo (nada em cache de import), como num cold start.
+
+STARTUP_MODULES = [
+    'config', 'numpy', 'pandas', 'sqlalchemy', 'fastapi', 'sklearn', 'xgboost', 'matplotlib.pyplot',
+    'database', 'features.engine', 'models.registry', 'models.coach', 'models.predictor',
+    'models.trainer', 'models.validation', 'models.explainability', 'api', 'main',
+]
+
+_LOAD_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+from models import registry
+t1 = time.perf_counter()
+cfg = registry.settings['model'].setdefault('registry', {{}})
+cfg['native'] = {native}
+bundle = registry.load_bundle(parts=[{role!r}])
+t2 = time.perf_counter()
+print(json.dumps({{'version': bundle['version'], 'format': bundle['formats'][{role!r}],
+                  'import_ms': (t1 - t0) * 1000, 'load_ms': (t2 - t1) * 1000,
+                  'sklearn_imported': 'sklearn' in sys.modules}}))
+"""
+
+def _run(code, importtime=False):
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    return subprocess.run(cmd, capture_output=True, text=True, cwd=os.getcwd())
+
+def profile_import(module):
+    """Tempo cumulativo de import (ms) do módulo num processo novo, via -X importtime."""
+    proc = _run(f"import {module}", importtime=True)
+    if proc.returncode != 0:
+        return {'module': module, 'error': (proc.stderr.strip().splitlines() or ['?'])[-1]}
+    own = [line for line in proc.stderr.splitlines() if line.startswith('import time:') and line.split('|')[-1].strip() == module]
+    total_us = int(own[-1].split('|')[1]) if own else None
+    heavy = [m for m in ('pandas', 'sklearn', 'xgboost', 'matplotlib', 'shap', 'seaborn')
+             if any(line.split('|')[-1].strip() == m for line in proc.stderr.splitlines())]
+    return {'module': module, 'import_ms': round(total_us / 1000, 1) if total_us else None, 'pulls': heavy}
+
+def profile_artifact(role, native):
+    proc = _run(_LOAD_SNIPPET.format(role=role, native=native))
+    if proc.returncode != 0:
+        return {'role': role, 'native': native, 'error': (proc.stderr.strip().splitlines() or ['?'])[-1]}
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {'role': role, **out, 'import_ms': round(out['import_ms'], 1), 'load_ms': round(out['load_ms'], 1)}
+
+def run_startup_profile(modules=None, output=None):
+    modules = modules or STARTUP_MODULES
+    print(f"⏱️ Perfil de inicialização ({len(modules)} módulos, 1 processo novo por medição)...")
+    imports = [profile_import(m) for m in modules]
+    print(f"\n{'Módulo':<24}{'Import (ms)':>12}  Arrasta")
+    for r in imports:
+        if 'error' in r: print(f"{r['module']:<24}{'ERRO':>12}  {r['error']}")
+        else: print(f"{r['module']:<24}{r['import_ms'] or 0:>12.1f}  {', '.join(r['pulls']) or '-'}")
+
+    from models.registry import BUNDLE_FILES
+    loads = [profile_artifact(role, native) for role in BUNDLE_FILES for native in (False, True)]
+    print(f"\n{'Artefato':<14}{'Formato':<9}{'Versão':<8}{'Carga (ms)':>11}  sklearn?")
+    for r in loads:
+        if 'error' in r: print(f"{r['role']:<14}{'-':<9}{'-':<8}{'ERRO':>11}  {r['error']}")
+        else: print(f"{r['role']:<14}{r['format']:<9}{r['version']:<8}{r['load_ms']:>11.1f}  {'sim' if r['sklearn_imported'] else 'não'}")
+    if not any(r.get('format') == 'native' for r in loads):
+        print("\n💡 Sem formato nativo: publique a versão no registro (python main.py registry publish --promote).")
+
+    result = {'imports': imports, 'artifacts': loads}
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultado salvo em: {output}")
+    return result
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+import multiprocessing as mp
+
+sys.path.append(os.getcwd())
+from profiling import Timer, peak_rss_mb, current_rss_mb, reset_peak_rss
+
+# Suíte de benchmark offline dos caminhos quentes (features, score, coach, predição).
+# Cada caso roda num processo novo, para que o pico de RSS medido seja só dele.
+
+BENCH_DIR = 'benchmarks'
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+CACHE_DIR = os.path.join(BENCH_DIR, '.cache')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+CASES = ['prepare_data_for_ml', 'calculate_ai_score', 'analyze_match_context', 'run_predictions']
+COACH_MAX_MATCHES = 200  # O coach é por partida: medimos latência média numa amostra
+
+# ==============================================================================
+# 1. DADOS (sintéticos em cache ou snapshot Parquet)
+# ==============================================================================
+def _dataset_dir(rows, seed):
+    return os.path.join(CACHE_DIR, f"synth_{rows}_{seed}")
+
+def ensure_dataset(rows, seed=42):
+    """Gera (uma vez) o dataset sintético do tamanho pedido e devolve o diretório."""
+    from etl.synthetic import write_parquet
+    path = _dataset_dir(rows, seed)
+    if not os.path.exists(os.path.join(path, '_SUCCESS')):
+        print(f"   🧪 Gerando dataset sintético de {rows:,} linhas em {path}...")
+        write_parquet(path, max(1, rows // 10), seed=seed)
+        open(os.path.join(path, '_SUCCESS'), 'w').close()
+    return path
+
+def _load_rows(source, rows):
+    from etl.sources import load_performance
+    df = load_performance(source)
+    return df.head(rows).reset_index(drop=True)
+
+# ==============================================================================
+# 2. CASOS (setup não é cronometrado; retorna a função a medir)
+# ==============================================================================
+def _setup_case(case, df_raw):
+    if case == 'prepare_data_for_ml':
+        from features.engine import prepare_data_for_ml
+        return (lambda: prepare_data_for_ml(df_raw)), len(df_raw), {}
+
+    if case == 'calculate_ai_score':
+        from features.engine import prepare_data_for_ml
+        from features.post_processing import calculate_ai_score
+        df_processed = prepare_data_for_ml(df_raw)
+        return (lambda: calculate_ai_score(df_processed)), len(df_processed), {}
+
+    if case == 'analyze_match_context':
+        from models.coach import LoLCoach
+        coach = LoLCoach()
+        match_ids = df_raw['match_id'].drop_duplicates().head(COACH_MAX_MATCHES)
+        sample = df_raw[df_raw['match_id'].isin(match_ids)]
+        matches = [(g, g.iloc[0]['puuid']) for _, g in sample.groupby('match_id', sort=False)]
+        def run():
+            for df_match, target in matches:
+                coach.analyze_match_context(df_match, target)
+        return run, len(sample), {'matches': len(matches)}
+
+    if case == 'run_predictions':
+        from models.registry import load_bundle
+        from models.scoring import ScoringBundle
+        from models.predictor import score_predictions
+        scorer = ScoringBundle.from_bundle(load_bundle())
+        return (lambda: score_predictions(df_raw, scorer)), len(df_raw), {'io': 'sem escrita no banco'}
+
+    raise ValueError(f"Caso de benchmark desconhecido: {case}")
+
+def _run_case(case, rows, source, repeat):
+    """Executado no processo filho."""
+    df_raw = _load_rows(source, rows)
+    fn, n_rows, extra = _setup_case(case, df_raw)
+    rss_before = current_rss_mb()
+    reset_peak_rss()
+
+    timings = []
+    for _ in range(repeat):
+        with Timer() as t:
+            fn()
+        timings.append(t.seconds)
+
+    seconds = statistics.median(timings)
+    result = {
+        'case': case, 'rows': rows, 'rows_used': n_rows, 'runs': repeat,
+        'seconds': round(seconds, 4), 'seconds_min': round(min(timings), 4),
+        'rows_per_sec': round(n_rows / seconds, 1) if seconds > 0 else None,
+        'rss_before_mb': rss_before, 'peak_rss_mb': peak_rss_mb(),
+        'extra': extra,
+    }
+    if 'matches' in extra and extra['matches']:
+        result['ms_per_match'] = round(seconds * 1000 / extra['matches'], 2)
+    return result
+
+# ==============================================================================
+# 3. ORQUESTRAÇÃO, PERSISTÊNCIA E COMPARAÇÃO
+# ==============================================================================
+def _git_rev():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def run_benchmarks(sizes=None, cases=None, repeat=3, source=None, seed=42):
+    sizes = sizes or DEFAULT_SIZES
+    cases = cases or CASES
+    print(f"⏱️ Benchmark: casos={cases} | tamanhos={sizes} | repetições={repeat}")
+
+    ctx = mp.get_context('spawn')
+    results = []
+    for rows in sizes:
+        data_source = source or ensure_dataset(rows, seed)
+        for case in cases:
+            # Processo novo por caso: isola o pico de memória e o estado de cache
+            with ctx.Pool(1, maxtasksperchild=1) as pool:
+                res = pool.apply(_run_case, (case, rows, data_source, repeat))
+            results.append(res)
+            per_match = f" | {res['ms_per_match']} ms/partida" if 'ms_per_match' in res else ""
+            print(f"   -> {case:<24} {rows:>9,} linhas | {res['seconds']:.3f}s | pico {res['peak_rss_mb']} MB{per_match}")
+
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'git_rev': _git_rev(),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'source': source or 'synthetic', 'seed': seed,
+        },
+        'results': results,
+    }
+
+def save_results(report, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados salvos em: {path}")
+    return path
+
+def compare_results(report, baseline, tolerance=0.15, mem_tolerance=0.15):
+    """Compara com um baseline salvo. Retorna a lista de regressões (tempo ou memória)."""
+    base = {(r['case'], r['rows']): r for r in baseline['results']}
+    regressions = []
+
+    print(f"\n{'CASO':<24} | {'LINHAS':>9} | {'TEMPO':>14} | {'MEMÓRIA':>14} | STATUS")
+    print("-" * 80)
+    for r in report['results']:
+        b = base.get((r['case'], r['rows']))
+        if b is None: continue
+        t_ratio = r['seconds'] / b['seconds'] if b['seconds'] else 1.0
+        m_ratio = (r['peak_rss_mb'] / b['peak_rss_mb']) if r.get('peak_rss_mb') and b.get('peak_rss_mb') else 1.0
+        slow = t_ratio > 1 + tolerance
+        fat = m_ratio > 1 + mem_tolerance
+        status = "🐢 LENTO" if slow else ("🐘 MEMÓRIA" if fat else ("🚀 MELHOR" if t_ratio < 1 - tolerance else "✅ OK"))
+        print(f"{r['case']:<24} | {r['rows']:>9,} | {t_ratio:>12.2f}x | {m_ratio:>12.2f}x | {status}")
+        if slow or fat:
+            regressions.append({'case': r['case'], 'rows': r['rows'], 'time_ratio': round(t_ratio, 3), 'mem_ratio': round(m_ratio, 3)})
+
+    if regressions: print(f"\n⚠️ {len(regressions)} regressão(ões) acima da tolerância ({tolerance:.0%}).")
+    else: print("\n✅ Nenhuma regressão detectada.")
+    return regressions
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
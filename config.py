@@ -4,12 +4,15 @@ import os
 # Caminho absoluto para garantir que o arquivo seja encontrado
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(BASE_DIR, 'settings.yaml')
+EXAMPLE_CONFIG_PATH = os.path.join(BASE_DIR, 'settings.example.yaml')
 
 def load_config():
     """Lê o arquivo YAML e retorna um dicionário"""
+    # settings.yaml é local (fora do git); sem ele vale o exemplo versionado (CI, testes, clone novo)
+    path = CONFIG_PATH if os.path.exists(CONFIG_PATH) else EXAMPLE_CONFIG_PATH
     try:
         # A CORREÇÃO ESTÁ AQUI: encoding='utf-8'
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
+        with open(path, 'r', encoding='utf-8') as file:
             return yaml.safe_load(file)
     except FileNotFoundError:
         raise Exception(f"❌ Arquivo de configuração não encontrado em: {CONFIG_PATH}")
@@ -46,4 +49,12 @@ FEATURES_MODEL = [
     'xp_diff_at_15',                # Melhor proxy de nível
     'recent_form',                  # Momento do jogador
     'performance_stability'         # Consistência
-]
\ No newline at end of file
+]
+
+# Grupos de features (mesmos TIERs acima) para ablação em bloco
+FEATURE_GROUPS = {
+    'MACRO': ['map_presence_efficiency_rel', 'objective_focus_rel', 'profitable_lead_rel'],
+    'COMBATE': ['lethality_efficiency_rel', 'roam_impact_score_rel'],
+    'ROLE': ['lane_pressure_index_rel', 'split_push_index_rel', 'jungle_richness_score_rel', 'vision_denial_rel'],
+    'FUNDAMENTOS': ['cs_at_10_rel', 'xp_diff_at_15', 'recent_form', 'performance_stability'],
+}
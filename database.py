@@ -1,14 +1,44 @@
+import io
 import time
 import logging
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import OperationalError
-from config import DB_CONN_STR
+from config import DB_CONN_STR, settings
 
 # Configuração de Logs específica para Banco
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 _engine = None
+_ingest_engine = None
+_async_engine = None
+
+# Pool próprio da API assíncrona (um worker segura muitas requisições em paralelo)
+ASYNC_POOL_DEFAULTS = {
+    'pool_size': 20,
+    'max_overflow': 10,
+    'pool_timeout': 10,
+    'pool_recycle': 1800,
+    'statement_cache_size': 500,   # Prepared statements em cache por conexão (asyncpg)
+}
+
+# application_name das conexões que gravam em fact_match_player_performance: o limite seguro da
+# marca d'água (etl/watermarks.safe_upper) só espera por transações abertas com este nome
+INGEST_APPLICATION = 'lol-ingest'
+
+def _create_engine(connect_args=None):
+    return create_engine(
+        DB_CONN_STR,
+        # --- MELHORIAS IMPLEMENTADAS ---
+        pool_size=10,             # Mantém 10 conexões abertas prontas para uso
+        max_overflow=20,          # Em pico, cria mais 20 extras
+        pool_timeout=30,          # Espera 30s por uma vaga no pool antes de dar erro
+        pool_recycle=1800,        # Renova conexões a cada 30min (evita timeout do servidor)
+        pool_pre_ping=True,       # VITAL: Testa se a conexão está viva antes de usar
+        echo=False,               # Mude para True se quiser ver o SQL cru no terminal
+        connect_args=connect_args or {}
+    )
 
 def get_engine():
     """
@@ -19,19 +49,51 @@ def get_engine():
     
     if _engine is None:
         logger.info("🔌 Criando Pool de Conexões SQL...")
-        
-        _engine = create_engine(
-            DB_CONN_STR,
-            # --- MELHORIAS IMPLEMENTADAS ---
-            pool_size=10,             # Mantém 10 conexões abertas prontas para uso
-            max_overflow=20,          # Em pico, cria mais 20 extras
-            pool_timeout=30,          # Espera 30s por uma vaga no pool antes de dar erro
-            pool_recycle=1800,        # Renova conexões a cada 30min (evita timeout do servidor)
-            pool_pre_ping=True,       # VITAL: Testa se a conexão está viva antes de usar
-            echo=False                # Mude para True se quiser ver o SQL cru no terminal
-        )
+        _engine = _create_engine()
     return _engine
 
+def get_ingest_engine():
+    """Engine dos coletores (mesmo pool, conexões marcadas com application_name = INGEST_APPLICATION)."""
+    global _ingest_engine
+
+    if _ingest_engine is None:
+        logger.info("🔌 Criando Pool de Conexões SQL (ingestão)...")
+        _ingest_engine = _create_engine({'application_name': INGEST_APPLICATION})
+    return _ingest_engine
+
+def get_async_engine():
+    """
+    Engine assíncrona (SQLAlchemy + asyncpg) usada só pela API.
+    Pool separado do síncrono (ETL/treino); ajuste em settings.yaml -> database.async_pool.
+    """
+    global _async_engine
+
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine  # Import tardio (asyncpg só é exigido pela API)
+        cfg = {**ASYNC_POOL_DEFAULTS, **((settings.get('database') or {}).get('async_pool') or {})}
+        url = make_url(DB_CONN_STR).set(drivername='postgresql+asyncpg')
+        # O dialeto asyncpg prepara cada consulta e reaproveita o statement por conexão
+        url = url.update_query_dict({'prepared_statement_cache_size': str(cfg['statement_cache_size'])})
+        logger.info("🔌 Criando Pool de Conexões SQL assíncrono...")
+
+        _async_engine = create_async_engine(
+            url,
+            pool_size=cfg['pool_size'],
+            max_overflow=cfg['max_overflow'],
+            pool_timeout=cfg['pool_timeout'],
+            pool_recycle=cfg['pool_recycle'],
+            pool_pre_ping=True,
+            echo=False
+        )
+    return _async_engine
+
+async def dispose_async_engine():
+    """Fecha o pool assíncrono (shutdown da API)."""
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
 def test_connection():
     """Função utilitária para verificar se o banco está on-line"""
     engine = get_engine()
@@ -51,6 +113,24 @@ def test_connection():
                 logger.error("❌ Falha crítica: Banco de Dados inacessível.")
                 return False
 
+def copy_dataframe(conn, df, table_name, columns=None):
+    """
+    Carga em massa via COPY (psycopg2). Muito mais rápido que to_sql/INSERT.
+    `conn` é uma Connection SQLAlchemy já dentro de uma transação.
+    """
+    if df.empty: return 0
+    cols = list(columns) if columns is not None else list(df.columns)
+    buf = io.StringIO()
+    df[cols].to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    col_sql = ", ".join(cols)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({col_sql}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+    return len(df)
+
 def reset_predictions_table():
     """(Antigo fix_db.py) Recria a tabela de predições"""
     print("🛠️ Manutenção: Recriando tabela 'fact_match_predictions'...")
@@ -63,12 +143,17 @@ def reset_predictions_table():
         game_start_timestamp BIGINT NOT NULL,
         team_position VARCHAR(20),
         win_probability FLOAT,
+        win_probability_calibrated REAL,
+        archetype_id SMALLINT,
         ai_score FLOAT,
         ai_rank VARCHAR(20),
         ai_rating_text VARCHAR(50),
         ai_score_role_norm FLOAT,
         model_version VARCHAR(10),
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        attr_features SMALLINT[],
+        attr_values REAL[],
+        attr_base REAL,
         CONSTRAINT pk_match_player PRIMARY KEY (match_id, puuid)
     );
     CREATE INDEX idx_preds_puuid ON fact_match_predictions(puuid);
@@ -77,4 +162,7 @@ def reset_predictions_table():
     with engine.connect() as conn:
         conn.execute(text(ddl))
         conn.commit()
+    # Tabela vazia: a marca d'água das predições volta ao início
+    from etl.watermarks import PREDICTIONS_PIPELINE, reset_watermark # Import tardio (etl.watermarks importa database)
+    reset_watermark(PREDICTIONS_PIPELINE, engine)
     print("✅ Tabela recriada com sucesso.")
\ No newline at end of file
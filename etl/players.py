@@ -0,0 +1,167 @@
+import re
+import logging
+import unicodedata
+from sqlalchemy import text
+
+from database import get_engine
+from etl.versions import PLAYERS_SCOPE, ensure_version_table, bump_versions
+
+# Diretório de jogadores (uma linha por puuid) mantido na ingestão.
+# Toda busca por nome passa por aqui, com chave normalizada e índices de prefixo/trigrama,
+# em vez de ILIKE / LOWER() sobre a tabela fato inteira.
+
+logger = logging.getLogger(__name__)
+
+PLAYER_TABLE = 'dim_player'
+
+PLAYER_DDL = f"""
+CREATE TABLE IF NOT EXISTS {PLAYER_TABLE} (
+    puuid VARCHAR(100) PRIMARY KEY,
+    game_name VARCHAR(100),
+    tag_line VARCHAR(20),
+    region VARCHAR(10),
+    search_key VARCHAR(100) NOT NULL,
+    last_seen_ts BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_player_search_prefix ON {PLAYER_TABLE}(search_key text_pattern_ops);
+"""
+TRGM_DDL = f"""
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_player_search_trgm ON {PLAYER_TABLE} USING gin (search_key gin_trgm_ops);
+"""
+
+_state = {'ready': False, 'trgm': False}
+
+def normalize_search_key(name):
+    """'  Bodão ' -> 'bodao': minúsculas, sem acentos, espaços colapsados."""
+    if not name: return ''
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', name).strip().lower()
+
+def split_riot_id(riot_id):
+    """'Nome#TAG' -> ('Nome', 'TAG'); sem '#', tag = None."""
+    name, _, tag = str(riot_id).partition('#')
+    return name.strip(), (tag.strip() or None)
+
+def ensure_player_table(engine=None):
+    """Cria a tabela (e o índice de trigramas, se a extensão pg_trgm puder ser usada)."""
+    if _state['ready']: return _state
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(PLAYER_DDL))
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(TRGM_DDL))
+        _state['trgm'] = True
+    except Exception as e:
+        # Sem permissão para CREATE EXTENSION: a busca segue só por prefixo
+        logger.warning(f"⚠️ pg_trgm indisponível, busca apenas por prefixo: {e}")
+    _state['ready'] = True
+    return _state
+
+# ==============================================================================
+# 1. MANUTENÇÃO (ingestão + backfill)
+# ==============================================================================
+def player_rows_from_participants(participants, region, game_ts):
+    rows = []
+    for p in participants:
+        name = p.get('riotIdGameName') or p.get('summonerName')
+        rows.append({
+            'puuid': p['puuid'], 'game_name': name, 'tag_line': p.get('riotIdTagline') or None,
+            'region': region, 'search_key': normalize_search_key(name), 'last_seen_ts': game_ts,
+        })
+    return rows
+
+def upsert_players(conn, rows):
+    """Insere/atualiza jogadores; nome e tag só são sobrescritos por uma partida mais recente."""
+    if not rows: return 0
+    stmt = text(f"""
+        INSERT INTO {PLAYER_TABLE} (puuid, game_name, tag_line, region, search_key, last_seen_ts)
+        VALUES (:puuid, :game_name, :tag_line, :region, :search_key, :last_seen_ts)
+        ON CONFLICT (puuid) DO UPDATE SET
+            game_name = EXCLUDED.game_name, tag_line = COALESCE(EXCLUDED.tag_line, {PLAYER_TABLE}.tag_line),
+            region = EXCLUDED.region, search_key = EXCLUDED.search_key,
+            last_seen_ts = EXCLUDED.last_seen_ts, updated_at = CURRENT_TIMESTAMP
+        WHERE {PLAYER_TABLE}.last_seen_ts IS NULL OR EXCLUDED.last_seen_ts >= {PLAYER_TABLE}.last_seen_ts
+    """)
+    conn.execute(stmt, rows)
+    return len(rows)
+
+def rebuild_player_directory(engine=None, batch_size=5000):
+    """Backfill a partir da tabela fato (nome mais recente por puuid; tag fica vazia)."""
+    engine = engine or get_engine()
+    ensure_player_table(engine)
+    ensure_version_table(engine)
+    print(f"📇 Populando '{PLAYER_TABLE}' a partir do histórico...")
+    query = text("""
+        SELECT DISTINCT ON (puuid) puuid, summoner_name, match_id, game_start_timestamp
+        FROM fact_match_player_performance
+        ORDER BY puuid, game_start_timestamp DESC
+    """)
+    total = 0
+    with engine.connect() as conn:
+        rows = conn.execute(query).fetchall()
+    for start in range(0, len(rows), batch_size):
+        batch = [{
+            'puuid': puuid, 'game_name': name, 'tag_line': None,
+            'region': str(match_id).split('_')[0], 'search_key': normalize_search_key(name), 'last_seen_ts': ts,
+        } for puuid, name, match_id, ts in rows[start:start + batch_size]]
+        with engine.begin() as conn:
+            total += upsert_players(conn, batch)
+    with engine.begin() as conn:
+        bump_versions(conn, [PLAYERS_SCOPE])
+    print(f"✅ {total:,} jogadores no diretório.")
+    return total
+
+# ==============================================================================
+# 2. BUSCA
+# ==============================================================================
+def search_players(conn, q, limit=10, region=None, use_trgm=False):
+    """Autocomplete: prefixo (índice btree) e, se faltar resultado, similaridade por trigramas."""
+    key = normalize_search_key(q)
+    if not key: return []
+    cols = "puuid, game_name, tag_line, region, last_seen_ts"
+    region_sql = "AND region = :region" if region else ""
+    params = {"prefix": key.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%',
+              "key": key, "limit": limit, "region": region.upper() if region else None}
+
+    rows = conn.execute(text(f"""
+        SELECT {cols} FROM {PLAYER_TABLE}
+        WHERE search_key LIKE :prefix {region_sql}
+        ORDER BY (search_key = :key) DESC, last_seen_ts DESC NULLS LAST
+        LIMIT :limit
+    """), params).mappings().all()
+    results = [dict(r) for r in rows]
+
+    if use_trgm and len(results) < limit and len(key) >= 3:
+        seen = [r['puuid'] for r in results]
+        params.update({"seen": seen, "remaining": limit - len(results)})
+        fuzzy = conn.execute(text(f"""
+            SELECT {cols} FROM {PLAYER_TABLE}
+            WHERE search_key % :key AND NOT (puuid = ANY(:seen)) {region_sql}
+            ORDER BY similarity(search_key, :key) DESC, last_seen_ts DESC NULLS LAST
+            LIMIT :remaining
+        """), params).mappings().all()
+        results += [dict(r) for r in fuzzy]
+    return results
+
+def resolve_player(conn, riot_id, region=None):
+    """'Nome' ou 'Nome#TAG' -> (puuid, nome) do jogador visto mais recentemente; None se não existir."""
+    name, tag = split_riot_id(riot_id)
+    tag_sql = "AND LOWER(tag_line) = LOWER(:tag)" if tag else ""
+    row = conn.execute(text(f"""
+        SELECT puuid, game_name FROM {PLAYER_TABLE}
+        WHERE search_key = :key {tag_sql}
+        ORDER BY (region = :region) DESC NULLS LAST, last_seen_ts DESC NULLS LAST
+        LIMIT 1
+    """), {"key": normalize_search_key(name), "tag": tag, "region": (region or '').upper()}).first()
+    return (row[0], row[1]) if row else None
+
+def resolve_players(conn, riot_ids):
+    """Vários nomes -> lista de puuids (todas as contas com aquele nome)."""
+    keys = sorted({normalize_search_key(split_riot_id(r)[0]) for r in riot_ids} - {''})
+    if not keys: return []
+    rows = conn.execute(text(f"SELECT puuid FROM {PLAYER_TABLE} WHERE search_key = ANY(:keys)"), {"keys": keys})
+    return [r[0] for r in rows]
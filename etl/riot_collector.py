@@ -4,8 +4,10 @@ import time
 import logging
 from sqlalchemy import MetaData, Table, text
 from sqlalchemy.dialects.postgresql import insert
-from database import get_engine
+from database import get_ingest_engine
 from config import settings
+from etl.players import ensure_player_table, player_rows_from_participants, upsert_players
+from etl.versions import PLAYERS_SCOPE, ensure_version_table, bump_versions
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -24,7 +26,7 @@ class RiotETL:
         self.region_url = f"https://{cfg_region}.api.riotgames.com"
         
         self.headers = {"X-Riot-Token": self.api_key}
-        self.engine = get_engine()
+        self.engine = get_ingest_engine()  # Conexões marcadas: a marca d'água das predições espera por elas
         self.metadata = MetaData()
         
         try:
@@ -246,9 +248,9 @@ class RiotETL:
 
     def process_match_full(self, match_id):
         match_data = self._request(f"{self.routing_url}/lol/match/v5/matches/{match_id}")
-        if not match_data or 'info' not in match_data: return None, None, None
+        if not match_data or 'info' not in match_data: return None, None, None, None
         info = match_data['info']
-        if info.get('queueId', 0) not in [420, 440]: return None, None, None
+        if info.get('queueId', 0) not in [420, 440]: return None, None, None, None
 
         timeline_data = self._request(f"{self.routing_url}/lol/match/v5/matches/{match_id}/timeline")
         
@@ -364,7 +366,28 @@ class RiotETL:
                 'cloud_kills': d_stats.get('AIR_DRAGON',0), 'infernal_kills': d_stats.get('FIRE_DRAGON',0), 'mountain_kills': d_stats.get('EARTH_DRAGON',0),
                 'ocean_kills': d_stats.get('WATER_DRAGON',0), 'hextech_kills': d_stats.get('HEX_DRAGON',0), 'chemtech_kills': d_stats.get('CHEM_DRAGON',0), 'elder_kills': d_stats.get('ELDER_DRAGON',0)
             })
-        return perf_rows, kill_rows, team_rows
+        # Diretório de jogadores (Riot ID atual + tag + região) para a busca por nome
+        region = info.get('platformId') or match_id.split('_')[0]
+        player_rows = player_rows_from_participants(parts, region, info['gameCreation'])
+        return perf_rows, kill_rows, team_rows, player_rows
+
+    def upsert_players(self, rows):
+        if not rows: return
+        try:
+            ensure_player_table(self.engine)
+            with self.engine.begin() as conn:
+                upsert_players(conn, rows)
+        except Exception as e:
+            logger.error(f"Erro DB dim_player: {e}")
+
+    def bump_data_versions(self, puuids):
+        """Avisa a API (cache de respostas) que há partidas novas desses jogadores."""
+        try:
+            ensure_version_table(self.engine)
+            with self.engine.begin() as conn:
+                bump_versions(conn, [PLAYERS_SCOPE, *puuids])
+        except Exception as e:
+            logger.error(f"Erro DB data_version: {e}")
 
     def upsert(self, table, data, keys):
         if not data: return
@@ -0,0 +1,113 @@
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Leitura das partidas para treino/benchmark a partir do PostgreSQL ou de um
+# snapshot Parquet (mesmo layout gerado por `main.py synth`: <dir>/<tabela>/*.parquet).
+
+PERF_TABLE = 'fact_match_player_performance'
+KILLS_TABLE = 'fact_kill_events'
+
+# Mesma query usada no treino (invade_kills = abates no lado inimigo até os 15 min)
+PERFORMANCE_QUERY = """
+SELECT
+    p.*,
+    (SELECT COUNT(*) FROM fact_kill_events k
+     WHERE k.match_id = p.match_id AND k.killer_puuid = p.puuid
+     AND k.event_time_min <= 15
+     AND ((p.team_id = 100 AND (k.pos_x > 8000 OR k.pos_y > 8000)) OR
+          (p.team_id = 200 AND (k.pos_x < 7000 OR k.pos_y < 7000)))) as invade_kills
+FROM fact_match_player_performance p
+WHERE p.team_position != 'UNKNOWN' AND p.team_position != ''
+ORDER BY p.game_start_timestamp ASC
+"""
+# Só partidas depois de um corte (atualizações incrementais)
+PERFORMANCE_SINCE_QUERY = PERFORMANCE_QUERY.replace("ORDER BY", "AND p.game_start_timestamp > :since\nORDER BY")
+
+def compute_invade_kills(df_perf, df_kills):
+    """Versão vetorizada (pandas) da subquery `invade_kills` do SQL."""
+    early = df_kills.loc[df_kills['event_time_min'] <= 15, ['match_id', 'killer_puuid', 'pos_x', 'pos_y']]
+    k = early.merge(df_perf[['match_id', 'puuid', 'team_id']],
+                    left_on=['match_id', 'killer_puuid'], right_on=['match_id', 'puuid'], how='inner')
+    is_invade = (((k['team_id'] == 100) & ((k['pos_x'] > 8000) | (k['pos_y'] > 8000))) |
+                 ((k['team_id'] == 200) & ((k['pos_x'] < 7000) | (k['pos_y'] < 7000))))
+    counts = k[is_invade].groupby(['match_id', 'puuid']).size().rename('invade_kills')
+    out = df_perf.merge(counts, left_on=['match_id', 'puuid'], right_index=True, how='left')
+    out['invade_kills'] = out['invade_kills'].fillna(0).astype(int)
+    return out
+
+def _read_parquet_table(source, table):
+    path = os.path.join(source, table)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ Tabela '{table}' não encontrada no snapshot: {path}")
+    return pd.read_parquet(path)
+
+def load_performance(source=None, engine=None):
+    """
+    Carrega as linhas de performance (+ invade_kills) ordenadas no tempo.
+    `source=None` lê do PostgreSQL; um caminho lê o snapshot Parquet.
+    """
+    if source is None:
+        if engine is None:
+            from database import get_engine
+            engine = get_engine()
+        with engine.connect() as conn:
+            return pd.read_sql(text(PERFORMANCE_QUERY), conn)
+
+    df_perf = _read_parquet_table(source, PERF_TABLE)
+    df_perf = df_perf[~df_perf['team_position'].isin(['UNKNOWN', ''])]
+    df_kills = _read_parquet_table(source, KILLS_TABLE)
+    df = compute_invade_kills(df_perf, df_kills)
+    return df.sort_values('game_start_timestamp', kind='stable').reset_index(drop=True)
+
+def iter_performance_chunks(source=None, chunk_size=100_000, engine=None, since=None):
+    """
+    Itera as linhas de performance (+ invade_kills) em blocos de até `chunk_size`,
+    em ordem temporal, sem nunca materializar a tabela inteira.
+    No PostgreSQL usa cursor do lado do servidor; no Parquet lê lote a lote.
+    Com `since`, só partidas com game_start_timestamp > since.
+    """
+    if source is None:
+        if engine is None:
+            from database import get_engine
+            engine = get_engine()
+        with engine.connect().execution_options(stream_results=True) as conn:
+            query, params = (PERFORMANCE_QUERY, None) if since is None else (PERFORMANCE_SINCE_QUERY, {"since": int(since)})
+            for chunk in pd.read_sql(text(query), conn, params=params, chunksize=chunk_size):
+                yield chunk
+        return
+
+    import pyarrow.dataset as ds
+    perf_ds = ds.dataset(os.path.join(source, PERF_TABLE), format='parquet')
+    kills_ds = ds.dataset(os.path.join(source, KILLS_TABLE), format='parquet')
+    perf_filter = None if since is None else ds.field('game_start_timestamp') > int(since)
+    for batch in perf_ds.to_batches(batch_size=chunk_size, filter=perf_filter):
+        df = batch.to_pandas()
+        df = df[~df['team_position'].isin(['UNKNOWN', ''])]
+        if df.empty: continue
+        # Só os abates das partidas deste lote (predicado empurrado para o Parquet)
+        kills = kills_ds.to_table(
+            columns=['match_id', 'killer_puuid', 'event_time_min', 'pos_x', 'pos_y'],
+            filter=ds.field('match_id').isin(df['match_id'].unique().tolist())
+        ).to_pandas()
+        yield compute_invade_kills(df, kills)
+
+def timestamp_quantile(q, source=None, engine=None):
+    """Timestamp que separa os `q` primeiros % das linhas (corte do split temporal)."""
+    if source is None:
+        if engine is None:
+            from database import get_engine
+            engine = get_engine()
+        query = text("""
+            SELECT percentile_disc(:q) WITHIN GROUP (ORDER BY game_start_timestamp)
+            FROM fact_match_player_performance
+            WHERE team_position != 'UNKNOWN' AND team_position != ''
+        """)
+        with engine.connect() as conn:
+            return conn.execute(query, {"q": q}).scalar()
+
+    df = pd.read_parquet(os.path.join(source, PERF_TABLE), columns=['game_start_timestamp', 'team_position'])
+    ts = df.loc[~df['team_position'].isin(['UNKNOWN', '']), 'game_start_timestamp'].to_numpy()
+    if len(ts) == 0: return None
+    return int(np.quantile(ts, q, method='inverted_cdf'))
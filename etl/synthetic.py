@@ -0,0 +1,392 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Gerador sintético de partidas para testes de carga/memória.
+# Emite as mesmas três tabelas que o RiotETL grava (performance, kills, times),
+# com 10 participantes por partida, pareamento de rota consistente entre os times
+# e distribuições plausíveis por role. Tudo é vetorizado e gerado em lotes, então
+# o tamanho final é limitado apenas pelo disco/banco, não pela RAM.
+
+ROLES = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY']
+TEAMS = [100, 200]
+
+# Perfil médio por role (jogo de 30 min). Valores calibrados "de olho" em partidas Diamante+.
+ROLE_PROFILES = {
+    #            gpm  cs/min neutral dmg    taken  mitig  vision cc  obj    gold10 xp10  kill_w victim_w
+    'TOP':     (400, 7.2,   0.3,    21000, 29000, 33000, 22,    20, 8000,  3400,  4600, 0.18,  0.19),
+    'JUNGLE':  (380, 0.6,   5.2,    15000, 34000, 24000, 32,    16, 26000, 3100,  3900, 0.22,  0.19),
+    'MIDDLE':  (420, 7.8,   0.3,    25000, 20000, 12000, 21,    15, 6000,  3500,  4700, 0.24,  0.20),
+    'BOTTOM':  (440, 8.4,   0.2,    27000, 18000,  8000, 18,     8, 9000,  3550,  4000, 0.27,  0.22),
+    'UTILITY': (270, 1.1,   0.0,     9000, 18000, 12000, 78,    36, 1500,  2350,  3200, 0.09,  0.20),
+}
+
+CHAMPIONS = {
+    'TOP': ['Aatrox', 'Ornn', 'KSante', 'Jax', 'Renekton', 'Gnar', 'Camille', 'Fiora'],
+    'JUNGLE': ['LeeSin', 'Viego', 'Sejuani', 'Maokai', 'Vi', 'Nidalee', 'XinZhao', 'Kindred'],
+    'MIDDLE': ['Ahri', 'Azir', 'Orianna', 'Sylas', 'Yone', 'Syndra', 'Taliyah', 'Akali'],
+    'BOTTOM': ['Jinx', 'Kaisa', 'Ezreal', 'Varus', 'Xayah', 'Aphelios', 'Zeri', 'Ashe'],
+    'UTILITY': ['Nautilus', 'Rakan', 'Thresh', 'Lulu', 'Renata', 'Alistar', 'Braum', 'Karma'],
+}
+
+ITEM_POOL = np.array([3031, 3036, 3046, 3053, 3065, 3068, 3071, 3074, 3075, 3089,
+                      3094, 3100, 3107, 3110, 3135, 3153, 3157, 3190, 3222, 6653,
+                      6655, 6672, 6673, 6692, 6694, 3364, 3340, 3363])
+
+PERF_TABLE = 'fact_match_player_performance'
+KILLS_TABLE = 'fact_kill_events'
+TEAMS_TABLE = 'fact_match_teams'
+
+MAP_SIZE = 14800
+DAY_MS = 86_400_000
+DEFAULT_START_MS = 1_735_689_600_000  # 2025-01-01 UTC
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _player_pool(n_matches, seed, games_per_player=20):
+    """Pool de jogadores por role (disjuntos), com skill latente fixa por jogador."""
+    pool_per_role = max(4, int(n_matches * 2 / games_per_player))
+    rng = np.random.default_rng([seed, 0])
+    skill = rng.normal(0.0, 1.0, size=(len(ROLES), pool_per_role))
+    return pool_per_role, skill
+
+
+def generate_matches(n_matches, seed=42, start_index=0, total_matches=None, region='KR',
+                     start_ms=DEFAULT_START_MS, days=120):
+    """
+    Gera `n_matches` partidas sintéticas (10 linhas de performance por partida).
+
+    `start_index`/`total_matches` permitem gerar lotes de um mesmo dataset maior:
+    o pool de jogadores e a linha do tempo dependem apenas de `total_matches` e `seed`,
+    então lotes consecutivos formam um histórico coerente.
+
+    Retorna (df_perf, df_kills, df_teams) com o mesmo esquema do RiotETL.
+    """
+    total_matches = total_matches or (start_index + n_matches)
+    rng = np.random.default_rng([seed, 1, start_index])
+    pool_size, skill = _player_pool(total_matches, seed)
+
+    m = n_matches
+    n_rows = m * 10
+    match_idx = np.arange(start_index, start_index + m)
+    match_ids = np.array([f"{region}_{7_000_000_000 + i}" for i in match_idx], dtype=object)
+
+    # --- Linha do tempo e patch ---
+    span_ms = days * DAY_MS
+    ts = start_ms + (match_idx * (span_ms / max(total_matches, 1))).astype(np.int64)
+    ts = ts + rng.integers(0, 60_000, size=m)
+    patch_minor = 1 + ((ts - start_ms) // (14 * DAY_MS)).astype(int)
+    game_version = np.array([f"15.{p}.{600 + p}.1234" for p in patch_minor], dtype=object)
+    duration_sec = np.clip(rng.normal(1800, 360, size=m), 900, 3000).astype(int)
+    dur_min = duration_sec / 60.0
+
+    # --- Estrutura: partida x time x role (ordem = participantId 1..10) ---
+    row_match = np.repeat(np.arange(m), 10)
+    team_slot = np.tile(np.repeat([0, 1], 5), m)
+    role_idx = np.tile(np.tile(np.arange(5), 2), m)
+    team_id = np.where(team_slot == 0, 100, 200)
+
+    # Dois jogadores distintos por role em cada partida (pools disjuntos por role)
+    p_blue = rng.integers(0, pool_size, size=(m, 5))
+    p_red = (p_blue + 1 + rng.integers(0, pool_size - 1, size=(m, 5))) % pool_size
+    player_local = np.concatenate([p_blue, p_red], axis=1).reshape(-1)
+    player_global = role_idx * pool_size + player_local
+    puuid = np.array([f"synth-{region.lower()}-{g:09d}" for g in player_global], dtype=object)
+    summoner_name = np.array([f"Synth{g}" for g in player_global], dtype=object)
+
+    # --- Vantagem latente do time azul + skill individual -> resultado ---
+    adv = rng.normal(0.0, 1.0, size=m)
+    player_skill = skill[role_idx, player_local]
+    team_skill = np.add.reduceat(player_skill, np.arange(0, n_rows, 5)).reshape(m, 2)
+    strength = adv * 0.8 + (team_skill[:, 0] - team_skill[:, 1]) * 0.25
+    blue_win = rng.random(m) < _sigmoid(strength * 1.6)
+    win = np.where(team_slot == 0, blue_win[row_match], ~blue_win[row_match])
+
+    side = np.where(team_slot == 0, 1.0, -1.0)
+    perf = player_skill * 0.35 + side * strength[row_match] * 0.45 + rng.normal(0, 0.35, size=n_rows)
+    perf_mult = np.exp(0.18 * perf)
+
+    prof = np.array([ROLE_PROFILES[r] for r in ROLES])
+    col = lambda j: prof[role_idx, j]
+    row_dur = dur_min[row_match]
+    scale = row_dur / 30.0
+
+    # --- Economia e farm ---
+    gpm = col(0) * np.exp(0.12 * perf) * rng.lognormal(0, 0.05, n_rows)
+    total_gold = (gpm * row_dur).astype(int)
+    lane_cs_min = col(1) * np.exp(0.08 * perf) * rng.lognormal(0, 0.08, n_rows)
+    neutral_min = col(2) * np.exp(0.08 * perf) * rng.lognormal(0, 0.08, n_rows)
+    lane_cs = (lane_cs_min * row_dur).astype(int)
+    neutral = (neutral_min * row_dur).astype(int)
+    total_cs = lane_cs + neutral
+
+    gold_10 = (col(9) * np.exp(0.06 * perf) * rng.lognormal(0, 0.04, n_rows)).astype(int)
+    gold_15 = (gold_10 * 1.78 * np.exp(0.05 * perf)).astype(int)
+    xp_10 = (col(10) * np.exp(0.05 * perf) * rng.lognormal(0, 0.03, n_rows)).astype(int)
+    xp_15 = (xp_10 * 1.62 * np.exp(0.04 * perf)).astype(int)
+    cs_10 = ((lane_cs_min + neutral_min) * 9.0 * rng.lognormal(0, 0.05, n_rows)).astype(int)
+    cs_15 = (cs_10 * 1.55).astype(int)
+    gold_gain_10_20 = (gpm * 10 * 1.1 * rng.lognormal(0, 0.05, n_rows)).astype(int)
+    xp_gain_10_20 = (xp_10 * 1.05 * rng.lognormal(0, 0.05, n_rows)).astype(int)
+    cs_gain_10_20 = ((lane_cs_min + neutral_min) * 10 * rng.lognormal(0, 0.05, n_rows)).astype(int)
+
+    # --- Combate ---
+    dmg = (col(3) * scale * perf_mult * rng.lognormal(0, 0.15, n_rows)).astype(int)
+    phys_share = rng.uniform(0.2, 0.8, n_rows)
+    true_share = rng.uniform(0.02, 0.1, n_rows)
+    phys = (dmg * phys_share).astype(int)
+    true_dmg = (dmg * true_share).astype(int)
+    magic = dmg - phys - true_dmg
+    taken = (col(4) * scale / np.sqrt(perf_mult) * rng.lognormal(0, 0.15, n_rows)).astype(int)
+    mitigated = (col(5) * scale * rng.lognormal(0, 0.2, n_rows)).astype(int)
+    vision = (col(6) * scale * rng.lognormal(0, 0.15, n_rows)).astype(int)
+    cc_time = (col(7) * scale * rng.lognormal(0, 0.25, n_rows)).astype(int)
+    obj_dmg = (col(8) * scale * perf_mult * rng.lognormal(0, 0.3, n_rows)).astype(int)
+
+    # --- Eventos de abate (fonte da verdade para K/D/A) ---
+    df_kills, kda = _generate_kill_events(rng, m, match_ids, duration_sec, strength, puuid, summoner_name)
+    kills, deaths, assists = kda['kills'], kda['deaths'], kda['assists']
+
+    team_kills = np.add.reduceat(kills, np.arange(0, n_rows, 5))
+    team_kills_row = np.repeat(team_kills, 5)
+    kp = np.round((kills + assists) / np.maximum(team_kills_row, 1), 4)
+    kda_ratio = np.round((kills + assists) / np.maximum(deaths, 1), 4)
+
+    # --- Diferenças contra o oponente direto (mesma role, outro time) ---
+    opp = np.arange(n_rows).reshape(m, 2, 5)[:, ::-1, :].reshape(-1)
+    diffs = {
+        'cs_diff_at_10': cs_10 - cs_10[opp], 'gold_diff_at_10': gold_10 - gold_10[opp],
+        'xp_diff_at_10': xp_10 - xp_10[opp], 'cs_diff_at_15': cs_15 - cs_15[opp],
+        'gold_diff_at_15': gold_15 - gold_15[opp], 'xp_diff_at_15': xp_15 - xp_15[opp],
+    }
+
+    champ_pick = rng.integers(0, 8, size=n_rows)
+    champion = np.array([CHAMPIONS[ROLES[r]][c] for r, c in zip(role_idx, champ_pick)], dtype=object)
+    items = rng.choice(ITEM_POOL, size=(n_rows, 7))
+    match_team_key = np.array([f"{mid}-{t}" for mid, t in zip(match_ids[row_match], team_id)], dtype=object)
+
+    df_perf = pd.DataFrame({
+        'match_id': match_ids[row_match], 'match_team_key': match_team_key,
+        'puuid': puuid, 'summoner_name': summoner_name,
+        'game_version': game_version[row_match], 'game_duration_sec': duration_sec[row_match],
+        'game_start_timestamp': ts[row_match],
+        'champion_name': champion, 'team_id': team_id, 'team_position': np.array(ROLES)[role_idx], 'win': win,
+        'total_gold_earned': total_gold, 'gold_spent': (total_gold * rng.uniform(0.85, 1.0, n_rows)).astype(int),
+        'total_cs': total_cs, 'neutral_minions_killed': neutral,
+        'primary_rune_id': rng.choice([8005, 8010, 8112, 8128, 8214, 8229, 8437, 8439], n_rows),
+        'secondary_style_id': rng.choice([8000, 8100, 8200, 8300, 8400], n_rows),
+        'summoner_spell1': 4, 'summoner_spell2': np.where(role_idx == 1, 11, rng.choice([3, 7, 12, 14], n_rows)),
+        'champion_mastery': (rng.lognormal(11, 1.0, n_rows)).astype(int),
+        'kills': kills, 'deaths': deaths, 'assists': assists,
+        'total_damage_dealt': dmg, 'physical_damage_dealt': phys,
+        'magic_damage_dealt': magic, 'true_damage_dealt': true_dmg,
+        'total_damage_taken': taken, 'damage_self_mitigated': mitigated,
+        'gold_per_min': np.round(total_gold / row_dur, 2), 'cs_per_min': np.round(total_cs / row_dur, 2),
+        'gold_velocity': np.round(gold_gain_10_20 / 10.0, 2),
+        'vision_score': vision, 'vision_wards_bought': (vision / np.where(role_idx == 4, 8, 15)).astype(int),
+        'time_cc_others': cc_time,
+        'total_heals_on_teammates': (np.where(role_idx == 4, 4000, 300) * scale * rng.lognormal(0, 0.5, n_rows)).astype(int),
+        'total_shields_on_teammates': (np.where(role_idx == 4, 3000, 200) * scale * rng.lognormal(0, 0.5, n_rows)).astype(int),
+        'total_time_spent_dead': (deaths * (10 + row_dur * 0.9) * rng.uniform(0.7, 1.2, n_rows)).astype(int),
+        'damage_to_objectives': obj_dmg,
+        'solo_kills': kda['solo_kills'], 'multikills': rng.poisson(kills * 0.08),
+        'pentakills': (rng.random(n_rows) < 0.002).astype(int),
+        'objectives_stolen': (rng.random(n_rows) < np.where(role_idx == 1, 0.04, 0.005)).astype(int),
+        'skillshots_dodged': rng.poisson(18 * scale),
+        'first_blood_kill': kda['first_blood'],
+        'spell_vamp': 0, 'kda': kda_ratio, 'kill_participation': kp,
+        **{f'item{i}': items[:, i] for i in range(7)},
+        'cs_at_10': cs_10, 'jungle_cs_at_10': (neutral_min * 9).astype(int),
+        'lane_cs_at_10': (lane_cs_min * 9).astype(int),
+        'gold_at_10': gold_10, 'xp_at_10': xp_10, 'level_at_10': np.clip(xp_10 // 560, 1, 18),
+        'kills_at_10': kda['kills_at_10'], 'deaths_at_10': kda['deaths_at_10'], 'assists_at_10': kda['assists_at_10'],
+        'solo_kills_at_10': kda['solo_kills_at_10'],
+        'turret_plates_taken': rng.poisson(np.where(role_idx == 4, 0.4, np.where(role_idx == 1, 0.2, 1.5)) * perf_mult),
+        'kp_at_10': np.round((kda['kills_at_10'] + kda['assists_at_10'])
+                             / np.maximum(np.repeat(np.add.reduceat(kda['kills_at_10'], np.arange(0, n_rows, 5)), 5), 1), 2),
+        'gold_spent_at_10': (gold_10 * rng.uniform(0.6, 0.95, n_rows)).astype(int),
+        'wards_placed_at_10': rng.poisson(np.where(role_idx == 4, 7, 3)),
+        'control_wards_placed_at_10': rng.poisson(np.where(role_idx == 4, 1.2, 0.4)),
+        'wards_killed_at_10': rng.poisson(np.where(role_idx == 4, 1.5, np.where(role_idx == 1, 1.0, 0.3))),
+        'cs_at_15': cs_15, 'gold_at_15': gold_15, 'xp_at_15': xp_15,
+        'gold_gain_10_20': gold_gain_10_20, 'xp_gain_10_20': xp_gain_10_20, 'cs_gain_10_20': cs_gain_10_20,
+        'kills_10_20': kda['kills_10_20'], 'deaths_10_20': kda['deaths_10_20'], 'assists_10_20': kda['assists_10_20'],
+        'kills_20_plus': kda['kills_20_plus'], 'deaths_20_plus': kda['deaths_20_plus'],
+        'assists_20_plus': kda['assists_20_plus'],
+        'baron_kills_20_plus': (rng.random(n_rows) < np.where(role_idx == 1, 0.35, 0.05) * win).astype(int),
+        **diffs,
+    })
+
+    df_teams = _generate_team_rows(rng, match_ids, blue_win, dur_min)
+    return df_perf, df_kills, df_teams
+
+
+def _generate_kill_events(rng, m, match_ids, duration_sec, strength, puuid, names):
+    """
+    Gera os abates de cada partida e agrega K/D/A por participante a partir deles,
+    garantindo que kills de um time == mortes do outro e que os eventos batam com a performance.
+    """
+    n_rows = m * 10
+    dur_min = duration_sec / 60.0
+    lam = dur_min * 0.95
+    lam_team = np.stack([lam * np.exp(0.25 * strength), lam * np.exp(-0.25 * strength)], axis=1)
+    n_team = rng.poisson(lam_team)                       # (m, 2) abates por time
+    n_match = n_team.sum(axis=1)
+    n_events = int(n_match.sum())
+
+    ev_match = np.repeat(np.arange(m), n_match)
+    # Dentro de cada partida, os primeiros n_team[:,0] eventos são do time azul
+    first = np.repeat(np.cumsum(n_match) - n_match, n_match)
+    pos_in_match = np.arange(n_events) - first
+    killer_team = (pos_in_match >= n_team[ev_match, 0]).astype(int)
+    victim_team = 1 - killer_team
+
+    prof = np.array([ROLE_PROFILES[r] for r in ROLES])
+    kill_w = prof[:, 11] / prof[:, 11].sum()
+    victim_w = prof[:, 12] / prof[:, 12].sum()
+    killer_role = rng.choice(5, size=n_events, p=kill_w)
+    victim_role = rng.choice(5, size=n_events, p=victim_w)
+
+    killer_row = ev_match * 10 + killer_team * 5 + killer_role
+    victim_row = ev_match * 10 + victim_team * 5 + victim_role
+
+    # Assistências: cada aliado do killer participa com p ~ 0.45 (suporte/jungle mais)
+    assist_p = np.array([0.35, 0.55, 0.45, 0.45, 0.65])
+    assist_mask = rng.random((n_events, 5)) < assist_p
+    assist_mask[np.arange(n_events), killer_role] = False
+    solo = ~assist_mask.any(axis=1)
+
+    # Os 6 bits baixos do timestamp carregam a posição do evento na partida -> death_id único
+    t_ms = (rng.random(n_events) * duration_sec[ev_match] * 1000).astype(np.int64)
+    t_ms = (t_ms & ~np.int64(63)) | (pos_in_match & 63)
+    t_min = t_ms / 60000.0
+
+    # Posição: início de jogo concentrado nas rotas do próprio lado; depois espalha pelo mapa
+    early = t_min <= 15
+    base_xy = rng.uniform(1500, MAP_SIZE - 1500, size=(n_events, 2))
+    own_side = np.where(killer_team[:, None] == 0,
+                        rng.uniform(1000, 8500, size=(n_events, 2)),
+                        rng.uniform(6300, 13800, size=(n_events, 2)))
+    invade = rng.random(n_events) < 0.25
+    xy = np.where((early & ~invade)[:, None], own_side, base_xy).astype(int)
+    in_base = ((xy[:, 0] < 2000) & (xy[:, 1] < 2000)) | ((xy[:, 0] > 12800) & (xy[:, 1] > 12800))
+
+    def per_row(mask=None, rows=killer_row):
+        sel = rows if mask is None else rows[mask]
+        return np.bincount(sel, minlength=n_rows)
+
+    assist_rows = ev_match[:, None] * 10 + killer_team[:, None] * 5 + np.arange(5)[None, :]
+    def assists_in(mask):
+        rows = assist_rows[mask] if mask is not None else assist_rows
+        msk = assist_mask[mask] if mask is not None else assist_mask
+        return np.bincount(rows[msk], minlength=n_rows)
+
+    w10 = t_min <= 10
+    w10_20 = (t_min > 10) & (t_min <= 20)
+    w20 = t_min > 20
+
+    # First blood: o evento de menor timestamp de cada partida
+    order = np.lexsort((t_ms, ev_match))
+    first_ev = order[np.r_[0, np.flatnonzero(np.diff(ev_match[order])) + 1]] if n_events else np.array([], dtype=int)
+    first_blood = np.zeros(n_rows, dtype=bool)
+    first_blood[killer_row[first_ev]] = True
+
+    kda = {
+        'kills': per_row(), 'deaths': per_row(rows=victim_row), 'assists': assists_in(None),
+        'solo_kills': per_row(solo), 'solo_kills_at_10': per_row(solo & w10),
+        'kills_at_10': per_row(w10), 'deaths_at_10': per_row(w10, victim_row), 'assists_at_10': assists_in(w10),
+        'kills_10_20': per_row(w10_20), 'deaths_10_20': per_row(w10_20, victim_row), 'assists_10_20': assists_in(w10_20),
+        'kills_20_plus': per_row(w20), 'deaths_20_plus': per_row(w20, victim_row), 'assists_20_plus': assists_in(w20),
+        'first_blood': first_blood,
+    }
+
+    # participantId segue a ordem das linhas dentro da partida (1..10)
+    killer_pid = killer_team * 5 + killer_role + 1
+    victim_pid = victim_team * 5 + victim_role + 1
+    ev_mid = match_ids[ev_match]
+    df_kills = pd.DataFrame({
+        'death_id': [f"{mid}_{t}_{v}" for mid, t, v in zip(ev_mid, t_ms, victim_pid)],
+        'match_id': ev_mid, 'event_time_min': np.round(t_min, 2),
+        'victim_id': victim_pid, 'victim_puuid': puuid[victim_row], 'victim_name': names[victim_row],
+        'victim_team_id': np.where(victim_team == 0, 100, 200),
+        'killer_id': killer_pid, 'killer_puuid': puuid[killer_row], 'killer_name': names[killer_row],
+        'pos_x': xy[:, 0], 'pos_y': xy[:, 1], 'is_in_base': in_base,
+    })
+    return df_kills, kda
+
+
+def _generate_team_rows(rng, match_ids, blue_win, dur_min):
+    m = len(match_ids)
+    win = np.stack([blue_win, ~blue_win], axis=1).reshape(-1)
+    w = win.astype(float)
+    dur = np.repeat(dur_min, 2)
+    dragons = rng.poisson(1.0 + 2.0 * w * dur / 30)
+    drakes = rng.multinomial(dragons, [0.2] * 5)        # nuvem, infernal, montanha, oceano, hextech
+    mid_team = np.repeat(match_ids, 2)
+    team_id = np.tile(TEAMS, m)
+    return pd.DataFrame({
+        'match_id': mid_team, 'match_team_key': [f"{mid}-{t}" for mid, t in zip(mid_team, team_id)],
+        'team_id': team_id, 'win': win,
+        'baron_kills': rng.poisson(0.2 + 0.8 * w * dur / 30), 'dragon_kills': dragons,
+        'tower_kills': np.clip(rng.poisson(2 + 6 * w), 0, 11),
+        'inhibitor_kills': np.where(win, rng.integers(1, 3, 2 * m), rng.poisson(0.2, 2 * m)),
+        'horde_kills': rng.integers(0, 7, 2 * m),
+        'cloud_kills': drakes[:, 0], 'infernal_kills': drakes[:, 1], 'mountain_kills': drakes[:, 2],
+        'ocean_kills': drakes[:, 3], 'hextech_kills': drakes[:, 4], 'chemtech_kills': 0,
+        'elder_kills': (rng.random(2 * m) < 0.05 * w * dur / 30).astype(int),
+    })
+
+
+def iter_synthetic_batches(n_matches, batch_size=20000, seed=42, region='KR'):
+    """Gera o dataset em lotes de `batch_size` partidas (memória constante)."""
+    for start in range(0, n_matches, batch_size):
+        size = min(batch_size, n_matches - start)
+        yield generate_matches(size, seed=seed, start_index=start, total_matches=n_matches, region=region)
+
+
+def write_parquet(out_dir, n_matches, batch_size=20000, seed=42, region='KR'):
+    """Grava o dataset como Parquet particionado: <out_dir>/<tabela>/part-00000.parquet"""
+    tables = (PERF_TABLE, KILLS_TABLE, TEAMS_TABLE)
+    for t in tables:
+        os.makedirs(os.path.join(out_dir, t), exist_ok=True)
+
+    total_rows = 0
+    for i, frames in enumerate(iter_synthetic_batches(n_matches, batch_size, seed, region)):
+        for t, df in zip(tables, frames):
+            df.to_parquet(os.path.join(out_dir, t, f"part-{i:05d}.parquet"), index=False)
+        total_rows += len(frames[0])
+        print(f"   🧪 Lote {i + 1}: {total_rows:,} linhas de performance geradas...")
+    print(f"✅ Dataset sintético salvo em: {out_dir}")
+    return total_rows
+
+
+def write_postgres(engine, n_matches, batch_size=20000, seed=42, region='KR'):
+    """Insere o dataset direto no PostgreSQL (via COPY). Use apenas em bancos locais de teste!"""
+    from sqlalchemy import inspect
+    from database import copy_dataframe
+
+    tables = (PERF_TABLE, KILLS_TABLE, TEAMS_TABLE)
+    total_rows = 0
+    for i, frames in enumerate(iter_synthetic_batches(n_matches, batch_size, seed, region)):
+        with engine.begin() as conn:
+            for t, df in zip(tables, frames):
+                # Respeita o esquema existente: colunas que a tabela não tem são ignoradas
+                if not inspect(conn).has_table(t):
+                    df.head(0).to_sql(t, conn, index=False)
+                existing = {c['name'] for c in inspect(conn).get_columns(t)}
+                copy_dataframe(conn, df, t, columns=[c for c in df.columns if c in existing])
+        total_rows += len(frames[0])
+        print(f"   🧪 Lote {i + 1}: {total_rows:,} linhas de performance inseridas...")
+
+    # Diretório de jogadores (busca por nome / autocomplete)
+    from etl.players import rebuild_player_directory
+    from etl.versions import GLOBAL_SCOPE, ensure_version_table, bump_versions
+    rebuild_player_directory(engine)
+    ensure_version_table(engine)
+    with engine.begin() as conn:
+        bump_versions(conn, [GLOBAL_SCOPE])  # Carga em massa: invalida todo o cache da API
+    print("✅ Dataset sintético carregado no PostgreSQL.")
+    return total_rows
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+
+from database import get_engine
+
+# Contadores de versão dos dados, incrementados por quem grava (coletor, predições, cargas em massa).
+# A API guarda no cache de respostas a versão vista no cálculo; versão nova = entrada inválida.
+#   'global'  -> cargas em massa / reconstruções (invalida tudo)
+#   'ranking' -> rollup do ranking mudou (run_predictions)
+#   'players' -> diretório de jogadores mudou (coletor)
+#   <puuid>   -> novas partidas daquele jogador (histórico)
+
+VERSION_TABLE = 'data_version'
+GLOBAL_SCOPE = 'global'
+RANKING_SCOPE = 'ranking'
+PLAYERS_SCOPE = 'players'
+
+VERSION_DDL = f"""
+CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+    scope VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+_table_ready = False
+
+def ensure_version_table(engine=None):
+    """Cria a tabela na 1ª utilização do processo (idempotente)."""
+    global _table_ready
+    if _table_ready: return
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(VERSION_DDL))
+    _table_ready = True
+
+def bump_versions(conn, scopes):
+    """Incrementa os escopos (rode na MESMA transação que grava os dados)."""
+    scopes = sorted({str(s) for s in scopes if s})  # Ordem fixa evita deadlock entre gravadores
+    if not scopes: return 0
+    conn.execute(text(f"""
+        INSERT INTO {VERSION_TABLE} (scope, version) VALUES (:scope, 1)
+        ON CONFLICT (scope) DO UPDATE SET version = {VERSION_TABLE}.version + 1, updated_at = CURRENT_TIMESTAMP
+    """), [{"scope": s} for s in scopes])
+    return len(scopes)
+
+def read_versions(conn, scopes):
+    """{escopo: versão}; escopo nunca incrementado vale 0."""
+    scopes = list(dict.fromkeys(str(s) for s in scopes))
+    rows = conn.execute(text(f"SELECT scope, version FROM {VERSION_TABLE} WHERE scope = ANY(:scopes)"), {"scopes": scopes})
+    found = {scope: int(version) for scope, version in rows}
+    return {s: found.get(s, 0) for s in scopes}
@@ -0,0 +1,103 @@
+from sqlalchemy import text
+
+from database import get_engine, INGEST_APPLICATION
+
+# Marcas d'água (high-water marks) dos pipelines incrementais.
+# Cada linha de performance ganha `ingested_at` (preenchido pelo banco no INSERT/COPY); o pipeline
+# guarda a última chave processada (ingested_at, match_id, puuid) e na próxima rodada lê só o que
+# veio depois dela, em ordem de chave (keyset), sem anti-join contra a tabela de destino.
+# A marca avança na MESMA transação que grava o resultado do bloco: se cair no meio, recomeça
+# do último bloco confirmado.
+#
+# Transações em voo: `ingested_at` = now() = INÍCIO da transação de ingestão, não o commit. Uma
+# ingestão longa pode confirmar linhas com carimbo antigo depois que o pipeline já leu (e passou
+# a marca por) aquele intervalo. Por isso o limite superior de cada rodada (safe_upper) nunca passa
+# do início da transação de ingestão aberta mais antiga: toda linha ainda não confirmada tem
+# ingested_at >= esse instante, então tudo abaixo do limite já está visível e pode ser marcado.
+# Premissas: quem grava em fact_match_player_performance usa database.get_ingest_engine()
+# (application_name = INGEST_APPLICATION) e o pipeline enxerga essas sessões no pg_stat_activity
+# (mesmo usuário do banco ou papel pg_read_all_stats). Outras transações longas (autovacuum,
+# pg_dump, cursores de leitura do treino, workers do rescore) não seguram a marca.
+
+WATERMARK_TABLE = 'etl_watermark'
+PREDICTIONS_PIPELINE = 'predictions'
+PERF_TABLE = 'fact_match_player_performance'
+
+WATERMARK_DDL = f"""
+CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+    pipeline VARCHAR(50) PRIMARY KEY,
+    ingested_at TIMESTAMPTZ,
+    match_id VARCHAR(50),
+    puuid VARCHAR(100),
+    rows_total BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Linhas já existentes recebem o instante da migração (default constante: sem reescrever a tabela).
+# O índice cobre a ordem do keyset.
+INGEST_DDL = f"""
+ALTER TABLE {PERF_TABLE} ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_perf_ingest ON {PERF_TABLE} (ingested_at, match_id, puuid);
+"""
+
+# Transações de ingestão abertas (inclusive "idle in transaction" e as ainda sem escrita: a próxima
+# linha que gravarem recebe o xact_start como ingested_at)
+SAFE_UPPER_SQL = """
+WITH bound AS (
+    SELECT now() - make_interval(secs => :lag) AS target,
+           (SELECT MIN(xact_start) FROM pg_stat_activity
+            WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL
+              AND backend_type = 'client backend' AND application_name = :app) AS oldest_ingest
+)
+SELECT LEAST(target, oldest_ingest) AS upper, target, oldest_ingest FROM bound
+"""
+
+_table_ready = False
+
+def ensure_watermark_table(engine=None):
+    """Cria a tabela de marcas e a coluna/índice de ingestão na 1ª utilização do processo (idempotente)."""
+    global _table_ready
+    if _table_ready: return
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(WATERMARK_DDL))
+        conn.execute(text(INGEST_DDL))
+    _table_ready = True
+
+def safe_upper(conn, lag_s, stall_warn_s=None):
+    """
+    Limite superior de ingested_at para uma rodada: now() - lag_s, recuado até o início da
+    transação de ingestão aberta mais antiga (nenhuma linha abaixo dele pode ser confirmada depois).
+    Avisa quando o recuo passa de `stall_warn_s` (marca d'água parada por uma ingestão presa).
+    """
+    row = conn.execute(text(SAFE_UPPER_SQL), {"lag": lag_s, "app": INGEST_APPLICATION}).mappings().one()
+    held = (row['target'] - row['upper']).total_seconds()
+    if stall_warn_s is not None and held > stall_warn_s:
+        print(f"   ⚠️ Marca d'água segurada {held:,.0f}s: transação de ingestão aberta desde {row['oldest_ingest']}")
+    return row['upper']
+
+def read_watermark(conn, pipeline):
+    """Última chave processada {'ingested_at', 'match_id', 'puuid', 'rows_total'}; None se nunca rodou."""
+    row = conn.execute(text(f"""
+        SELECT ingested_at, match_id, puuid, rows_total FROM {WATERMARK_TABLE} WHERE pipeline = :pipeline
+    """), {"pipeline": pipeline}).mappings().first()
+    return dict(row) if row else None
+
+def advance_watermark(conn, pipeline, key, rows):
+    """Grava a nova marca (rode na MESMA transação que grava o bloco). `key` = (ingested_at, match_id, puuid)."""
+    ingested_at, match_id, puuid = key
+    conn.execute(text(f"""
+        INSERT INTO {WATERMARK_TABLE} (pipeline, ingested_at, match_id, puuid, rows_total)
+        VALUES (:pipeline, :ingested_at, :match_id, :puuid, :rows)
+        ON CONFLICT (pipeline) DO UPDATE SET
+            ingested_at = EXCLUDED.ingested_at, match_id = EXCLUDED.match_id, puuid = EXCLUDED.puuid,
+            rows_total = {WATERMARK_TABLE}.rows_total + EXCLUDED.rows_total, updated_at = CURRENT_TIMESTAMP
+    """), {"pipeline": pipeline, "ingested_at": ingested_at, "match_id": match_id, "puuid": puuid, "rows": rows})
+
+def reset_watermark(pipeline, engine=None):
+    """Volta o pipeline ao início (ex.: depois de recriar a tabela de destino)."""
+    engine = engine or get_engine()
+    ensure_watermark_table(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {WATERMARK_TABLE} WHERE pipeline = :pipeline"), {"pipeline": pipeline})
@@ -2,24 +2,30 @@ import pandas as pd
 import numpy as np
 from config import settings
 
-def calculate_zscore_by_group(df: pd.DataFrame, target_col: str, group_col: str, epsilon: float = 0.001) -> pd.Series:
-    if target_col not in df.columns: return pd.Series(0.0, index=df.index)
-    
-    def z_score_func(x):
-        std = x.std()
-        safe_std = max(std, epsilon)
-        return (x - x.mean()) / safe_std
-        
-    return df.groupby(group_col)[target_col].transform(z_score_func).fillna(0.0)
-
-def calculate_rolling_stat(df, target_col, group_col, window, min_periods, stat_type='mean'):
-    if target_col not in df.columns: return pd.Series(0.0, index=df.index)
-    grouped = df.groupby(group_col)[target_col]
-    if stat_type == 'mean': return grouped.transform(lambda x: x.rolling(window, min_periods).mean()).fillna(0.0)
-    elif stat_type == 'std': return grouped.transform(lambda x: x.rolling(window, min_periods).std()).fillna(0.0)
-    return pd.Series(0.0, index=df.index)
+def _group_keys(group_col, partition_col=None):
+    """Chave de agrupamento; com `partition_col` os grupos não cruzam partições (ex.: match_id)."""
+    keys = list(group_col) if isinstance(group_col, (list, tuple)) else [group_col]
+    return ([partition_col] if partition_col else []) + keys
 
-def apply_v9_context_features(df: pd.DataFrame) -> pd.DataFrame:
+def calculate_zscore_by_group(df: pd.DataFrame, target_col: str, group_col, epsilon: float = 0.001, partition_col: str = None) -> pd.Series:
+    if target_col not in df.columns: return pd.Series(0.0, index=df.index)
+    # Agregações nativas do groupby (sem lambda por grupo): mesmo resultado, ordens de grandeza mais rápido
+    grouped = df.groupby(_group_keys(group_col, partition_col))[target_col]
+    mean = grouped.transform('mean')
+    safe_std = grouped.transform('std').clip(lower=epsilon)
+    return ((df[target_col] - mean) / safe_std).fillna(0.0)
+
+def calculate_rolling_stat(df, target_col, group_col, window, min_periods, stat_type='mean', partition_col=None):
+    if target_col not in df.columns or stat_type not in ('mean', 'std'): return pd.Series(0.0, index=df.index)
+    keys = _group_keys(group_col, partition_col)
+    # Índice posicional: o resultado do groupby().rolling() volta alinhado mesmo com índice duplicado
+    values = pd.Series(df[target_col].to_numpy(), index=np.arange(len(df)))
+    rolling = values.groupby([df[k].to_numpy() for k in keys]).rolling(window, min_periods)
+    stat = rolling.mean() if stat_type == 'mean' else rolling.std()
+    stat = stat.droplevel(list(range(len(keys)))).reindex(np.arange(len(df)))
+    return pd.Series(stat.to_numpy(), index=df.index).fillna(0.0)
+
+def apply_v9_context_features(df: pd.DataFrame, partition_col: str = None) -> pd.DataFrame:
     """
     [FASE 2] Cria as features de 'Inteligência Invisível' para o Estágio 2 de Calibração.
     """
@@ -27,13 +33,13 @@ def apply_v9_context_features(df: pd.DataFrame) -> pd.DataFrame:
     # A. PRESSURE ABSORPTION INDEX
     if 'damage_self_mitigated' in df.columns and 'total_damage_taken' in df.columns:
         df['raw_pressure'] = (df['damage_self_mitigated'] + df['total_damage_taken']) / (df['deaths'] + 1)
-        df['pressure_absorption_rel'] = calculate_zscore_by_group(df, 'raw_pressure', 'team_position')
+        df['pressure_absorption_rel'] = calculate_zscore_by_group(df, 'raw_pressure', 'team_position', partition_col=partition_col)
     else:
         df['pressure_absorption_rel'] = 0.0
 
     # B. PASSIVE KDA INDEX
     if 'dpm' in df.columns and 'kda' in df.columns:
-        df['dpm_rel'] = calculate_zscore_by_group(df, 'dpm', 'team_position')
+        df['dpm_rel'] = calculate_zscore_by_group(df, 'dpm', 'team_position', partition_col=partition_col)
         df['passivity_index'] = (df['kda'] / 3.0) - (df['dpm_rel'])
         df['passivity_index'] = df['passivity_index'].clip(lower=0)
     else:
@@ -43,13 +49,18 @@ def apply_v9_context_features(df: pd.DataFrame) -> pd.DataFrame:
     # Nota: Agora usamos 'gold_earned' (que foi renomeado no prepare_data)
     if 'gold_earned' in df.columns:
         df['resourcefulness'] = df['gold_earned'] / (df['kills'] + 1)
-        df['resilience_rel'] = calculate_zscore_by_group(df, 'resourcefulness', 'team_position')
+        df['resilience_rel'] = calculate_zscore_by_group(df, 'resourcefulness', 'team_position', partition_col=partition_col)
     else:
         df['resilience_rel'] = 0.0
 
     return df
 
-def prepare_data_for_ml(df: pd.DataFrame) -> pd.DataFrame:
+def prepare_data_for_ml(df: pd.DataFrame, partition_col: str = None) -> pd.DataFrame:
+    """
+    Engenharia de features. Com `partition_col` (ex.: 'match_id') cada partição é tratada
+    como se fosse processada sozinha -- z-scores e janelas não se misturam entre partições.
+    Permite processar um lote de partidas numa única chamada com o mesmo resultado.
+    """
     df = df.copy()
     
     # --- 0. PADRONIZAÇÃO DE NOMES (CORREÇÃO DE ESQUEMA DB) ---
@@ -101,24 +112,24 @@ def prepare_data_for_ml(df: pd.DataFrame) -> pd.DataFrame:
 
     # 1. OBJECTIVE FOCUS RATIO 
     df['objective_focus_ratio'] = (df['damage_to_objectives'] + 1) / (df['total_damage_dealt'] + 1)
-    df['objective_focus_rel'] = calculate_zscore_by_group(df, 'objective_focus_ratio', 'team_position')
+    df['objective_focus_rel'] = calculate_zscore_by_group(df, 'objective_focus_ratio', 'team_position', partition_col=partition_col)
 
     # 2. LETHALITY EFFICIENCY 
     df['lethality_raw'] = df['total_damage_dealt'] / (df['kills'] + df['assists'] + 1)
-    df['lethality_efficiency_rel'] = calculate_zscore_by_group(df, 'lethality_raw', 'team_position') * -1
+    df['lethality_efficiency_rel'] = calculate_zscore_by_group(df, 'lethality_raw', 'team_position', partition_col=partition_col) * -1
 
     # 3. PROFITABLE LEAD 
     df['profitable_lead_score'] = df['gold_diff_at_15'].clip(lower=0) * np.log1p(df['damage_to_objectives'])
-    df['profitable_lead_rel'] = calculate_zscore_by_group(df, 'profitable_lead_score', 'team_position')
+    df['profitable_lead_rel'] = calculate_zscore_by_group(df, 'profitable_lead_score', 'team_position', partition_col=partition_col)
 
     # 4. VISION DENIAL RATIO
     df['vision_denial_ratio'] = df['wards_killed_at_10'] / (df['vision_score'] + 1)
-    df['vision_denial_rel'] = calculate_zscore_by_group(df, 'vision_denial_ratio', 'team_position')
+    df['vision_denial_rel'] = calculate_zscore_by_group(df, 'vision_denial_ratio', 'team_position', partition_col=partition_col)
 
     # Lane Pressure
     df['lane_pressure_index'] = (df['xp_diff_at_15'] * 0.5) + (df['gold_diff_at_15'] * 0.3) + (df['turret_plates_taken'] * 200)
     df['lane_pressure_index'] = df['lane_pressure_index'].clip(-3000, 3000)
-    df['lane_pressure_index_rel'] = calculate_zscore_by_group(df, 'lane_pressure_index', 'team_position')
+    df['lane_pressure_index_rel'] = calculate_zscore_by_group(df, 'lane_pressure_index', 'team_position', partition_col=partition_col)
 
     # Roam Impact
     assists_early = df.get('assists_at_15', df['assists'] * 0.3)
@@ -126,7 +137,7 @@ def prepare_data_for_ml(df: pd.DataFrame) -> pd.DataFrame:
     df['roam_impact_score'] = (invade * 100) + (assists_early * 50)
     cs_penalty = np.where(df['cs_diff_at_15'] < -20, abs(df['cs_diff_at_15']), 0)
     df['roam_impact_score'] -= (cs_penalty * 2)
-    df['roam_impact_score_rel'] = calculate_zscore_by_group(df, 'roam_impact_score', 'team_position')
+    df['roam_impact_score_rel'] = calculate_zscore_by_group(df, 'roam_impact_score', 'team_position', partition_col=partition_col)
 
     # Jungle Richness
     df['jungle_richness_score'] = np.where(
@@ -134,28 +145,110 @@ def prepare_data_for_ml(df: pd.DataFrame) -> pd.DataFrame:
         df['neutral_minions_killed'] / (df['game_duration_min'] + 1),
         0
     )
-    df['jungle_richness_score_rel'] = calculate_zscore_by_group(df, 'jungle_richness_score', 'team_position')
+    df['jungle_richness_score_rel'] = calculate_zscore_by_group(df, 'jungle_richness_score', 'team_position', partition_col=partition_col)
     
     # Split Push Index
     df['raw_kp_score'] = (df['kills'] + df['assists']).clip(lower=0)
     df['split_push_index'] = np.log1p(df['damage_to_objectives']) / (df['raw_kp_score'] + 1)
-    df['split_push_index_rel'] = calculate_zscore_by_group(df, 'split_push_index', 'team_position')
+    df['split_push_index_rel'] = calculate_zscore_by_group(df, 'split_push_index', 'team_position', partition_col=partition_col)
 
     # Map Presence
     df['map_presence_efficiency'] = ((df['kills'] + df['assists']) / (df['total_time_spent_dead'] + 60))
-    df['map_presence_efficiency_rel'] = calculate_zscore_by_group(df, 'map_presence_efficiency', 'team_position')
+    df['map_presence_efficiency_rel'] = calculate_zscore_by_group(df, 'map_presence_efficiency', 'team_position', partition_col=partition_col)
 
     # Features de Forma
-    df['recent_form'] = calculate_rolling_stat(df, 'gold_velocity', 'puuid', WINDOW, MIN_PER, 'mean')
-    df['performance_stability'] = 1 / (1 + calculate_rolling_stat(df, 'gold_velocity', 'puuid', WINDOW, MIN_PER, 'std'))
+    df['recent_form'] = calculate_rolling_stat(df, 'gold_velocity', 'puuid', WINDOW, MIN_PER, 'mean', partition_col)
+    df['performance_stability'] = 1 / (1 + calculate_rolling_stat(df, 'gold_velocity', 'puuid', WINDOW, MIN_PER, 'std', partition_col))
 
     # Métricas Base
     metrics_norm = ['cs_at_10', 'gold_at_10', 'xp_diff_at_15']
     for col in metrics_norm:
         if col in df.columns:
-            df[f'{col}_rel'] = calculate_zscore_by_group(df, col, 'team_position', EPSILON)
+            df[f'{col}_rel'] = calculate_zscore_by_group(df, col, 'team_position', EPSILON, partition_col)
 
     # Aplica Fase 2 (v9)
-    df = apply_v9_context_features(df)
+    df = apply_v9_context_features(df, partition_col)
 
-    return df
\ No newline at end of file
+    return df
+# =========================================================================
+# MODO STREAMING (treino escalável, dados em blocos)
+# =========================================================================
+# prepare_data_for_ml num bloco isolado calcula z-scores só com o bloco e perde o histórico
+# das janelas por jogador. Para reproduzir o resultado do histórico inteiro bloco a bloco:
+#   1. uma passada acumula (n, média, M2) por role de cada coluna bruta (combináveis entre blocos);
+#   2. na passada de treino, cada bloco (em ordem temporal) recebe os z-scores com essas
+#      estatísticas globais e as janelas por puuid continuam da cauda dos blocos anteriores.
+# Colunas z-score -> (coluna bruta, sinal, epsilon; None = features.z_score_epsilon). Manter em
+# sincronia com prepare_data_for_ml (tests/test_features.py compara os dois caminhos).
+ZSCORE_FEATURES = {
+    'objective_focus_rel': ('objective_focus_ratio', 1, 0.001),
+    'lethality_efficiency_rel': ('lethality_raw', -1, 0.001),
+    'profitable_lead_rel': ('profitable_lead_score', 1, 0.001),
+    'vision_denial_rel': ('vision_denial_ratio', 1, 0.001),
+    'lane_pressure_index_rel': ('lane_pressure_index', 1, 0.001),
+    'roam_impact_score_rel': ('roam_impact_score', 1, 0.001),
+    'jungle_richness_score_rel': ('jungle_richness_score', 1, 0.001),
+    'split_push_index_rel': ('split_push_index', 1, 0.001),
+    'map_presence_efficiency_rel': ('map_presence_efficiency', 1, 0.001),
+    'cs_at_10_rel': ('cs_at_10', 1, None),
+    'gold_at_10_rel': ('gold_at_10', 1, None),
+    'xp_diff_at_15_rel': ('xp_diff_at_15', 1, None),
+}
+
+def group_moments(df, group_col='team_position'):
+    """{coluna bruta: DataFrame(role -> n, mean, m2)} de um bloco já processado."""
+    moments = {}
+    for raw, _, _ in ZSCORE_FEATURES.values():
+        if raw not in df.columns: continue
+        g = df.groupby(group_col)[raw]
+        n, mean = g.count(), g.mean()
+        moments[raw] = pd.DataFrame({'n': n, 'mean': mean, 'm2': g.var(ddof=0) * n}).fillna(0.0)
+    return moments
+
+def merge_moments(a, b):
+    """Combina estatísticas de dois blocos (Chan et al.): mesmo resultado de calcular tudo junto."""
+    merged = dict(a)
+    for col, mb in b.items():
+        if col not in a:
+            merged[col] = mb
+            continue
+        ma, mb = a[col].align(mb, fill_value=0.0)
+        n = ma['n'] + mb['n']
+        delta = mb['mean'] - ma['mean']
+        w = (mb['n'] / n.where(n > 0)).fillna(0.0)
+        merged[col] = pd.DataFrame({'n': n, 'mean': ma['mean'] + delta * w,
+                                    'm2': ma['m2'] + mb['m2'] + delta ** 2 * ma['n'] * w})
+    return merged
+
+def apply_global_zscores(df, moments, group_col='team_position'):
+    """Refaz as colunas *_rel do modelo com média/desvio por role do histórico inteiro."""
+    for rel, (raw, sign, epsilon) in ZSCORE_FEATURES.items():
+        if raw not in moments or raw not in df.columns: continue
+        m = moments[raw]
+        epsilon = settings['features']['z_score_epsilon'] if epsilon is None else epsilon
+        std = np.sqrt(m['m2'] / (m['n'] - 1).where(m['n'] > 1)).clip(lower=epsilon)
+        role = df[group_col]
+        z = (df[raw] - role.map(m['mean'])) / role.map(std)
+        df[rel] = z.fillna(0.0) * sign
+    return df
+
+def apply_rolling_history(df, tail=None):
+    """
+    recent_form / performance_stability continuando as janelas por puuid dos blocos anteriores.
+    `tail`: últimas (janela - 1) partidas de cada jogador (puuid, game_start_timestamp, gold_velocity).
+    Retorna (df, nova cauda). Os blocos precisam chegar em ordem temporal.
+    """
+    window, min_periods = settings['features']['rolling_window'], settings['features']['min_periods']
+    cols = ['puuid', 'game_start_timestamp', 'gold_velocity']
+    current = df[cols].assign(_row=np.arange(len(df)))
+    hist = current if tail is None or tail.empty else pd.concat([tail.assign(_row=-1), current], ignore_index=True)
+    hist = hist.sort_values(['puuid', 'game_start_timestamp'], kind='stable').reset_index(drop=True)
+    mean = calculate_rolling_stat(hist, 'gold_velocity', 'puuid', window, min_periods, 'mean')
+    std = calculate_rolling_stat(hist, 'gold_velocity', 'puuid', window, min_periods, 'std')
+    own = hist['_row'].to_numpy() >= 0
+    order = hist.loc[own, '_row'].to_numpy()
+    df = df.copy()
+    df.iloc[order, df.columns.get_loc('recent_form')] = mean[own].to_numpy()
+    df.iloc[order, df.columns.get_loc('performance_stability')] = 1 / (1 + std[own].to_numpy())
+    new_tail = hist.groupby('puuid', sort=False).tail(max(window - 1, 0))[cols]
+    return df, new_tail
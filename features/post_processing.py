@@ -78,33 +78,39 @@ def calculate_ai_score(df):
     # Clip Final (0-100)
     df['ai_score'] = final_score.clip(0, 100).round(1)
 
-    # Gera Labels e Textos
-    df['ai_rank'] = df['ai_score'].apply(get_rank_label)
-    df['ai_rating_text'] = df.apply(generate_feedback_text, axis=1)
+    # Gera Labels e Textos (vetorizado: faixas por searchsorted/np.select, saída categórica)
+    df['ai_rank'] = rank_labels(df['ai_score'])
+    df['ai_rating_text'] = feedback_texts(df['ai_score'], df['win'] if 'win' in df.columns else None)
 
     return df
 
-def get_rank_label(score):
-    if score >= 85: return 'S+' # Ajustado de 90 para 85 ser mais atingível
-    if score >= 75: return 'S'
-    if score >= 65: return 'A'
-    if score >= 55: return 'B'
-    if score >= 45: return 'C'
-    if score >= 30: return 'D'
-    return 'F'
+# Faixas do rank: score >= RANK_THRESHOLDS[i] -> RANK_LABELS[i + 1] (S+ ajustado de 90 para 85 ser mais atingível)
+RANK_THRESHOLDS = np.array([30, 45, 55, 65, 75, 85])
+RANK_LABELS = ['F', 'D', 'C', 'B', 'A', 'S', 'S+']
 
-def generate_feedback_text(row):
-    score = row.get('ai_score', 50)
-    is_win = row.get('win', False)
-    
-    if score >= 80:
-        return "MVP / SVP: Performance de elite."
-    elif score >= 65:
-        return "Muito bom: Impacto positivo consistente."
-    elif score >= 50:
-        return "Na média: Cumpriu sua função."
-    elif score >= 40:
-        if is_win: return "Carregado: Vitória apesar do desempenho."
-        else: return "Abaixo da média: Dificuldade na partida."
-    else:
-        return "Crítico: Precisa rever fundamentos (Farm/Mortes)."
\ No newline at end of file
+FEEDBACK_TEXTS = {
+    'elite': "MVP / SVP: Performance de elite.",
+    'good': "Muito bom: Impacto positivo consistente.",
+    'average': "Na média: Cumpriu sua função.",
+    'carried': "Carregado: Vitória apesar do desempenho.",
+    'below': "Abaixo da média: Dificuldade na partida.",
+    'critical': "Crítico: Precisa rever fundamentos (Farm/Mortes).",
+}
+
+def rank_labels(scores):
+    """Rank (S+ ... F) de cada score, como Categorical ordenado. Score ausente vira 'F'."""
+    values = np.asarray(scores, dtype=np.float64)
+    codes = np.searchsorted(RANK_THRESHOLDS, values, side='right')
+    codes[np.isnan(values)] = 0
+    return pd.Categorical.from_codes(codes, categories=RANK_LABELS, ordered=True)
+
+def feedback_texts(scores, win=None):
+    """Texto de feedback por faixa de score; entre 40 e 50 a vitória separa 'Carregado' de 'Abaixo'."""
+    values = np.asarray(scores, dtype=np.float64)
+    is_win = np.zeros(len(values), dtype=bool) if win is None else np.asarray(win, dtype=object).astype(bool)
+    codes = np.select(
+        [values >= 80, values >= 65, values >= 50, (values >= 40) & is_win, values >= 40],
+        [0, 1, 2, 3, 4],
+        default=5,
+    )
+    return pd.Categorical.from_codes(codes, categories=list(FEEDBACK_TEXTS.values()))
@@ -6,10 +6,7 @@ import concurrent.futures
 import unittest
 
 # --- IMPORTAÇÕES DO PROJETO ---
-from etl.riot_collector import RiotETL
-from database import reset_predictions_table
-from etl.monitor import watch_stats
-# from models.validation import run_brier_check, run_ablation_study # Comentado para economizar RAM na VPS se não usar
+# Todas tardias (dentro de cada comando): `main.py <cmd>` só paga o import do que usa.
 
 # --- LISTA DE AMIGOS (SEEDS) ---
 FRIENDS_LIST = [
@@ -40,12 +37,14 @@ def download_and_save_queue(etl, match_queue, label="Geral"):
             continue
             
         try:
-            perf, kills, teams = etl.process_match_full(m_id)
+            perf, kills, teams, players = etl.process_match_full(m_id)
             
             if perf:
                 etl.upsert(etl.tbl_perf, perf, ['match_id', 'puuid'])
                 etl.upsert(etl.tbl_kills, kills, ['death_id'])
                 etl.upsert(etl.tbl_teams, teams, ['match_id', 'team_id'])
+                etl.upsert_players(players)
+                etl.bump_data_versions({p['puuid'] for p in perf})
                 new_count += 1
         except Exception as e:
             print(f"⚠️ Erro ao salvar partida {m_id}: {e}")
@@ -54,6 +53,7 @@ def download_and_save_queue(etl, match_queue, label="Geral"):
 
 def process_region_group(targets, group_name):
     """Processa regiões sequencialmente (compartilham Rate Limit)."""
+    from etl.riot_collector import RiotETL # Import tardio
     print(f"\n🚀 [THREAD {group_name}] Iniciando...")
     for target in targets:
         print(f"\n✈️  [{group_name}] VIAJANDO PARA: {target['label']}")
@@ -91,6 +91,7 @@ def process_region_group(targets, group_name):
 # ==============================================================================
 def run_friends():
     print("\n🤝 INICIANDO COLETA: AMIGOS...")
+    from etl.riot_collector import RiotETL # Import tardio
     etl = RiotETL() 
     match_queue = set()
     print("   🔎 Buscando PUUIDs e Partidas...")
@@ -145,22 +146,51 @@ def run_pros_parallel(max_workers=4):
 # ==============================================================================
 # 3. WRAPPERS DE MODELO
 # ==============================================================================
-def run_train():
+def run_train(scalable=False, source=None, chunk_size=None, external_memory=None):
+    if scalable:
+        from models.trainer import train_model_scalable
+        train_model_scalable(source=source, chunk_size=chunk_size, external_memory=external_memory)
+        return
     from models.trainer import train_model
     train_model()
 
-def run_predict():
+def run_predict(chunk_size=None):
     from models.predictor import run_predictions
-    run_predictions()
+    run_predictions(chunk_size=chunk_size)
 
-def run_explain():
+def run_explain(workers=None, threads=None, per_stratum=None, source=None, refresh=False):
     from models.explainability import explain_model
-    explain_model()
+    explain_model(workers=workers, thread_budget=threads, per_stratum=per_stratum, source=source, refresh=refresh)
+
+def run_bench(sizes, cases, repeat, source=None, output=None, save_baseline=False, compare=None, tolerance=0.15):
+    from benchmarks.suite import run_benchmarks, save_results, load_results, compare_results, BASELINE_FILE
+    report = run_benchmarks(sizes=sizes, cases=cases, repeat=repeat, source=source)
+    save_results(report, output)
+    if save_baseline:
+        save_results(report, BASELINE_FILE)
+    if compare is not None:
+        baseline_path = compare or BASELINE_FILE
+        if not os.path.exists(baseline_path):
+            print(f"❌ Baseline não encontrado: {baseline_path} (rode com --save-baseline primeiro)")
+            return 1
+        if compare_results(report, load_results(baseline_path), tolerance=tolerance):
+            return 1
+    return 0
+
+def run_synth(n_matches, out_dir, seed=42, region='KR', batch_size=20000, to_db=False):
+    from etl.synthetic import write_parquet, write_postgres
+    print(f"\n🧪 GERANDO {n_matches:,} PARTIDAS SINTÉTICAS (seed={seed}, região={region})...")
+    if to_db:
+        from database import get_ingest_engine
+        write_postgres(get_ingest_engine(), n_matches, batch_size=batch_size, seed=seed, region=region)
+    else:
+        write_parquet(out_dir, n_matches, batch_size=batch_size, seed=seed, region=region)
 
 # ==============================================================================
 # 4. ENTRY POINT (CLI)
 # ==============================================================================
-if __name__ == "__main__":
+def build_parser():
+    """Parser da CLI (separado do roteamento para ser testável)."""
     parser = argparse.ArgumentParser(description="LoL Analytics v8.1 - Central de Comando")
     subparsers = parser.add_subparsers(dest='command', help='Comando a executar')
 
@@ -175,15 +205,105 @@ if __name__ == "__main__":
     subparsers.add_parser('init-db', help='[PERIGO] Reseta tabela de predições')
     
     # --- Grupo: Machine Learning ---
-    subparsers.add_parser('train', help='Treina o modelo XGBoost')
-    subparsers.add_parser('predict', help='Roda predições em novos jogos')
-    subparsers.add_parser('explain', help='Gera gráficos SHAP')
+    train_parser = subparsers.add_parser('train', help='Treina o modelo XGBoost')
+    train_parser.add_argument('--scalable', action='store_true', help='Treino em blocos (QuantileDMatrix + early stopping temporal)')
+    train_parser.add_argument('--source', default=None, help='Snapshot Parquet em vez do PostgreSQL (modo escalável)')
+    train_parser.add_argument('--chunk-size', type=int, default=None, help='Linhas por bloco (modo escalável)')
+    train_parser.add_argument('--external-memory', action='store_true', default=None, help='Páginas quantizadas em disco (dados > RAM)')
+    arch_parser = subparsers.add_parser('archetypes', help='Treina os arquétipos de estilo em streaming (IncrementalPCA + MiniBatchKMeans)')
+    arch_parser.add_argument('--source', default=None, help='Snapshot Parquet em vez do PostgreSQL')
+    arch_parser.add_argument('--chunk-size', type=int, default=None, help='Linhas por bloco (Def: 50000)')
+    arch_parser.add_argument('--refresh', action='store_true', help='Só partidas novas, continuando o artefato atual')
+    predict_parser = subparsers.add_parser('predict', help='Roda predições em novos jogos (incremental, por marca d\'água)')
+    predict_parser.add_argument('--chunk-size', type=int, default=None, help='Linhas por bloco (Def: model.prediction.chunk_size)')
+    subparsers.add_parser('rebuild-ranking', help='Reconstrói o rollup do ranking a partir das predições')
+    subparsers.add_parser('build-players', help='Popula o diretório de jogadores (dim_player) a partir do histórico')
+    explain_parser = subparsers.add_parser('explain', help='Gera gráficos SHAP por role e comparação entre patches')
+    explain_parser.add_argument('--workers', type=int, default=None, help='Processos em paralelo (Def: nº de CPUs)')
+    explain_parser.add_argument('--threads', type=int, default=None, help='Orçamento total de threads, dividido entre os processos')
+    explain_parser.add_argument('--per-stratum', type=int, default=None, help='Linhas amostradas por role x patch (Def: 400)')
+    explain_parser.add_argument('--source', default=None, help='Snapshot Parquet em vez do PostgreSQL')
+    explain_parser.add_argument('--refresh', action='store_true', help='Ignora o cache de SHAP e reamostra')
+    warm_parser = subparsers.add_parser('warm-coach', help='Pré-calcula o cache de análises do coach (fact_coach_analysis)')
+    warm_parser.add_argument('--limit', type=int, default=None, help='Máximo de partidas (mais recentes primeiro)')
+    warm_parser.add_argument('--days', type=int, default=None, help='Só partidas dos últimos N dias')
+    warm_parser.add_argument('--batch-size', type=int, default=500, help='Partidas por lote do coach (Def: 500)')
     
     # --- Grupo: Ciência & Validação ---
     subparsers.add_parser('evaluate', help='Calcula Brier Score por Role')
-    subparsers.add_parser('ablation', help='Roda estudo de feature importance')
+    ablation_parser = subparsers.add_parser('ablation', help='Roda estudo de feature importance')
+    ablation_parser.add_argument('--workers', type=int, default=None, help='Processos de treino em paralelo (Def: nº de CPUs)')
+    ablation_parser.add_argument('--threads', type=int, default=None, help='Orçamento total de threads, dividido entre os processos')
+    ablation_parser.add_argument('--groups', action='store_true', help='Inclui ablação por grupo de features (TIERs)')
+    ablation_parser.add_argument('--method', choices=['retrain', 'permutation', 'both'], default='retrain', help='Retreino leave-one-out, permutação ou ambos')
+    ablation_parser.add_argument('--bootstrap', type=int, default=200, help='Reamostragens para o IC 95%% (Def: 200)')
+    ablation_parser.add_argument('--source', default=None, help='Snapshot Parquet em vez do PostgreSQL')
+    backtest_parser = subparsers.add_parser('backtest', help='Backtest walk-forward (origem móvel por data ou patch) com métricas por fold e role')
+    backtest_parser.add_argument('--by', choices=['date', 'patch'], default=None, help='Corte dos folds (Def: date)')
+    backtest_parser.add_argument('--window', choices=['expanding', 'sliding'], default=None, help='Janela de treino (Def: expanding)')
+    backtest_parser.add_argument('--folds', type=int, default=None, help='Nº de folds (Def: 5)')
+    backtest_parser.add_argument('--workers', type=int, default=None, help='Processos de treino em paralelo (Def: nº de CPUs)')
+    backtest_parser.add_argument('--threads', type=int, default=None, help='Orçamento total de threads, dividido entre os processos')
+    backtest_parser.add_argument('--source', default=None, help='Snapshot Parquet em vez do PostgreSQL')
+    backtest_parser.add_argument('--refresh', action='store_true', help='Refaz o cache das matrizes de features')
+    tune_parser = subparsers.add_parser('tune', help='Busca de hiperparâmetros (Successive Halving + CV temporal)')
+    tune_parser.add_argument('--trials', type=int, default=None, help='Candidatos no primeiro degrau (Def: 27)')
+    tune_parser.add_argument('--eta', type=int, default=None, help='Fator de corte por degrau (Def: 3)')
+    tune_parser.add_argument('--min-rounds', type=int, default=None, help='Árvores no primeiro degrau (Def: 50)')
+    tune_parser.add_argument('--max-rounds', type=int, default=None, help='Árvores no último degrau (Def: 1000)')
+    tune_parser.add_argument('--folds', type=int, default=None, help='Folds de origem móvel (Def: 3)')
+    tune_parser.add_argument('--workers', type=int, default=None, help='Processos em paralelo (Def: nº de CPUs)')
+    tune_parser.add_argument('--threads', type=int, default=None, help='Orçamento total de threads, dividido entre os processos')
+    tune_parser.add_argument('--source', default=None, help='Snapshot Parquet em vez do PostgreSQL')
+    tune_parser.add_argument('--fresh', action='store_true', help='Ignora o estado salvo e recomeça a busca')
+    mon_parser = subparsers.add_parser('model-monitor', help='Calibração (Brier/ECE) e drift (PSI) do modelo a partir dos agregados online')
+    mon_parser.add_argument('--version', default=None, help='Versão do modelo (Def: CURRENT)')
+    mon_parser.add_argument('--window', choices=['day', 'week', 'month'], default=None, help='Granularidade (Def: week)')
+    mon_parser.add_argument('--retrain', action='store_true', help='Se houver alerta, retreina e publica como SHADOW')
+    rescore_parser = subparsers.add_parser('rescore', help='Recalcula as predições de todo o histórico em paralelo (nova versão do modelo)')
+    rescore_parser.add_argument('--workers', type=int, default=None, help='Processos em paralelo (Def: nº de CPUs)')
+    rescore_parser.add_argument('--threads', type=int, default=None, help='Orçamento total de threads, dividido entre os processos')
+    rescore_parser.add_argument('--shards', type=int, default=None, help='Shards por hash do match_id (Def: 4 por worker)')
+    rescore_parser.add_argument('--chunk-size', type=int, default=None, help='Linhas por bloco em cada shard (Def: 20000)')
+    rescore_parser.add_argument('--version', default=None, help='Versão do registro (Def: CURRENT)')
+    rescore_parser.add_argument('--fresh', action='store_true', help='Descarta os checkpoints dos shards e recomeça')
+    registry_parser = subparsers.add_parser('registry', help='Registro de modelos (publicar, promover, shadow)')
+    registry_parser.add_argument('action', choices=['list', 'publish', 'promote', 'shadow', 'verify'], help='Ação no registro')
+    registry_parser.add_argument('version', nargs='?', default=None, help='Versão (ex.: v003). promote sem versão = promove o SHADOW; shadow sem versão = desliga')
+    registry_parser.add_argument('--note', default=None, help='Anotação gravada no manifest (publish)')
+    registry_parser.add_argument('--promote', action='store_true', help='Publica já como CURRENT (publish)')
+    registry_parser.add_argument('--shadow', action='store_true', help='Publica como SHADOW para comparação em tráfego real (publish)')
     subparsers.add_parser('test', help='Roda testes unitários')
 
+    # --- Grupo: Performance & Carga ---
+    synth_parser = subparsers.add_parser('synth', help='Gera partidas sintéticas para testes de carga')
+    synth_parser.add_argument('--matches', type=int, default=10000, help='Número de partidas (10 linhas cada)')
+    synth_parser.add_argument('--seed', type=int, default=42, help='Semente (mesma seed = mesmo dataset)')
+    synth_parser.add_argument('--region', default='KR', help='Prefixo de região dos match_ids (Def: KR)')
+    synth_parser.add_argument('--batch-size', type=int, default=20000, help='Partidas por lote gerado (Def: 20000)')
+    synth_parser.add_argument('--out', default='data/synthetic', help='Diretório Parquet de saída')
+    synth_parser.add_argument('--db', action='store_true', help='[PERIGO] Grava direto no PostgreSQL do settings.yaml')
+
+    bench_parser = subparsers.add_parser('bench', help='Benchmark offline dos caminhos quentes (tempo + pico de RSS)')
+    bench_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help='Tamanhos em linhas')
+    bench_parser.add_argument('--cases', nargs='+', default=None, help='Subconjunto de casos (Def: todos)')
+    bench_parser.add_argument('--repeat', type=int, default=3, help='Repetições por caso (usa a mediana)')
+    bench_parser.add_argument('--source', default=None, help='Snapshot Parquet (Def: dados sintéticos)')
+    bench_parser.add_argument('--output', default=None, help='Arquivo JSON de saída')
+    bench_parser.add_argument('--save-baseline', action='store_true', help='Salva este resultado como baseline')
+    bench_parser.add_argument('--compare', nargs='?', const='', default=None, help='Compara com um baseline (Def: benchmarks/baseline.json)')
+    bench_parser.add_argument('--tolerance', type=float, default=0.15, help='Lentidão tolerada antes de alertar (Def: 0.15)')
+    serve_parser = subparsers.add_parser('serve', help='API em produção: N workers pré-fork compartilhando o modelo')
+    serve_parser.add_argument('--workers', type=int, default=None, help='Número de workers (Def: api.serve.workers)')
+    serve_parser.add_argument('--host', default=None)
+    serve_parser.add_argument('--port', type=int, default=None)
+    startup_parser = subparsers.add_parser('startup-profile', help='Tempo de import por módulo e de carga por artefato (cold start)')
+    startup_parser.add_argument('--modules', nargs='+', default=None, help='Módulos a medir (Def: lista padrão)')
+    startup_parser.add_argument('--output', default=None, help='Arquivo JSON de saída')
+    return parser
+
+if __name__ == "__main__":
+    parser = build_parser()
     args = parser.parse_args()
 
     # Roteamento de Comandos
@@ -193,23 +313,77 @@ if __name__ == "__main__":
         # Passa o número de workers escolhido (Crucial para VPS com pouca RAM)
         run_pros_parallel(max_workers=args.workers)
     elif args.command == 'monitor':
+        from etl.monitor import watch_stats # Import tardio
         watch_stats()
     elif args.command == 'init-db':
         confirm = input("⚠️  ISSO VAI APAGAR O HISTÓRICO DE PREDIÇÕES. Confirmar? (s/n): ")
         if confirm.lower() == 's':
+            from database import reset_predictions_table # Import tardio
             reset_predictions_table()
     elif args.command == 'train':
-        run_train()
+        run_train(scalable=args.scalable, source=args.source, chunk_size=args.chunk_size,
+                  external_memory=args.external_memory)
+    elif args.command == 'archetypes':
+        from models.clustering import train_archetypes_streaming # Import tardio
+        train_archetypes_streaming(source=args.source, chunk_size=args.chunk_size, refresh=args.refresh)
     elif args.command == 'predict':
-        run_predict()
+        run_predict(args.chunk_size)
+    elif args.command == 'rebuild-ranking':
+        from models.ranking import rebuild_ranking_rollup # Import tardio
+        rebuild_ranking_rollup()
+    elif args.command == 'build-players':
+        from etl.players import rebuild_player_directory # Import tardio
+        rebuild_player_directory()
     elif args.command == 'explain':
-        run_explain()
+        run_explain(workers=args.workers, threads=args.threads, per_stratum=args.per_stratum, source=args.source, refresh=args.refresh)
+    elif args.command == 'warm-coach':
+        from models.coach_cache import warm_coach_cache # Import tardio
+        warm_coach_cache(limit=args.limit, batch_matches=args.batch_size, days=args.days)
     elif args.command == 'evaluate':
         from models.validation import run_brier_check # Import tardio
         run_brier_check()
+    elif args.command == 'backtest':
+        from models.backtest import run_backtest # Import tardio
+        run_backtest(by=args.by, window=args.window, n_folds=args.folds, workers=args.workers,
+                     thread_budget=args.threads, source=args.source, refresh=args.refresh)
     elif args.command == 'ablation':
         from models.validation import run_ablation_study # Import tardio
-        run_ablation_study()
+        run_ablation_study(workers=args.workers, thread_budget=args.threads, groups=args.groups,
+                           method=args.method, n_bootstrap=args.bootstrap, source=args.source)
+    elif args.command == 'tune':
+        from models.tuning import run_tuning # Import tardio
+        run_tuning(n_trials=args.trials, eta=args.eta, min_rounds=args.min_rounds, max_rounds=args.max_rounds,
+                   n_folds=args.folds, workers=args.workers, thread_budget=args.threads,
+                   source=args.source, fresh=args.fresh)
+    elif args.command == 'model-monitor':
+        from models.monitoring import run_monitor # Import tardio
+        run_monitor(version=args.version, window=args.window, retrain=args.retrain)
+    elif args.command == 'rescore':
+        from models.rescore import run_rescore # Import tardio
+        run_rescore(workers=args.workers, shards=args.shards, thread_budget=args.threads,
+                    chunk_size=args.chunk_size, version=args.version, fresh=args.fresh)
+    elif args.command == 'registry':
+        from models import registry # Import tardio
+        if args.action == 'list': registry.print_registry()
+        elif args.action == 'publish': registry.publish_bundle(note=args.note, promote=args.promote, shadow=args.shadow)
+        elif args.action == 'promote': registry.promote_version(args.version)
+        elif args.action == 'shadow': registry.set_shadow(args.version)
+        elif args.action == 'verify':
+            version = args.version or registry.get_pointer('CURRENT')
+            if version: registry.verify_bundle(version); print(f"✅ {version}: checksums OK.")
+            else: print("⚠️ Registro sem CURRENT.")
+    elif args.command == 'bench':
+        sys.exit(run_bench(args.sizes, args.cases, args.repeat, source=args.source, output=args.output,
+                           save_baseline=args.save_baseline, compare=args.compare, tolerance=args.tolerance))
+    elif args.command == 'serve':
+        from serve import run_server # Import tardio
+        run_server(workers=args.workers, host=args.host, port=args.port)
+    elif args.command == 'startup-profile':
+        from benchmarks.startup import run_startup_profile # Import tardio
+        run_startup_profile(modules=args.modules, output=args.output)
+    elif args.command == 'synth':
+        run_synth(args.matches, args.out, seed=args.seed, region=args.region,
+                  batch_size=args.batch_size, to_db=args.db)
     elif args.command == 'test':
         print("🧪 Rodando Testes Unitários...")
         os.system("python -m unittest discover tests")
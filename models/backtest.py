@@ -0,0 +1,222 @@
+import pandas as pd
+import numpy as np
+import xgboost as xgb
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from sklearn.metrics import f1_score
+
+from config import FEATURES_MODEL, settings
+from models.explainability import patch_of
+from models.splits import rolling_origin_folds, patch_folds
+from models.trainer import _training_config, _booster_params
+from models.validation import load_science_data
+from profiling import Timer
+
+# ==============================================================================
+# BACKTEST WALK-FORWARD (origem móvel por data ou por patch, folds em paralelo)
+# ==============================================================================
+# 1. Feature engineering UMA vez: X, y, timestamps, roles e patches em ordem temporal vão para
+#    .npy num diretório de cache com o fingerprint dos dados + features no nome. Rodadas seguintes
+#    (outra janela, outros folds, outros parâmetros) só mapeiam os arrays (--refresh refaz).
+# 2. Cada fold treina no passado e avalia no bloco seguinte (expanding = todo o passado;
+#    sliding = janela fixa), cortado por data (models.splits.rolling_origin_folds) ou por patch
+#    (patch_folds: valida cada um dos patches mais recentes). Sem ordem aleatória em lugar nenhum.
+# 3. Os folds treinam em processos sob um orçamento global de threads, lendo os arrays em memmap.
+# 4. Brier / acurácia / F1 no total e por role, por fold, numa tabela só (CSV).
+# Obs: os z-scores por role da feature engineering são do histórico inteiro (mesma base do train_model).
+BACKTEST_DEFAULTS = {
+    'by': 'date',               # date | patch
+    'window': 'expanding',      # expanding | sliding
+    'n_folds': 5,
+    'valid_size': 0.1,          # Por data: fração de linhas de cada fold de validação
+    'min_train_size': 0.4,
+    'train_size': None,         # Por data + sliding: fração da janela de treino (padrão: min_train_size)
+    'train_patches': 3,         # Por patch + sliding: patches anteriores no treino
+    'cache_dir': 'models/artifacts/backtest_cache',
+    'output_dir': 'models/artifacts',
+}
+ARRAYS = ['X', 'y', 'ts', 'role', 'patch']
+
+def _backtest_config(overrides=None):
+    cfg = {**BACKTEST_DEFAULTS, **(settings['model'].get('backtest') or {})}
+    cfg.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return cfg
+
+def patch_ordinal(game_version):
+    """'14.3.562.1234' -> 14003 (ordenável numericamente); versão ausente -> -1."""
+    patch = patch_of(game_version)
+    parts = patch.str.split('.', expand=True).reindex(columns=[0, 1])
+    major = pd.to_numeric(parts[0], errors='coerce')
+    minor = pd.to_numeric(parts[1], errors='coerce')
+    return (major * 1000 + minor).fillna(-1).astype(np.int32)
+
+def patch_label(ordinal):
+    return f"{ordinal // 1000}.{ordinal % 1000}" if ordinal >= 0 else 'unknown'
+
+# ==============================================================================
+# 1. CACHE DAS MATRIZES DE FEATURES
+# ==============================================================================
+def data_fingerprint(source=None, engine=None):
+    """Muda quando os dados brutos ou a definição das features mudam."""
+    from etl.sources import PERF_TABLE, KILLS_TABLE  # Import tardio
+    if source is not None:
+        files = sorted(os.path.join(d, f) for table in (PERF_TABLE, KILLS_TABLE)
+                       for d, _, names in os.walk(os.path.join(source, table)) for f in names)
+        parts = [f"{f}:{os.path.getsize(f)}:{os.path.getmtime(f)}" for f in files]
+    else:
+        from sqlalchemy import text  # Import tardio
+        if engine is None:
+            from database import get_engine
+            engine = get_engine()
+        with engine.connect() as conn:
+            row = conn.execute(text(f"SELECT COUNT(*), MAX(ingested_at) FROM {PERF_TABLE}")).one()
+        parts = [str(tuple(row))]
+    parts += FEATURES_MODEL + [json.dumps(settings['features'], sort_keys=True, default=str)]
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:16]
+
+def ensure_feature_cache(cfg, source=None, refresh=False):
+    """Diretório com os arrays do backtest (cria na 1ª vez ou com refresh)."""
+    path = os.path.join(cfg['cache_dir'], f"features_{data_fingerprint(source)}")
+    if os.path.exists(os.path.join(path, 'meta.json')) and not refresh:
+        print(f"   ♻️ Matrizes de features em cache: {path}")
+        return path
+    with Timer() as t:
+        df = load_science_data(source)
+        arrays = {
+            'X': np.ascontiguousarray(df[FEATURES_MODEL].to_numpy(np.float32)),
+            'y': df['win'].astype(np.int8).to_numpy(),
+            'ts': df['game_start_timestamp'].astype(np.int64).to_numpy(),
+            'role': df['team_position'].astype(str).to_numpy(dtype='U10'),
+            'patch': (patch_ordinal(df['game_version']) if 'game_version' in df.columns
+                      else pd.Series(-1, index=df.index, dtype=np.int32)).to_numpy(),
+        }
+        tmp = path + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, f'{name}.npy'), arr)
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'rows': len(df), 'features': FEATURES_MODEL, 'source': source,
+                       'created_at': datetime.now().isoformat(timespec='seconds')}, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)  # Diretório completo ou nada (Ctrl+C não deixa cache pela metade)
+    print(f"   💾 {len(df):,} linhas com features em cache ({t.seconds:.1f}s): {path}")
+    return path
+
+def load_cache(path, names=ARRAYS):
+    return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in names}
+
+def make_folds(arrays, cfg):
+    """(ordem das linhas ou None, [(slice_treino, slice_validação)]) conforme cfg['by'] / cfg['window']."""
+    if cfg['by'] == 'patch':
+        # Ordem por (patch, timestamp), sem versão desconhecida; os slices valem sobre essa ordem
+        patch, ts = np.asarray(arrays['patch']), np.asarray(arrays['ts'])
+        order = np.lexsort((ts, patch))
+        order = order[patch[order] >= 0]
+        return order, patch_folds(patch[order], cfg['n_folds'], cfg['window'], cfg['train_patches'])
+    if cfg['by'] != 'date':
+        raise ValueError(f"by deve ser 'date' ou 'patch': {cfg['by']}")
+    return None, rolling_origin_folds(np.asarray(arrays['ts']), cfg['n_folds'], cfg['valid_size'],
+                                      cfg['min_train_size'], cfg['window'], cfg['train_size'])
+
+def fold_metrics(y, probs, roles):
+    """Brier, acurácia e F1 do fold no total ('ALL') e por role."""
+    y, probs, roles = np.asarray(y).astype(np.float64), np.asarray(probs, dtype=np.float64), np.asarray(roles)
+    pred = probs >= 0.5
+    rows = []
+    for role, mask in [('ALL', np.ones(len(y), dtype=bool))] + [(r, roles == r) for r in sorted(set(roles))]:
+        if not mask.any(): continue
+        rows.append({'role': role, 'n': int(mask.sum()), 'brier': float(((probs[mask] - y[mask]) ** 2).mean()),
+                     'accuracy': float((pred[mask] == (y[mask] >= 0.5)).mean()),
+                     'f1': float(f1_score(y[mask] >= 0.5, pred[mask], zero_division=0)),
+                     'win_rate': float(y[mask].mean())})
+    return rows
+
+# ==============================================================================
+# 2. WORKERS (um treino por fold, arrays em memmap)
+# ==============================================================================
+_WORKER = {}
+
+def _init_backtest_worker(cache_path, order, params, num_rounds, nthread):
+    _WORKER.update(load_cache(cache_path, ['X', 'y']))
+    _WORKER.update({'order': order, 'params': params, 'num_rounds': num_rounds, 'nthread': nthread})
+
+def _fit_fold(k, train_sl, valid_sl):
+    X, y, order = _WORKER['X'], _WORKER['y'], _WORKER['order']
+    train, valid = (train_sl, valid_sl) if order is None else (order[train_sl], order[valid_sl])
+    with Timer() as t:
+        dtrain = xgb.QuantileDMatrix(X[train], y[train], max_bin=_WORKER['params']['max_bin'], nthread=_WORKER['nthread'])
+        booster = xgb.train(_WORKER['params'], dtrain, num_boost_round=_WORKER['num_rounds'])
+        probs = booster.inplace_predict(np.asarray(X[valid])).astype(np.float32)
+    return k, probs, t.seconds
+
+# ==============================================================================
+# 3. ORQUESTRAÇÃO
+# ==============================================================================
+def _describe_fold(k, train_sl, valid_sl, index, arrays, by):
+    ts = np.asarray(arrays['ts'])
+    days = lambda sl: pd.to_datetime(ts[index(sl)], unit='ms')
+    train_days, valid_days = days(train_sl), days(valid_sl)
+    row = {'fold': k, 'train_rows': train_sl.stop - train_sl.start, 'valid_rows': valid_sl.stop - valid_sl.start,
+           'train_from': train_days.min().date(), 'train_to': train_days.max().date(),
+           'valid_from': valid_days.min().date(), 'valid_to': valid_days.max().date()}
+    if by == 'patch':
+        row['valid_patch'] = patch_label(int(arrays['patch'][index(valid_sl)][0]))
+    return row
+
+def run_backtest(by=None, window=None, n_folds=None, workers=None, thread_budget=None, source=None, refresh=False):
+    """
+    Backtest walk-forward do modelo configurado em settings (model.params): um treino por fold,
+    em paralelo, com métricas por fold e por role. Retorna {'folds': DataFrame, 'metrics': DataFrame}.
+    """
+    cfg = _backtest_config({'by': by, 'window': window, 'n_folds': n_folds})
+    print(f"🔁 Backtest walk-forward: por {cfg['by']} | janela {cfg['window']} | {cfg['n_folds']} folds")
+    path = ensure_feature_cache(cfg, source, refresh)
+    arrays = load_cache(path, ['y', 'ts', 'role', 'patch'])
+    order, folds = make_folds(arrays, cfg)
+    index = (lambda sl: sl) if order is None else (lambda sl: order[sl])
+    folds_df = pd.DataFrame([_describe_fold(k, tr, va, index, arrays, cfg['by']) for k, (tr, va) in enumerate(folds)])
+
+    total_threads = thread_budget or os.cpu_count()
+    workers = max(1, min(workers or total_threads, len(folds), total_threads))
+    nthread = max(1, total_threads // workers)
+    params, num_rounds = _booster_params({**_training_config(), 'nthread': nthread})
+    print(f"   ⚙️ {len(folds)} treinos | {workers} processos x {nthread} threads (orçamento: {total_threads})")
+
+    rows, seconds = [], {}
+    with Timer() as t:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backtest_worker,
+                                 initargs=(path, order, params, num_rounds, nthread)) as pool:
+            futures = [pool.submit(_fit_fold, k, tr, va) for k, (tr, va) in enumerate(folds)]
+            for fut in as_completed(futures):
+                k, probs, seconds[k] = fut.result()
+                valid = index(folds[k][1])
+                rows += [{'fold': k, **r} for r in fold_metrics(arrays['y'][valid], probs, arrays['role'][valid])]
+    print(f"   ⏱️ Folds concluídos em {t.seconds:.1f}s")
+    folds_df['fit_sec'] = folds_df['fold'].map(seconds).round(1)
+    metrics = pd.DataFrame(rows).sort_values(['fold', 'role'], kind='stable').reset_index(drop=True)
+
+    overall = metrics[metrics['role'] == 'ALL'].set_index('fold')
+    print(f"\n{'FOLD':<5} {'TREINO':>9} {'VALID':>8} {'PERÍODO DE VALIDAÇÃO':<32} {'BRIER':>7} {'ACC':>7} {'F1':>6}")
+    print("-" * 79)
+    for _, f in folds_df.iterrows():
+        m = overall.loc[f['fold']]
+        period = f"{f['valid_from']} → {f['valid_to']}" + (f" ({f['valid_patch']})" if 'valid_patch' in f else '')
+        print(f"{f['fold']:<5} {f['train_rows']:>9,} {f['valid_rows']:>8,} {period:<32} {m['brier']:>7.4f} {m['accuracy']:>7.2%} {m['f1']:>6.3f}")
+
+    by_role = metrics.groupby('role').agg(n=('n', 'sum'), brier=('brier', 'mean'), brier_std=('brier', 'std'),
+                                          accuracy=('accuracy', 'mean'), f1=('f1', 'mean'))
+    print(f"\n{'ROLE':<10} {'N':>9} {'BRIER':>7} {'±':>7} {'ACC':>7} {'F1':>6}   (média dos folds)")
+    print("-" * 52)
+    for role, r in by_role.iterrows():
+        print(f"{role:<10} {int(r['n']):>9,} {r['brier']:>7.4f} {r['brier_std']:>7.4f} {r['accuracy']:>7.2%} {r['f1']:>6.3f}")
+
+    os.makedirs(cfg['output_dir'], exist_ok=True)
+    folds_df.to_csv(os.path.join(cfg['output_dir'], 'backtest_folds.csv'), index=False)
+    metrics.to_csv(os.path.join(cfg['output_dir'], 'backtest_metrics.csv'), index=False)
+    print(f"✅ Tabelas salvas em {cfg['output_dir']}/backtest_folds.csv e backtest_metrics.csv")
+    return {'folds': folds_df, 'metrics': metrics}
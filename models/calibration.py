@@ -1,20 +1,21 @@
 import pandas as pd
-import joblib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import os
 import sys
 from sklearn.calibration import calibration_curve
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import brier_score_loss
 
 # Ajuste de path para encontrar módulos locais
 sys.path.append(os.getcwd())
 
 from database import get_engine
-from config import FEATURES_MODEL, MODEL_FILENAME
+from config import MODEL_FILENAME, settings
 from features.engine import prepare_data_for_ml
+from models.registry import load_bundle
+from models.scoring import ScoringBundle
+from models.splits import temporal_holdout_index
 
 def generate_calibration_plot():
     print("📉 Gerando Curvas de Calibração por Role...")
@@ -25,8 +26,10 @@ def generate_calibration_plot():
         print("   -> Rode 'python main.py train' primeiro.")
         return
 
-    print(f"   -> Carregando modelo: {MODEL_FILENAME}...")
-    model = joblib.load(MODEL_FILENAME)
+    # Bundle completo: probabilidade bruta e calibrada (cabeça por arquétipo) na mesma chamada
+    bundle = load_bundle()
+    print(f"   -> Carregando bundle: {bundle['version']}...")
+    scorer = ScoringBundle.from_bundle(bundle)
 
     # 2. Carregar Dados (Mesma lógica do Treino)
     engine = get_engine()
@@ -42,6 +45,7 @@ def generate_calibration_plot():
               (p.team_id = 200 AND (k.pos_x < 7000 OR k.pos_y < 7000)))) as invade_kills
     FROM fact_match_player_performance p
     WHERE p.team_position != 'UNKNOWN' AND p.team_position != ''
+    ORDER BY p.game_start_timestamp ASC
     """
     
     with engine.connect() as conn:
@@ -50,24 +54,22 @@ def generate_calibration_plot():
     # 3. Engenharia de Features (Fundamental!)
     print("   -> Aplicando Engenharia de Features v8.0...")
     df = prepare_data_for_ml(df_raw)
+    df = df.sort_values('game_start_timestamp', kind='stable').reset_index(drop=True)
     
     # 4. Preparar Test Set (Isolar dados que o modelo NUNCA viu)
-    # Importante: random_state=42 deve ser igual ao do treino para reproduzir o mesmo split
-    X = df[FEATURES_MODEL]
-    y = df['win'].astype(int)
-    roles = df['team_position'] # Guardamos as roles para agrupar depois
+    # Split temporal igual ao do train_model: os `test_size` finais (o futuro) são o teste
+    split_idx = temporal_holdout_index(len(df), settings['model'].get('test_size', 0.2))
+    df_test = df.iloc[split_idx:]
+    y_test = df_test['win'].astype(int)
+    roles_test = df_test['team_position'] # Guardamos as roles para agrupar depois
 
-    # Split 80/20
-    # Precisamos das roles correspondentes ao X_test, então passamos elas no split
-    _, X_test, _, y_test, _, roles_test = train_test_split(
-        X, y, roles, test_size=0.2, random_state=42
-    )
-
-    print(f"   -> Avaliando em {len(X_test)} exemplos de teste.")
+    print(f"   -> Avaliando em {len(df_test)} exemplos de teste.")
 
     # 5. Predições
-    # Probabilidade da classe 1 (Vitória)
-    y_prob = model.predict_proba(X_test)[:, 1]
+    # Probabilidade da classe 1 (Vitória): bruta do XGBoost e calibrada
+    scored = scorer.predict(df_test)
+    y_prob = scored['win_probability_calibrated'].to_numpy()
+    y_prob_raw = scored['win_probability'].to_numpy()
 
     # 6. Plotagem
     plt.figure(figsize=(10, 10))
@@ -90,9 +92,11 @@ def generate_calibration_plot():
 
         y_test_role = y_test[mask]
         y_prob_role = y_prob[mask]
+        y_raw_role = y_prob_raw[mask]
 
         # Calcula Brier Score da Role (Erro quadrático médio)
         brier = brier_score_loss(y_test_role, y_prob_role)
+        brier_raw = brier_score_loss(y_test_role, y_raw_role)
 
         # Calcula a Curva
         # n_bins=10 significa que vamos agrupar as probs em: 0-10%, 10-20%, etc.
@@ -100,7 +104,10 @@ def generate_calibration_plot():
 
         # Plota
         plt.plot(prob_pred, prob_true, marker='o', linewidth=2, 
-                 label=f"{role} (Brier={brier:.3f})", color=palette[i])
+                 label=f"{role} (Brier={brier:.3f}, bruto={brier_raw:.3f})", color=palette[i])
+        # Curva bruta (sem a cabeça de calibração) tracejada, para comparação
+        raw_true, raw_pred = calibration_curve(y_test_role, y_raw_role, n_bins=10)
+        plt.plot(raw_pred, raw_true, linestyle=':', linewidth=1, alpha=0.6, color=palette[i])
 
     # Estética
     plt.xlabel("Probabilidade Predita pelo Modelo")
@@ -3,87 +3,254 @@ import numpy as np
 import joblib
 import sys
 import os
+import tempfile
 from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.cluster import KMeans, MiniBatchKMeans
 
 sys.path.append(os.getcwd())
-from database import get_engine
+from config import settings
 from features.engine import prepare_data_for_ml
+from models.scoring import STYLE_FEATURES
+from profiling import Timer
 
 # Artefatos v10.1
 ARTIFACTS_DIR = 'models/artifacts'
 CLUSTERS_FILENAME = f'{ARTIFACTS_DIR}/archetypes_v10.joblib'
 
+# Treino em streaming (python main.py archetypes):
+#   1. Uma única leitura da fonte (PostgreSQL ou Parquet) em blocos: feature engineering, matriz de
+#      estilo em float32 num spool em disco e StandardScaler.partial_fit;
+#   2. IncrementalPCA.partial_fit e MiniBatchKMeans.partial_fit (várias épocas) relendo o spool;
+#   3. IDs alinhados ao artefato anterior (atribuição húngara entre centróides) para que os
+#      `human_aliases` do LoLCoach continuem apontando para o mesmo estilo.
+# Com --refresh, só as partidas depois de `trained_through` entram: scaler, PCA e centróides
+# continuam de onde pararam (os contadores do MiniBatchKMeans pesam o histórico).
+# Partidas ingeridas com atraso (timestamp antigo) só entram numa reconstrução completa.
+ARCHETYPE_DEFAULTS = {
+    'n_clusters': 4,
+    'n_components': 3,
+    'chunk_size': 50_000,
+    'batch_size': 4096,     # Mini-lote do K-Means
+    'epochs': 3,            # Passadas do K-Means pelo spool
+    'seed': 42,
+    'spool_dir': None,      # Diretório temporário do spool (Def: o do sistema)
+}
+
+def _archetype_config(overrides=None):
+    cfg = {**ARCHETYPE_DEFAULTS, **(settings['model'].get('archetypes') or {})}
+    cfg.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return cfg
+
+def name_archetypes(summary):
+    """Rótulos a partir da média das features de estilo por cluster (normalizada entre clusters)."""
+    summary_norm = (summary - summary.min()) / (summary.max() - summary.min())
+    labels = {}
+    for cid, row in summary_norm.iterrows():
+        tags = []
+        if row['damage_self_mitigated'] > 0.6: tags.append("TANK")
+        if row['dpm'] > 0.6: tags.append("CARRY")
+        if row['vision_score'] > 0.6: tags.append("SUPPORT")
+        if row['damage_to_objectives'] > 0.6: tags.append("SPLIT")
+        # Ajuste: Gold muito alto define quem farmou a jungle/lane toda
+        if row['gold_earned'] > 0.7: tags.append("RICH")
+
+        # Fallback para o grupo fundido
+        if not tags: tags.append("UTILITY/BALANCED")
+        labels[int(cid)] = " / ".join(tags)
+    return labels
+
+def _print_labels(labels, counts):
+    print("\n🏷️  NOVA IDENTIDADE DOS ARQUÉTIPOS:")
+    print("-" * 60)
+    for cid, label in labels.items():
+        print(f"   Cluster {cid}: {label:<25} (N={int(counts.get(cid, 0))} jogos)")
+
 def train_archetypes():
+    from database import get_engine
     print("🧩 [v10.1] REFINANDO ARQUÉTIPOS (K=4)...")
-    
+
     # 1. Carrega Dados
     engine = get_engine()
     query = "SELECT * FROM fact_match_player_performance WHERE team_position != 'UNKNOWN'"
     with engine.connect() as conn:
         df_raw = pd.read_sql(query, conn)
-    
+
     # 2. Engenharia (com nomes corrigidos via engine.py)
     df = prepare_data_for_ml(df_raw)
-    
+
     # 3. Features de Estilo
-    style_features = [
-        'dpm', 'damage_self_mitigated', 'vision_score', 
-        'gold_earned', 'total_minions_killed', 
-        'damage_to_objectives', 'time_ccing_others'
-    ]
-    
-    X = df[style_features].fillna(0)
-    
+    X = df[STYLE_FEATURES].fillna(0)
+
     # Pipeline
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
-    
+
     pca = PCA(n_components=3, random_state=42)
     X_pca = pca.fit_transform(X_scaled)
-    
+
     # 4. K-MEANS (K=4 para fundir Utility 0 e 4)
     print("   -> Reduzindo para 4 Clusters Sólidos...")
     kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
     clusters = kmeans.fit_predict(X_pca)
-    
+
     df['archetype_id'] = clusters
-    
+
     # 5. Naming Dinâmico
-    summary = df.groupby('archetype_id')[style_features].mean()
-    summary_norm = (summary - summary.min()) / (summary.max() - summary.min())
-    
-    print("\n🏷️  NOVA IDENTIDADE DOS ARQUÉTIPOS:")
-    print("-" * 60)
-    
-    labels = {}
-    for cid, row in summary_norm.iterrows():
-        tags = []
-        if row['damage_self_mitigated'] > 0.6: tags.append("TANK")
-        if row['dpm'] > 0.6: tags.append("CARRY")
-        if row['vision_score'] > 0.6: tags.append("SUPPORT")
-        if row['damage_to_objectives'] > 0.6: tags.append("SPLIT")
-        # Ajuste: Gold muito alto define quem farmou a jungle/lane toda
-        if row['gold_earned'] > 0.7: tags.append("RICH")
-        
-        # Fallback para o grupo fundido
-        if not tags: tags.append("UTILITY/BALANCED")
-        
-        label = " / ".join(tags)
-        labels[cid] = label
-        
-        # Contagem para validar tamanho do cluster
-        count = len(df[df['archetype_id'] == cid])
-        print(f"   Cluster {cid}: {label:<25} (N={count} jogos)")
+    labels = name_archetypes(df.groupby('archetype_id')[STYLE_FEATURES].mean())
+    _print_labels(labels, df['archetype_id'].value_counts().to_dict())
 
     pipeline = {
         'scaler': scaler, 'pca': pca, 'kmeans': kmeans, 'labels': labels
     }
-    
+
     os.makedirs(ARTIFACTS_DIR, exist_ok=True)
     joblib.dump(pipeline, CLUSTERS_FILENAME)
     print(f"\n💾 Pipeline salvo em: {CLUSTERS_FILENAME}")
 
+# ==============================================================================
+# ALINHAMENTO DE IDs (atribuição húngara)
+# ==============================================================================
+def centers_in_feature_space(pipe):
+    """Centróides de volta às unidades das features de estilo (inverso do PCA e do scaler)."""
+    centers = pipe['pca'].inverse_transform(pipe['kmeans'].cluster_centers_)
+    return pipe['scaler'].inverse_transform(centers)
+
+def align_clusters(new_centers, old_centers):
+    """
+    Permutação `perm` tal que o cluster novo perm[i] herda o ID antigo i (custo total mínimo
+    de distância). Clusters novos sem par (K maior) ficam com os IDs seguintes.
+    """
+    from scipy.optimize import linear_sum_assignment  # Import tardio
+    cost = ((old_centers[:, None, :] - new_centers[None, :, :]) ** 2).sum(axis=2)
+    old_idx, new_idx = linear_sum_assignment(cost)
+    perm = list(new_idx[np.argsort(old_idx)])
+    perm += [j for j in range(len(new_centers)) if j not in perm]
+    return np.array(perm)
+
+def _reorder_kmeans(kmeans, perm):
+    kmeans.cluster_centers_ = kmeans.cluster_centers_[perm]
+    if hasattr(kmeans, '_counts'): kmeans._counts = kmeans._counts[perm]  # Pesos do partial_fit seguem o centróide
+
+def _load_previous():
+    if not os.path.exists(CLUSTERS_FILENAME): return None
+    return joblib.load(CLUSTERS_FILENAME)
+
+# ==============================================================================
+# TREINO EM STREAMING
+# ==============================================================================
+def _spool_style(chunks, spool_dir, scaler):
+    """1ª (e única) leitura da fonte: grava a matriz de estilo por bloco e ajusta o scaler."""
+    files, rows, last_ts = [], 0, None
+    for i, chunk in enumerate(chunks):
+        df = prepare_data_for_ml(chunk)
+        if df.empty: continue
+        X = df.reindex(columns=STYLE_FEATURES).fillna(0).to_numpy(dtype=np.float32)
+        scaler.partial_fit(_style_frame(X))
+        path = os.path.join(spool_dir, f"style_{i:05d}.npy")
+        np.save(path, X)
+        files.append(path)
+        rows += len(X)
+        ts = df['game_start_timestamp'].max() if 'game_start_timestamp' in df.columns else None
+        if pd.notna(ts): last_ts = int(ts) if last_ts is None else max(last_ts, int(ts))
+        print(f"   📥 Bloco {i + 1}: {len(X):,} linhas (total {rows:,})")
+    return files, rows, last_ts
+
+def _style_frame(X):
+    """Com nomes de coluna: o coach transforma DataFrames (sem aviso de feature names do sklearn)."""
+    return pd.DataFrame(X, columns=STYLE_FEATURES)
+
+def _iter_spool(files, transform=None):
+    for path in files:
+        X = np.load(path, mmap_mode='r')
+        yield X if transform is None else transform(X)
+
+def _iter_batches(files, transform, batch_size):
+    for X in _iter_spool(files, transform):
+        for start in range(0, len(X), batch_size):
+            yield X[start:start + batch_size]
+
+def train_archetypes_streaming(source=None, chunk_size=None, refresh=False):
+    """
+    Ajusta scaler -> IncrementalPCA -> MiniBatchKMeans em blocos, sem carregar a tabela inteira.
+    `refresh=True` continua o artefato atual só com as partidas novas.
+    """
+    cfg = _archetype_config({'chunk_size': chunk_size})
+    k = cfg['n_clusters']
+    previous = _load_previous()
+    incremental = refresh and previous is not None and isinstance(previous['kmeans'], MiniBatchKMeans) \
+        and previous.get('trained_through') is not None
+    if refresh and not incremental:
+        print("   ⚠️ Artefato atual não é do treino em streaming: fazendo a reconstrução completa.")
+    print(f"🧩 ARQUÉTIPOS EM STREAMING (K={k}, {'atualização incremental' if incremental else 'reconstrução completa'})...")
+
+    from etl.sources import iter_performance_chunks  # Import tardio
+    since = previous['trained_through'] if incremental else None
+    old_centers = centers_in_feature_space(previous) if previous is not None else None
+
+    if incremental:
+        scaler, pca, kmeans = previous['scaler'], previous['pca'], previous['kmeans']
+    else:
+        scaler = StandardScaler()
+        pca = IncrementalPCA(n_components=cfg['n_components'])
+        kmeans = MiniBatchKMeans(n_clusters=k, batch_size=cfg['batch_size'], random_state=cfg['seed'],
+                                 n_init=1, compute_labels=False)
+
+    with tempfile.TemporaryDirectory(prefix='archetypes_spool_', dir=cfg['spool_dir']) as spool_dir:
+        # 1. Leitura única + scaler
+        with Timer() as t:
+            files, rows, last_ts = _spool_style(iter_performance_chunks(source, chunk_size=cfg['chunk_size'], since=since),
+                                                spool_dir, scaler)
+        print(f"   ⚙️ {rows:,} linhas lidas em {t.seconds:.1f}s")
+        if not rows:
+            print("   ✅ Nenhuma partida nova desde o último treino. Nada a fazer.")
+            return previous
+
+        # 2. PCA incremental (blocos menores que n_components não dão passo)
+        with Timer() as t:
+            for X in _iter_spool(files, lambda X: scaler.transform(_style_frame(X))):
+                if len(X) >= cfg['n_components']: pca.partial_fit(X)
+        print(f"   📐 IncrementalPCA em {t.seconds:.1f}s (variância explicada: {pca.explained_variance_ratio_.sum():.1%})")
+
+        # 3. K-Means em mini-lotes; com artefato anterior, parte dos centróides antigos no espaço novo
+        project = lambda X: pca.transform(scaler.transform(_style_frame(X)))
+        if old_centers is not None and len(old_centers) == k:
+            warm = project(old_centers)
+            if incremental: kmeans.cluster_centers_ = warm.astype(kmeans.cluster_centers_.dtype)
+            else: kmeans.set_params(init=warm)
+        with Timer() as t:
+            for _ in range(1 if incremental else cfg['epochs']):
+                for batch in _iter_batches(files, project, cfg['batch_size']):
+                    kmeans.partial_fit(batch)
+        print(f"   🎯 MiniBatchKMeans em {t.seconds:.1f}s ({kmeans.n_steps_} passos)")
+
+        # 4. IDs estáveis: cluster novo herda o ID do centróide antigo mais próximo
+        pipe = {'scaler': scaler, 'pca': pca, 'kmeans': kmeans}
+        if old_centers is not None:
+            perm = align_clusters(centers_in_feature_space(pipe), old_centers)
+            _reorder_kmeans(kmeans, perm)
+            n = min(k, len(old_centers))
+            drift = np.sqrt((((centers_in_feature_space(pipe)[:n] - old_centers[:n]) / scaler.scale_) ** 2).sum(axis=1))
+            print(f"   🔗 IDs alinhados ao artefato anterior (permutação {perm.tolist()}, deslocamento em desvios-padrão {np.round(drift, 2).tolist()})")
+
+        # 5. Naming: médias por cluster numa última passada (sobre o que foi lido nesta rodada)
+        sums, counts = np.zeros((k, len(STYLE_FEATURES))), np.zeros(k)
+        for X in _iter_spool(files):
+            ids = kmeans.predict(project(X))
+            np.add.at(sums, ids, X)
+            counts += np.bincount(ids, minlength=k)
+
+    summary = pd.DataFrame(sums / np.maximum(counts, 1)[:, None], columns=STYLE_FEATURES)
+    labels = name_archetypes(summary)
+    _print_labels(labels, dict(enumerate(counts)))
+
+    n_samples = rows + (previous.get('n_samples', 0) if incremental else 0)
+    stamps = [ts for ts in (since, last_ts) if ts is not None]
+    pipe.update(labels=labels, trained_through=max(stamps) if stamps else None, n_samples=int(n_samples))
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    joblib.dump(pipe, CLUSTERS_FILENAME)
+    print(f"\n💾 Pipeline salvo em: {CLUSTERS_FILENAME} ({n_samples:,} linhas no total)")
+    return pipe
+
 if __name__ == "__main__":
-    train_archetypes()
\ No newline at end of file
+    train_archetypes()
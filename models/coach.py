@@ -1,29 +1,32 @@
 import pandas as pd
 import numpy as np
-import joblib
 import sys
 import os
 
 sys.path.append(os.getcwd())
 from database import get_engine
 from features.engine import prepare_data_for_ml
-from config import FEATURES_MODEL, MODEL_FILENAME
+from models.registry import load_bundle
+from models.scoring import ScoringBundle
 
-ARTIFACTS_DIR = 'models/artifacts'
-CLUSTERS_FILENAME = f'{ARTIFACTS_DIR}/archetypes_v10.joblib'
-CALIBRATION_FILENAME = f'{ARTIFACTS_DIR}/calibration_heads_v10.joblib'
+COACH_VERSION = 'v16.7.0'  # Suba ao mudar regras de texto/nota: invalida o cache de análises
 
 class LoLCoach:
-    def __init__(self):
-        print("🤖 Iniciando LoL AI Coach (v16.6.1 - Schema Fix)...")
+    def __init__(self, bundle=None):
+        """`bundle` vem de models.registry.load_bundle; sem ele, carrega a versão CURRENT (ou os artefatos soltos)."""
+        print(f"🤖 Iniciando LoL AI Coach ({COACH_VERSION} - Schema Fix)...")
         try:
-            self.base_model = joblib.load(MODEL_FILENAME)
-            self.archetype_pipe = joblib.load(CLUSTERS_FILENAME)
-            self.calibration_heads = joblib.load(CALIBRATION_FILENAME)
-            print("   ✅ Motores Carregados.")
+            bundle = bundle or load_bundle()
+            # Modelo base + arquétipo + cabeça de calibração numa chamada vetorizada por lote
+            self.scorer = ScoringBundle.from_bundle(bundle)
+            self.bundle_version = bundle['version']
+            self.bundle_formats = bundle.get('formats', {})
+            # Chave de versão das análises persistidas (fact_coach_analysis)
+            self.model_version = f"{COACH_VERSION}-{bundle['fingerprint']}"
+            print(f"   ✅ Motores Carregados ({self.bundle_version} / {self.model_version}).")
         except Exception as e:
             print(f"   ❌ Erro de Inicialização: {e}")
-            sys.exit(1)
+            raise RuntimeError(f"Falha ao carregar os artefatos do coach: {e}") from e
 
         self.human_aliases = {
             0: "Controlador de Mapa (Suporte)",
@@ -32,48 +35,36 @@ class LoLCoach:
             3: "Iniciador de Vanguarda (Engage)"
         }
 
-    def _analyze_single_row(self, row):
-        X_base = pd.DataFrame([row])[FEATURES_MODEL]
-        win_prob = self.base_model.predict_proba(X_base)[0, 1]
-        
-        style_cols = ['dpm', 'damage_self_mitigated', 'vision_score', 'gold_earned', 'total_minions_killed', 'damage_to_objectives', 'time_ccing_others']
-        vals = [row.get(c, 0) for c in style_cols]
-        X_style = pd.DataFrame([vals], columns=style_cols)
-        X_scaled = self.archetype_pipe['scaler'].transform(X_style)
-        X_pca = self.archetype_pipe['pca'].transform(X_scaled)
-        ml_arch_id = self.archetype_pipe['kmeans'].predict(X_pca)[0]
-        
-        if row.get('team_position') == 'BOTTOM': final_arch = 2
-        elif row.get('team_position') == 'JUNGLE' and ml_arch_id == 0: final_arch = 3
-        else: final_arch = ml_arch_id
-        
-        return int(win_prob * 100), final_arch
+    @staticmethod
+    def _col(df, name, default):
+        """Coluna como array (ou o default, se ausente) -- equivalente vetorizado de row.get()."""
+        if name in df.columns: return df[name].to_numpy()
+        return np.full(len(df), default)
 
-    def _calculate_individual_performance(self, row, cs_min):
-        score = 50.0 
-        gd15 = row.get('gold_diff_at_15', 0)
-        score += np.clip(gd15 / 80, -20, 20)
+    def _analyze_rows(self, df_processed):
+        """Prob. de vitória calibrada (0-100) e arquétipo de TODOS os jogadores numa única passada."""
+        scored = self.scorer.predict(df_processed)
+        win_prob_scores = (scored['win_probability_calibrated'].to_numpy() * 100).astype(int)
+        ml_arch_ids = scored['archetype_id'].to_numpy()
 
-        role = row.get('team_position', 'UNKNOWN')
-        if role != 'UTILITY': 
-            if cs_min >= 8.0: score += 10
-            elif cs_min >= 7.0: score += 5
-            elif cs_min < 5.0: score -= 5
-            elif cs_min < 4.0: score -= 10
+        roles = self._col(df_processed, 'team_position', None)
+        final_arch = np.where(roles == 'BOTTOM', 2,
+                     np.where((roles == 'JUNGLE') & (ml_arch_ids == 0), 3, ml_arch_ids))
+        return win_prob_scores, final_arch.astype(int)
 
-        kda = row.get('kda', 2.0)
-        if kda > 4.0: score += 15
-        elif kda > 3.0: score += 8
-        elif kda < 1.5: score -= 10
-        elif kda < 1.0: score -= 15 
+    def _calculate_performance_scores(self, df, cs_min):
+        """Nota individual (0-100) vetorizada, mesmas regras da versão por linha."""
+        score = 50.0 + np.clip(self._col(df, 'gold_diff_at_15', 0) / 80, -20, 20)
 
-        dpm = row.get('dpm', 0)
-        if dpm > 800: score += 10
-        elif dpm > 600: score += 5
-        
-        kp = row.get('kill_participation', 0)
-        if kp > 0.6: score += 5
-        
+        cs_bonus = np.select([cs_min >= 8.0, cs_min >= 7.0, cs_min < 5.0], [10, 5, -5], 0)
+        score += np.where(self._col(df, 'team_position', 'UNKNOWN') != 'UTILITY', cs_bonus, 0)
+
+        kda = self._col(df, 'kda', 2.0)
+        score += np.select([kda > 4.0, kda > 3.0, kda < 1.5], [15, 8, -10], 0)
+
+        dpm = self._col(df, 'dpm', 0)
+        score += np.select([dpm > 800, dpm > 600], [10, 5], 0)
+        score += np.where(self._col(df, 'kill_participation', 0) > 0.6, 5, 0)
         return np.clip(score, 0, 100)
 
     # --- NOVA LÓGICA DE TEXTO (HIERARQUIA DE VERDADE) ---
@@ -136,40 +127,77 @@ class LoLCoach:
         return factors
 
     def analyze_match_context(self, df_match, target_puuid):
-        match_scores = []
-        target_row = None
-        opponent_row = None
-        
-        df_processed = prepare_data_for_ml(df_match)
-        raw_duration = df_match.iloc[0].get('game_duration_sec', df_match.iloc[0].get('game_duration', 1800))
-        game_min = max(1, raw_duration / 60)
+        match_id = df_match.iloc[0]['match_id']
+        return self.analyze_matches(df_match, target_puuid).get(match_id)
+
+    def analyze_matches(self, df_matches, target_puuid):
+        """
+        Analisa várias partidas do mesmo jogador numa única passada (features, predição e
+        arquétipos em lote). Retorna {match_id: análise} das partidas em que o alvo jogou.
+        """
+        results = {}
+        for match_id, pos, ctx in self._score_matches(df_matches):
+            analysis = self._build_match_analysis(match_id, pos, target_puuid, *ctx)
+            if analysis: results[match_id] = analysis
+        return results
+
+    def analyze_matches_all_players(self, df_matches):
+        """Como analyze_matches, mas para TODOS os participantes: {(match_id, puuid): análise}."""
+        results = {}
+        for match_id, pos, ctx in self._score_matches(df_matches):
+            scored = ctx[2]
+            for i in pos:
+                puuid = scored['puuid'][i]
+                analysis = self._build_match_analysis(match_id, pos, puuid, *ctx)
+                if analysis: results[(match_id, puuid)] = analysis
+        return results
+
+    def _score_matches(self, df_matches):
+        """Pontua todos os jogadores do lote; gera (match_id, posições, contexto) por partida."""
+        df_matches = df_matches.reset_index(drop=True)
+        df_processed = prepare_data_for_ml(df_matches, partition_col='match_id')
+        df_raw = df_matches.loc[df_processed.index]  # Linhas brutas alinhadas às processadas
+
+        # Duração pela 1ª linha de cada partida (mesma regra da análise por partida)
+        if 'game_duration_sec' in df_matches.columns: dur_col = 'game_duration_sec'
+        elif 'game_duration' in df_matches.columns: dur_col = 'game_duration'
+        else: dur_col = None
+        if dur_col: raw_duration = df_raw['match_id'].map(df_matches.drop_duplicates('match_id').set_index('match_id')[dur_col]).to_numpy(float)
+        else: raw_duration = np.full(len(df_raw), 1800.0)
+        game_min = np.fmax(1, raw_duration / 60)
+
+        if 'total_cs' in df_raw.columns: total_cs = df_raw['total_cs'].to_numpy()
+        else: total_cs = self._col(df_raw, 'total_minions_killed', 0) + self._col(df_raw, 'neutral_minions_killed', 0)
+        cs_min = np.round(total_cs / game_min, 1)
+
+        # Uma predição + uma transformação de arquétipo para todos os jogadores de todas as partidas
+        win_prob_scores, arch_ids = self._analyze_rows(df_processed)
+        perf_scores = self._calculate_performance_scores(df_processed, cs_min)
+        final_scores = (perf_scores * 0.7 + win_prob_scores * 0.3).astype(int)
+        final_scores += np.where(self._col(df_processed, 'win', False).astype(bool), 5, 0)
+        final_scores = np.clip(final_scores, 0, 100)
+
+        scored = {
+            'puuid': df_processed['puuid'].astype(str).to_numpy(),
+            'team_id': self._col(df_processed, 'team_id', 0).astype(int),
+            'role': df_processed['team_position'].astype(str).to_numpy(),
+            'score': final_scores, 'model_win_prob': win_prob_scores, 'arch_id': arch_ids, 'cs_min': cs_min,
+        }
+        df_processed = df_processed.reset_index(drop=True)
+        df_raw = df_raw.reset_index(drop=True)
 
-        for idx, row in df_processed.iterrows():
-            win_prob_score, arch = self._analyze_single_row(row)
-            raw_row = df_match[df_match['puuid'] == row['puuid']].iloc[0]
-            
-            if 'total_cs' in raw_row: total_cs = raw_row['total_cs']
-            else: total_cs = raw_row.get('total_minions_killed', 0) + raw_row.get('neutral_minions_killed', 0)
-            if total_cs == 0: total_cs = raw_row.get('total_cs', 0)
-            cs_min = round(total_cs / game_min, 1)
-
-            perf_score = self._calculate_individual_performance(row, cs_min)
-            final_score = int((perf_score * 0.7) + (win_prob_score * 0.3))
-            if row.get('win', False): final_score += 5
-            final_score = min(max(final_score, 0), 100)
-
-            player_data = {
-                'puuid': str(row['puuid']),
-                'score': final_score,
-                'model_win_prob': win_prob_score,
-                'team_id': int(row.get('team_id')),
-                'role': str(row.get('team_position')),
-                'row_data': row, 
-                'raw_row': raw_row, 
-                'cs_min': cs_min
-            }
-            match_scores.append(player_data)
-            if row['puuid'] == target_puuid: target_row = player_data
+        ctx = (df_processed, df_raw, scored)
+        for match_id, pos in df_processed.groupby('match_id', sort=False).indices.items():
+            yield match_id, pos, ctx
+
+    def _build_match_analysis(self, match_id, pos, target_puuid, df_processed, df_raw, scored):
+        opponent_row = None
+        match_scores = [
+            {'puuid': scored['puuid'][i], 'score': int(scored['score'][i]), 'model_win_prob': int(scored['model_win_prob'][i]),
+             'team_id': int(scored['team_id'][i]), 'role': scored['role'][i], 'idx': i, 'cs_min': float(scored['cs_min'][i])}
+            for i in pos
+        ]
+        target_row = next((p for p in match_scores if p['puuid'] == str(target_puuid)), None)
 
         if not target_row: return None
 
@@ -192,18 +220,19 @@ class LoLCoach:
         opp_score = 0; opp_cs = 0.0; opp_kda = "-"; opp_champ = "?"
         if opponent_row:
             opp_score = opponent_row['score']; opp_cs = opponent_row['cs_min']
-            k = int(opponent_row['raw_row'].get('kills',0)); d = int(opponent_row['raw_row'].get('deaths',0)); a = int(opponent_row['raw_row'].get('assists',0))
-            opp_kda = f"{k}/{d}/{a}"; opp_champ = str(opponent_row['raw_row'].get('champion_name', '?'))
+            opp_raw = df_raw.iloc[opponent_row['idx']]
+            k = int(opp_raw.get('kills',0)); d = int(opp_raw.get('deaths',0)); a = int(opp_raw.get('assists',0))
+            opp_kda = f"{k}/{d}/{a}"; opp_champ = str(opp_raw.get('champion_name', '?'))
             score_diff = target_row['score'] - opp_score
             if score_diff < -20: lane_verdict = "Derrota de Rota (Gap)"
             elif score_diff > 20: lane_verdict = "Dominação de Rota"
 
-        row = target_row['row_data']; score = target_row['score']; cs_min = target_row['cs_min']
+        row = df_processed.iloc[target_row['idx']]; score = target_row['score']; cs_min = target_row['cs_min']
         factors_list = self._extract_honest_factors(row, score, cs_min)
         factors_category = self._generate_factor_category(score)
         opp_title, opp_text = self._generate_narrative_block(row, score, rank_in_match, lane_verdict, factors_list)
         
-        _, arch_id = self._analyze_single_row(row)
+        arch_id = int(scored['arch_id'][target_row['idx']])
         archetype_label = self.human_aliases.get(arch_id, "Flexível")
         if self._is_feeding(row): archetype_label += " (Comprometido)"
 
@@ -213,7 +242,7 @@ class LoLCoach:
         # ----------------------------------------------
 
         return {
-            "match_id": df_match.iloc[0]['match_id'],
+            "match_id": match_id,
             "score": score,
             "ai_prediction": target_row['model_win_prob'],
             "archetype_label": archetype_label,
@@ -0,0 +1,190 @@
+import json
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from database import get_engine
+from profiling import Timer
+
+# Cache persistente das análises do coach (uma linha por participante de cada partida).
+# Chave: (match_id, puuid, model_version) -- model_version muda a cada retreino/regra nova,
+# então análises antigas simplesmente deixam de ser lidas.
+
+COACH_CACHE_TABLE = 'fact_coach_analysis'
+
+COACH_CACHE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {COACH_CACHE_TABLE} (
+    match_id VARCHAR(50) NOT NULL,
+    puuid VARCHAR(100) NOT NULL,
+    model_version VARCHAR(40) NOT NULL,
+    analysis JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT pk_coach_analysis PRIMARY KEY (match_id, puuid, model_version)
+);
+CREATE INDEX IF NOT EXISTS idx_coach_analysis_puuid ON {COACH_CACHE_TABLE}(puuid, model_version);
+"""
+
+_table_ready = False
+
+def ensure_coach_cache_table(engine=None):
+    """Cria a tabela na 1ª utilização do processo (idempotente)."""
+    global _table_ready
+    if _table_ready: return
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(COACH_CACHE_DDL))
+    _table_ready = True
+
+def _json_default(obj):
+    if isinstance(obj, np.integer): return int(obj)
+    if isinstance(obj, np.floating): return float(obj)
+    if isinstance(obj, np.bool_): return bool(obj)
+    raise TypeError(f"Tipo não serializável: {type(obj)}")
+
+def load_cached_analyses(conn, match_ids, puuid, model_version):
+    """Análises já salvas do jogador para as partidas pedidas: {match_id: análise}."""
+    if not match_ids: return {}
+    query = text(f"""
+        SELECT match_id, analysis FROM {COACH_CACHE_TABLE}
+        WHERE match_id = ANY(:ids) AND puuid = :puuid AND model_version = :version
+    """)
+    rows = conn.execute(query, {"ids": list(match_ids), "puuid": puuid, "version": model_version})
+    return {m_id: (a if isinstance(a, dict) else json.loads(a)) for m_id, a in rows}
+
+def store_analyses(conn, analyses, model_version):
+    """Grava {(match_id, puuid): análise}. Conflitos (outro processo já gravou) são ignorados."""
+    if not analyses: return 0
+    stmt = text(f"""
+        INSERT INTO {COACH_CACHE_TABLE} (match_id, puuid, model_version, analysis)
+        VALUES (:match_id, :puuid, :version, CAST(:analysis AS JSONB))
+        ON CONFLICT (match_id, puuid, model_version) DO NOTHING
+    """)
+    params = [{"match_id": m_id, "puuid": puuid, "version": model_version,
+               "analysis": json.dumps(analysis, default=_json_default, ensure_ascii=False)}
+              for (m_id, puuid), analysis in analyses.items()]
+    conn.execute(stmt, params)
+    return len(params)
+
+def get_or_compute_analyses(coach, engine, matches_df, puuid, timings=None):
+    """
+    Lê do cache as análises do jogador; só as partidas ausentes passam pelo coach -- e, já
+    que o coach pontua os 10 participantes de qualquer forma, todos eles são gravados.
+    """
+    timings = timings if timings is not None else {}
+    match_ids = matches_df['match_id'].drop_duplicates().tolist()
+    version = coach.model_version
+
+    with Timer() as t:
+        try:
+            ensure_coach_cache_table(engine)
+            with engine.connect() as conn:
+                analyses = load_cached_analyses(conn, match_ids, puuid, version)
+        except Exception as e:
+            print(f"⚠️ Cache do coach indisponível: {e}")
+            analyses = {}
+    timings['cache_read_ms'] = round(t.seconds * 1000, 1)
+
+    misses = [m for m in match_ids if m not in analyses]
+    timings['cache_hits'] = len(match_ids) - len(misses)
+    timings['cache_misses'] = len(misses)
+    if not misses: return analyses
+
+    with Timer() as t:
+        computed = coach.analyze_matches_all_players(matches_df[matches_df['match_id'].isin(misses)])
+    timings['coach_ms'] = round(t.seconds * 1000, 1)
+    analyses.update({m_id: a for (m_id, p), a in computed.items() if p == str(puuid)})
+
+    with Timer() as t:
+        try:
+            with engine.begin() as conn:
+                store_analyses(conn, computed, version)
+        except Exception as e:
+            print(f"⚠️ Falha ao gravar cache do coach: {e}")
+    timings['cache_write_ms'] = round(t.seconds * 1000, 1)
+    return analyses
+
+async def get_or_compute_analyses_async(coach, async_engine, matches_df, puuid, timings=None):
+    """
+    Versão da API assíncrona: leitura/gravação do cache pelo pool asyncpg e o coach
+    (CPU) numa thread, sem prender o event loop. A tabela é criada no startup da API.
+    """
+    from anyio import to_thread  # Import tardio (só a API usa)
+    timings = timings if timings is not None else {}
+    match_ids = matches_df['match_id'].drop_duplicates().tolist()
+    version = coach.model_version
+
+    with Timer() as t:
+        try:
+            async with async_engine.connect() as conn:
+                analyses = await conn.run_sync(load_cached_analyses, match_ids, puuid, version)
+        except Exception as e:
+            print(f"⚠️ Cache do coach indisponível: {e}")
+            analyses = {}
+    timings['cache_read_ms'] = round(t.seconds * 1000, 1)
+
+    misses = [m for m in match_ids if m not in analyses]
+    timings['cache_hits'] = len(match_ids) - len(misses)
+    timings['cache_misses'] = len(misses)
+    if not misses: return analyses
+
+    with Timer() as t:
+        computed = await to_thread.run_sync(coach.analyze_matches_all_players, matches_df[matches_df['match_id'].isin(misses)])
+    timings['coach_ms'] = round(t.seconds * 1000, 1)
+    analyses.update({m_id: a for (m_id, p), a in computed.items() if p == str(puuid)})
+
+    with Timer() as t:
+        try:
+            async with async_engine.begin() as conn:
+                await conn.run_sync(store_analyses, computed, version)
+        except Exception as e:
+            print(f"⚠️ Falha ao gravar cache do coach: {e}")
+    timings['cache_write_ms'] = round(t.seconds * 1000, 1)
+    return analyses
+
+# ==============================================================================
+# JOB DE PRÉ-AQUECIMENTO
+# ==============================================================================
+def warm_coach_cache(limit=None, batch_matches=500, days=None):
+    """
+    Calcula e grava as análises das partidas (mais recentes primeiro) que ainda não têm
+    cache na versão atual do coach. Rode após ingestão/retreino.
+    """
+    from models.coach import LoLCoach
+    engine = get_engine()
+    coach = LoLCoach()
+    ensure_coach_cache_table(engine)
+    print(f"🔥 Pré-aquecendo cache do coach ({coach.model_version})...")
+
+    filters = ["p.team_position != 'UNKNOWN'", "p.team_position != ''"]
+    params = {"version": coach.model_version}
+    if days:
+        filters.append("p.game_start_timestamp >= (EXTRACT(EPOCH FROM NOW()) * 1000 - :window_ms)")
+        params["window_ms"] = int(days * 86_400_000)
+    query_pending = text(f"""
+        SELECT p.match_id, MAX(p.game_start_timestamp) AS ts
+        FROM fact_match_player_performance p
+        WHERE {' AND '.join(filters)}
+          AND NOT EXISTS (SELECT 1 FROM {COACH_CACHE_TABLE} c
+                          WHERE c.match_id = p.match_id AND c.model_version = :version)
+        GROUP BY p.match_id
+        ORDER BY ts DESC
+        {'LIMIT :limit' if limit else ''}
+    """)
+    if limit: params["limit"] = int(limit)
+    with engine.connect() as conn:
+        pending = [row[0] for row in conn.execute(query_pending, params)]
+    print(f"   📋 {len(pending):,} partidas sem cache.")
+
+    total_rows = 0
+    with Timer() as t:
+        for start in range(0, len(pending), batch_matches):
+            ids = pending[start:start + batch_matches]
+            with engine.connect() as conn:
+                df = pd.read_sql(text("SELECT * FROM fact_match_player_performance WHERE match_id = ANY(:ids)"),
+                                 conn, params={"ids": ids})
+            computed = coach.analyze_matches_all_players(df)
+            with engine.begin() as conn:
+                total_rows += store_analyses(conn, computed, coach.model_version)
+            print(f"      -> {min(start + batch_matches, len(pending)):,}/{len(pending):,} partidas")
+    print(f"✅ {total_rows:,} análises gravadas em {t.seconds:.1f}s.")
+    return total_rows
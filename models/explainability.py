@@ -1,88 +1,221 @@
 import pandas as pd
-import joblib
-import shap
-import matplotlib.pyplot as plt
+import numpy as np
 import os
-from database import get_engine
-from config import FEATURES_MODEL, settings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import FEATURES_MODEL, MODEL_FILENAME, settings
 from features.engine import prepare_data_for_ml
+from etl.sources import iter_performance_chunks
+from models.registry import load_bundle, file_sha256
+from profiling import Timer
 
-def explain_model():
-    print("🕵️ Iniciando Análise de Explicabilidade por Role (SHAP)...")
-    
-    # 1. Carregar Modelo
+# ==============================================================================
+# RELATÓRIO SHAP (amostra estratificada + pool de processos + cache Parquet)
+# ==============================================================================
+# 1. O histórico inteiro passa em blocos pela feature engineering e por uma amostragem reservoir
+#    por estrato (role x patch): cada linha recebe uma chave aleatória e cada estrato guarda as
+#    `per_stratum` menores -- amostra uniforme sem reposição, memória limitada ao reservoir.
+# 2. Os valores SHAP (TreeSHAP exato, pred_contribs nativo do XGBoost) saem em blocos num pool
+#    de processos; cada processo carrega o modelo 1x.
+# 3. Amostra + SHAP vão para um Parquet com o checksum do modelo no nome: refazer gráficos ou
+#    comparar patches reaproveita o cache (use --refresh para reamostrar após novos dados).
+EXPLAIN_DEFAULTS = {
+    'per_stratum': 400,
+    'chunk_size': 100_000,
+    'block_size': 500,          # Linhas por tarefa do pool
+    'seed': 42,
+    'cache_dir': 'models/artifacts/shap_cache',
+    'output_dir': 'models/artifacts',
+    'dpi': 300,
+    'max_display': 20,
+    'recent_patches': 8,        # Patches na comparação (mais recentes)
+}
+ROLES = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY']
+SAMPLE_ID_COLS = ['match_id', 'puuid', 'team_position', 'patch', 'game_start_timestamp', 'win']
+SHAP_PREFIX = 'shap__'
+
+def _explain_config(overrides=None):
+    cfg = {**EXPLAIN_DEFAULTS, **(settings['model'].get('explain') or {})}
+    cfg.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return cfg
+
+def patch_of(game_version):
+    """'14.3.562.1234' -> '14.3' (versão ausente -> 'unknown')."""
+    parts = game_version.astype(str).str.split('.')
+    return parts.str[:2].str.join('.').where(game_version.notna() & (parts.str.len() >= 2), 'unknown')
+
+def stratified_reservoir_sample(chunks, per_stratum, seed=42):
+    """Amostra uniforme de até `per_stratum` linhas por (role, patch) a partir de blocos brutos."""
+    rng = np.random.default_rng(seed)
+    reservoir, seen = None, 0
+    for chunk in chunks:
+        df = prepare_data_for_ml(chunk)
+        df = df[df['team_position'].isin(ROLES)]
+        seen += len(df)
+        part = df[[c for c in SAMPLE_ID_COLS if c in df.columns and c != 'patch'] + FEATURES_MODEL].copy()
+        part['patch'] = patch_of(df['game_version']) if 'game_version' in df.columns else 'unknown'
+        part['_key'] = rng.random(len(part))
+        pool = part if reservoir is None else pd.concat([reservoir, part], ignore_index=True)
+        reservoir = pool.sort_values('_key', kind='stable').groupby(['team_position', 'patch'], sort=False).head(per_stratum)
+    if reservoir is None: return pd.DataFrame(columns=SAMPLE_ID_COLS + FEATURES_MODEL), 0
+    return reservoir.drop(columns='_key').sort_values(['team_position', 'patch']).reset_index(drop=True), seen
+
+_WORKER = {}
+
+def _init_explain_worker(version, nthread):
+    model = load_bundle(version, parts=['model'])['model']
+    model.set_params(n_jobs=nthread)
+    _WORKER['model'] = model
+
+def _shap_block(start, X):
+    return start, feature_contributions(_WORKER['model'], X, exact=True)
+
+def _render_summary(role, X, shap_values, output_file, dpi, max_display, title):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import shap  # Import tardio: só os processos que desenham pagam o import
+    plt.figure(figsize=(10, 14))
+    plt.title(title, fontsize=16)
+    shap.summary_plot(shap_values, X, show=False, max_display=max_display)
+    plt.tight_layout()
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight')
+    plt.close()
+    return role, output_file
+
+def _model_checksum(bundle):
+    if bundle['manifest']: return bundle['manifest']['files']['model']['sha256']
+    return file_sha256(MODEL_FILENAME)
+
+def shap_cache_path(checksum, cfg):
+    return os.path.join(cfg['cache_dir'], f"shap_{checksum[:16]}_k{cfg['per_stratum']}_s{cfg['seed']}.parquet")
+
+def compute_shap_sample(bundle, cfg, source=None, workers=None, thread_budget=None):
+    """Amostra estratificada + SHAP em paralelo. Retorna DataFrame (ids, features, shap__*)."""
+    with Timer() as t:
+        sample, seen = stratified_reservoir_sample(iter_performance_chunks(source, chunk_size=cfg['chunk_size']),
+                                                   cfg['per_stratum'], cfg['seed'])
+    n_strata = sample.groupby(['team_position', 'patch']).ngroups if len(sample) else 0
+    print(f"   🎯 Amostra: {len(sample):,} de {seen:,} linhas | {n_strata} estratos (role x patch) | {t.seconds:.1f}s")
+    if sample.empty: return sample
+
+    total_threads = thread_budget or os.cpu_count()
+    starts = list(range(0, len(sample), cfg['block_size']))
+    workers = max(1, min(workers or total_threads, len(starts), total_threads))
+    nthread = max(1, total_threads // workers)
+    contribs = np.zeros((len(sample), len(FEATURES_MODEL) + 1), dtype=np.float32)
+    X = sample[FEATURES_MODEL]
+    with Timer() as t:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_explain_worker,
+                                 initargs=(bundle['manifest'] and bundle['version'], nthread)) as pool:
+            futures = [pool.submit(_shap_block, s, X.iloc[s:s + cfg['block_size']]) for s in starts]
+            for fut in as_completed(futures):
+                s, block = fut.result()
+                contribs[s:s + len(block)] = block
+    print(f"   🧮 SHAP de {len(sample):,} linhas em {t.seconds:.1f}s ({workers} processos x {nthread} threads)")
+
+    shap_df = pd.DataFrame(contribs[:, :-1], columns=[SHAP_PREFIX + f for f in FEATURES_MODEL])
+    shap_df[SHAP_PREFIX + 'base'] = contribs[:, -1]
+    return pd.concat([sample, shap_df], axis=1)
+
+def patch_importance(cache_df, recent_patches=None):
+    """Média de |SHAP| por (role, patch, feature): comparação entre patches sem recalcular nada."""
+    shap_cols = [SHAP_PREFIX + f for f in FEATURES_MODEL]
+    patches = sorted(cache_df['patch'].unique(), key=lambda p: [int(x) if x.isdigit() else -1 for x in p.split('.')])
+    if recent_patches: patches = patches[-recent_patches:]
+    df = cache_df[cache_df['patch'].isin(patches)]
+    table = df[shap_cols].abs().groupby([df['team_position'], df['patch']]).mean()
+    table.columns = FEATURES_MODEL
+    return table.reset_index().melt(id_vars=['team_position', 'patch'], var_name='feature', value_name='mean_abs_shap')
+
+def explain_model(workers=None, thread_budget=None, per_stratum=None, source=None, refresh=False):
+    print("🕵️ Iniciando Análise de Explicabilidade por Role e Patch (SHAP)...")
+    cfg = _explain_config({'per_stratum': per_stratum})
+
+    # 1. Modelo (versão CURRENT do registro) e chave do cache
     try:
-        model_path = settings['model']['filename']
-        model = joblib.load(model_path)
-        print(f"   🧠 Modelo carregado de: {model_path}")
+        bundle = load_bundle(parts=['model'])
     except FileNotFoundError:
-        print(f"❌ Modelo não encontrado em {model_path}. Treine primeiro!")
+        print("❌ Modelo não encontrado. Treine primeiro!")
         return
+    cache_path = shap_cache_path(_model_checksum(bundle), cfg)
+    print(f"   🧠 Modelo {bundle['version']} | cache: {cache_path}")
 
-    engine = get_engine()
-    
-    # 2. Carregar Dados (Amostra Aumentada para ter volume em todas as roles)
-    query = """
-    SELECT 
-        p.*,
-        (SELECT COUNT(*) FROM fact_kill_events k 
-         WHERE k.match_id = p.match_id AND k.killer_puuid = p.puuid 
-         AND k.event_time_min <= 15
-         AND ((p.team_id = 100 AND (k.pos_x > 8000 OR k.pos_y > 8000)) OR 
-              (p.team_id = 200 AND (k.pos_x < 7000 OR k.pos_y < 7000)))) as invade_kills
-    FROM fact_match_player_performance p
-    WHERE p.team_position != 'UNKNOWN' AND p.team_position != ''
-    ORDER BY p.game_start_timestamp DESC
-    LIMIT 6000
-    """
-    
-    print("   📥 Baixando amostra de dados...")
-    df_raw = pd.read_sql(query, engine)
-    
-    # 3. Engenharia de Features
-    print("   ⚙️ Calculando features avançadas (v7.0)...")
-    df_processed = prepare_data_for_ml(df_raw)
-    
-    # Preparar Explainer (baseado no modelo treinado)
-    explainer = shap.TreeExplainer(model)
-    
-    output_dir = os.path.join("models", "artifacts")
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 4. Loop por Role
-    roles = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY']
-    
-    for role in roles:
-        print(f"\n   🔎 Analisando Role: {role}...")
-        
-        # Filtrar apenas a role atual
-        df_role = df_processed[df_processed['team_position'] == role]
-        
+    # 2. Valores SHAP: do cache, se o modelo e a amostragem forem os mesmos
+    if os.path.exists(cache_path) and not refresh:
+        cache_df = pd.read_parquet(cache_path)
+        print(f"   ♻️ {len(cache_df):,} linhas com SHAP reaproveitadas do cache (use --refresh para reamostrar).")
+    else:
+        cache_df = compute_shap_sample(bundle, cfg, source, workers, thread_budget)
+        if cache_df.empty:
+            print("   ⚠️ Sem dados para explicar. Baixe jogos primeiro.")
+            return
+        os.makedirs(cfg['cache_dir'], exist_ok=True)
+        cache_df.to_parquet(cache_path, index=False)
+        print(f"   💾 Cache salvo: {cache_path}")
+
+    # 3. Gráficos por role (em paralelo: cada processo importa shap/matplotlib e desenha um)
+    os.makedirs(cfg['output_dir'], exist_ok=True)
+    shap_cols = [SHAP_PREFIX + f for f in FEATURES_MODEL]
+    jobs = []
+    for role in ROLES:
+        df_role = cache_df[cache_df['team_position'] == role]
         if len(df_role) < 100:
             print(f"      ⚠️ Poucos dados para {role} ({len(df_role)}). Pulando.")
             continue
-            
-        X_role = df_role[FEATURES_MODEL]
-        
-        # Calcular SHAP específico para essa amostra
-        shap_values = explainer.shap_values(X_role)
-        
-        # Gerar Gráfico
-        plt.figure(figsize=(10, 14)) # Vertical um pouco maior
-        plt.title(f"Fatores de Vitória: {role} (v7.0)", fontsize=16)
-        
-        # Summary Plot
-        shap.summary_plot(shap_values, X_role, show=False, max_display=20)
-        
-        # Salvar
-        output_file = os.path.join(output_dir, f"feature_importance_{role}.png")
-        plt.tight_layout()
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
-        plt.close() # Limpar memória para o próximo loop
-        
-        print(f"      ✅ Gráfico salvo: {output_file}")
-
-    print("\n🏁 Análise concluída! Abra a pasta 'models/artifacts' para ver os 5 gráficos.")
+        jobs.append((role, df_role[FEATURES_MODEL], df_role[shap_cols].to_numpy(),
+                     os.path.join(cfg['output_dir'], f"feature_importance_{role}.png"),
+                     cfg['dpi'], cfg['max_display'], f"Fatores de Vitória: {role} ({bundle['version']}, n={len(df_role)})"))
+    if jobs:
+        n_proc = max(1, min(workers or os.cpu_count(), len(jobs)))
+        with ProcessPoolExecutor(max_workers=n_proc) as pool:
+            for role, output_file in pool.map(_render_summary, *zip(*jobs)):
+                print(f"      ✅ Gráfico salvo: {output_file}")
+
+    # 4. Comparação entre patches (média de |SHAP|), a partir do mesmo cache
+    table = patch_importance(cache_df, cfg['recent_patches'])
+    table_file = os.path.join(cfg['output_dir'], 'feature_importance_by_patch.csv')
+    table.to_csv(table_file, index=False)
+    print(f"      📊 Importância por patch: {table_file}")
+
+    print(f"\n🏁 Análise concluída! Gráficos e tabela em '{cfg['output_dir']}'.")
+
+# ==============================================================================
+# ATRIBUIÇÕES POR PREDIÇÃO ("por que score 69?")
+# ==============================================================================
+# Calculadas junto com a predição (pred_contribs nativo do XGBoost, em lote) e gravadas só as
+# top-k por linha: índices em FEATURES_MODEL (SMALLINT[]) + contribuições em log-odds (REAL[]).
+# Por padrão usa o modo aproximado (Saabas: caminho de cada árvore), ~3x o custo do predict;
+# o TreeSHAP exato é ordens de grandeza mais caro por linha e fica para amostras offline.
+ATTRIBUTION_DEFAULTS = {'top_k': 5, 'exact': False}
+
+def attribution_config():
+    return {**ATTRIBUTION_DEFAULTS, **((settings['model'].get('prediction') or {}).get('attribution') or {})}
+
+def feature_contributions(model, X, exact=False):
+    """Contribuições por feature + viés (última coluna), em log-odds: matriz (n, n_features + 1)."""
+    import xgboost as xgb  # Import tardio
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    return booster.predict(xgb.DMatrix(X), pred_contribs=True, approx_contribs=not exact)
+
+def top_contributions(contribs, k):
+    """Top-k por |contribuição| em cada linha (ordenado): (índices int16, valores float32, viés float32)."""
+    phi, base = contribs[:, :-1], contribs[:, -1]
+    k = min(k, phi.shape[1])
+    idx = np.argpartition(-np.abs(phi), k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(phi, idx, axis=1)
+    order = np.argsort(-np.abs(vals), axis=1)
+    idx, vals = np.take_along_axis(idx, order, axis=1), np.take_along_axis(vals, order, axis=1)
+    return idx.astype(np.int16), vals.astype(np.float32), base.astype(np.float32)
+
+def format_attribution(features, values, base, win_probability=None):
+    """Linha gravada -> bloco do extra_context da API. None se a predição não tem atribuição."""
+    if features is None or values is None: return None
+    return {
+        'base_logit': round(float(base), 4) if base is not None else None,
+        'win_probability': float(win_probability) if win_probability is not None else None,
+        'top': [{'feature': FEATURES_MODEL[int(i)], 'contribution': round(float(v), 4),
+                 'direction': 'up' if v > 0 else 'down'} for i, v in zip(features, values)],
+    }
 
 if __name__ == "__main__":
     explain_model()
\ No newline at end of file
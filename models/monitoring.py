@@ -0,0 +1,310 @@
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from sqlalchemy import text
+
+from config import FEATURES_MODEL, settings
+from database import get_engine
+
+# Monitor online de calibração e drift (alimentado pelo run_predictions / rescore):
+#   - Cada bloco gravado soma, na MESMA transação das predições, agregados aditivos por dia de jogo:
+#       confiabilidade: (versão, dia, escopo all|role|archetype, segmento, raw|calibrated, bin de prob.)
+#                       -> n, Σp, Σresultado, Σ(p - resultado)²
+#       drift:          (versão, dia, feature, bin) -> n, com bordas fixas por versão (quantis do 1º bloco)
+#   - Brier = Σ(p - y)² / n e ECE = Σ_bins |Σp - Σy| / n saem direto dos agregados em O(bins);
+#     PSI compara o histograma de cada janela com o dos primeiros `reference_days` dias da versão.
+#   - Alertas (piora do Brier, ECE, PSI) podem disparar o retreino: modelo base + cabeças de
+#     calibração, publicado como SHADOW (a promoção continua manual).
+# Só linhas efetivamente gravadas entram (merge idempotente): reprocessar não conta duas vezes.
+
+MONITOR_DEFAULTS = {
+    'enabled': True,
+    'prob_bins': 10,
+    'feature_bins': 10,
+    'reference_days': 14,       # Primeiros N dias da versão = distribuição de referência do PSI/Brier
+    'window': 'week',           # Granularidade do relatório (day | week | month)
+    'min_rows': 500,            # Janelas menores não disparam alerta
+    'brier_delta_max': 0.01,    # Piora do Brier calibrado vs. referência
+    'ece_max': 0.05,
+    'psi_max': 0.25,            # > 0.25: mudança relevante de distribuição
+    'auto_retrain': False,
+}
+
+RELIABILITY_TABLE = 'model_reliability_bins'
+HISTOGRAM_TABLE = 'model_feature_histograms'
+EDGES_TABLE = 'model_feature_bins'
+PROB_KINDS = {'raw': 'win_probability', 'calibrated': 'win_probability_calibrated'}
+RELIABILITY_KEYS = ['model_version', 'period', 'scope', 'segment', 'prob_kind', 'bin']
+RELIABILITY_SUMS = ['n', 'sum_pred', 'sum_outcome', 'sum_sq_err']
+HISTOGRAM_KEYS = ['model_version', 'period', 'feature', 'bin']
+
+MONITOR_DDL = f"""
+CREATE TABLE IF NOT EXISTS {RELIABILITY_TABLE} (
+    model_version VARCHAR(20) NOT NULL,
+    period DATE NOT NULL,
+    scope VARCHAR(10) NOT NULL,
+    segment VARCHAR(30) NOT NULL,
+    prob_kind VARCHAR(10) NOT NULL,
+    bin SMALLINT NOT NULL,
+    n BIGINT NOT NULL DEFAULT 0,
+    sum_pred DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_outcome DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_sq_err DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY ({', '.join(RELIABILITY_KEYS)})
+);
+CREATE TABLE IF NOT EXISTS {HISTOGRAM_TABLE} (
+    model_version VARCHAR(20) NOT NULL,
+    period DATE NOT NULL,
+    feature VARCHAR(60) NOT NULL,
+    bin SMALLINT NOT NULL,
+    n BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY ({', '.join(HISTOGRAM_KEYS)})
+);
+CREATE TABLE IF NOT EXISTS {EDGES_TABLE} (
+    model_version VARCHAR(20) NOT NULL,
+    feature VARCHAR(60) NOT NULL,
+    edges DOUBLE PRECISION[] NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (model_version, feature)
+);
+"""
+
+_table_ready = False
+_edges_cache = {}   # versão -> {feature: bordas}
+
+def monitor_config():
+    return {**MONITOR_DEFAULTS, **(settings['model'].get('monitoring') or {})}
+
+def ensure_monitor_tables(engine=None):
+    """Cria as tabelas do monitor na 1ª utilização do processo (idempotente)."""
+    global _table_ready
+    if _table_ready: return
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(MONITOR_DDL))
+    _table_ready = True
+
+# ==============================================================================
+# 1. AGREGADOS (funções puras)
+# ==============================================================================
+def _periods(game_start_timestamp):
+    return pd.to_datetime(game_start_timestamp, unit='ms', utc=True).dt.date
+
+def reliability_delta(df, n_bins=10):
+    """
+    Linhas gravadas (model_version, game_start_timestamp, team_position, archetype_id, win,
+    win_probability, win_probability_calibrated) -> somas por chave de RELIABILITY_KEYS.
+    """
+    outcome = df['win'].astype(float)
+    base = pd.DataFrame({'model_version': df['model_version'], 'period': _periods(df['game_start_timestamp']),
+                         'outcome': outcome})
+    segments = [('all', pd.Series('ALL', index=df.index)), ('role', df['team_position'].astype(str)),
+                ('archetype', df['archetype_id'].astype('Int64').astype(str).where(df['archetype_id'].notna()))]
+    frames = []
+    for kind, col in PROB_KINDS.items():
+        if col not in df.columns: continue
+        p = df[col].astype(float)
+        part = base.assign(prob_kind=kind, pred=p, sq=(p - outcome) ** 2,
+                           bin=np.minimum(np.floor(p.fillna(0) * n_bins), n_bins - 1).astype(int))
+        valid = p.notna() & outcome.notna()
+        for scope, segment in segments:
+            keep = valid & segment.notna()
+            frames.append(part[keep].assign(scope=scope, segment=segment[keep]))
+    if not frames: return pd.DataFrame(columns=RELIABILITY_KEYS + RELIABILITY_SUMS)
+    long = pd.concat(frames, ignore_index=True)
+    return long.groupby(RELIABILITY_KEYS, sort=False).agg(
+        n=('pred', 'size'), sum_pred=('pred', 'sum'), sum_outcome=('outcome', 'sum'), sum_sq_err=('sq', 'sum')).reset_index()
+
+def feature_edges(values, n_bins=10):
+    """Bordas internas por quantis (únicas); n_bins - 1 bordas -> n_bins faixas."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if values.size == 0: return np.array([])
+    return np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+
+def histogram_delta(df, edges):
+    """Contagens por (model_version, dia, feature, bin); bin -1 = valor ausente."""
+    period = _periods(df['game_start_timestamp'])
+    frames = []
+    for feature, feat_edges in edges.items():
+        values = df[feature].to_numpy(dtype=np.float64)
+        bins = np.where(np.isfinite(values), np.searchsorted(feat_edges, values, side='right'), -1)
+        frames.append(pd.DataFrame({'model_version': df['model_version'].to_numpy(), 'period': period.to_numpy(),
+                                    'feature': feature, 'bin': bins}))
+    if not frames: return pd.DataFrame(columns=HISTOGRAM_KEYS + ['n'])
+    return pd.concat(frames, ignore_index=True).groupby(HISTOGRAM_KEYS, sort=False).size().rename('n').reset_index()
+
+def reliability_metrics(bins):
+    """Brier, ECE, prob. média e taxa de vitória de um conjunto de bins (O(bins))."""
+    if 'bin' in bins.columns: bins = bins.groupby('bin')[RELIABILITY_SUMS].sum()  # ECE: |Σp - Σy| por bin
+    n = bins['n'].sum()
+    if not n: return {'n': 0, 'brier': None, 'ece': None, 'mean_pred': None, 'win_rate': None}
+    return {'n': int(n), 'brier': bins['sum_sq_err'].sum() / n,
+            'ece': (bins['sum_pred'] - bins['sum_outcome']).abs().sum() / n,
+            'mean_pred': bins['sum_pred'].sum() / n, 'win_rate': bins['sum_outcome'].sum() / n}
+
+def psi(expected, actual, eps=1e-4):
+    """Population Stability Index entre duas contagens por bin (Series indexadas pelo bin)."""
+    idx = expected.index.union(actual.index)
+    e = expected.reindex(idx, fill_value=0).to_numpy(dtype=np.float64)
+    a = actual.reindex(idx, fill_value=0).to_numpy(dtype=np.float64)
+    if not e.sum() or not a.sum(): return None
+    e, a = np.clip(e / e.sum(), eps, None), np.clip(a / a.sum(), eps, None)
+    return float(((a - e) * np.log(a / e)).sum())
+
+# ==============================================================================
+# 2. GRAVAÇÃO (chamada pelo predictor, por bloco)
+# ==============================================================================
+def ensure_feature_edges(engine, model_version, df, n_bins=None):
+    """
+    Bordas fixas da versão: as do banco ou, na 1ª vez, os quantis deste bloco (transação própria,
+    fora da gravação do bloco; ON CONFLICT: processos em paralelo ficam com as mesmas bordas).
+    """
+    if model_version in _edges_cache: return _edges_cache[model_version]
+    n_bins = n_bins or monitor_config()['feature_bins']
+    ensure_monitor_tables(engine)
+    features = [f for f in FEATURES_MODEL if f in df.columns]
+    with engine.begin() as conn:
+        stmt = text(f"INSERT INTO {EDGES_TABLE} (model_version, feature, edges) VALUES (:v, :f, :e) ON CONFLICT DO NOTHING")
+        conn.execute(stmt, [{'v': model_version, 'f': f, 'e': feature_edges(df[f], n_bins).tolist()} for f in features])
+        rows = conn.execute(text(f"SELECT feature, edges FROM {EDGES_TABLE} WHERE model_version = :v"), {'v': model_version})
+        edges = {feature: np.asarray(e, dtype=np.float64) for feature, e in rows if feature in features}
+    _edges_cache[model_version] = edges
+    return edges
+
+def _upsert(conn, table, keys, sums, delta):
+    if delta.empty: return 0
+    delta = delta.sort_values(keys)  # Ordem fixa das chaves: gravadores em paralelo sem deadlock
+    cols = keys + sums
+    stmt = text(f"""
+        INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(':' + c for c in cols)})
+        ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+            {', '.join(f"{c} = {table}.{c} + EXCLUDED.{c}" for c in sums)}
+    """)
+    records = delta[cols].astype(object).to_dict('records')
+    conn.execute(stmt, records)
+    return len(records)
+
+def update_monitor(conn, written, edges=None):
+    """Soma os agregados das linhas gravadas. Rode na MESMA transação que grava as predições."""
+    if written.empty: return
+    cfg = monitor_config()
+    _upsert(conn, RELIABILITY_TABLE, RELIABILITY_KEYS, RELIABILITY_SUMS, reliability_delta(written, cfg['prob_bins']))
+    if edges: _upsert(conn, HISTOGRAM_TABLE, HISTOGRAM_KEYS, ['n'], histogram_delta(written, edges))
+
+# ==============================================================================
+# 3. RELATÓRIO E ALERTAS
+# ==============================================================================
+def _load(engine, version, window, reference_days):
+    """Agregados por janela (e flag de referência: primeiros `reference_days` dias da versão)."""
+    bucket = f"date_trunc('{window}', period)::date"
+    with engine.connect() as conn:
+        first = conn.execute(text(f"SELECT MIN(period) FROM {RELIABILITY_TABLE} WHERE model_version = :v"), {'v': version}).scalar()
+        if first is None: return pd.DataFrame(), pd.DataFrame()
+        params = {'v': version, 'ref_end': first + timedelta(days=reference_days)}
+        rel = pd.read_sql(text(f"""
+            SELECT {bucket} AS bucket, period < :ref_end AS is_reference, scope, segment, prob_kind, bin,
+                   SUM(n) AS n, SUM(sum_pred) AS sum_pred, SUM(sum_outcome) AS sum_outcome, SUM(sum_sq_err) AS sum_sq_err
+            FROM {RELIABILITY_TABLE} WHERE model_version = :v
+            GROUP BY 1, 2, 3, 4, 5, 6
+        """), conn, params=params)
+        hist = pd.read_sql(text(f"""
+            SELECT {bucket} AS bucket, period < :ref_end AS is_reference, feature, bin, SUM(n) AS n
+            FROM {HISTOGRAM_TABLE} WHERE model_version = :v
+            GROUP BY 1, 2, 3, 4
+        """), conn, params=params)
+    return rel, hist
+
+def build_report(rel, hist, cfg):
+    """
+    Séries de Brier/ECE por janela e segmento, PSI por janela e feature (vs. referência) e os
+    alertas da última janela. `rel`/`hist`: agregados com as colunas bucket e is_reference.
+    """
+    metrics = [{'bucket': key[0], 'scope': key[1], 'segment': key[2], 'prob_kind': key[3], **reliability_metrics(g)}
+               for key, g in rel.groupby(['bucket', 'scope', 'segment', 'prob_kind'], sort=True)] if not rel.empty else []
+    metrics = pd.DataFrame(metrics, columns=['bucket', 'scope', 'segment', 'prob_kind', 'n', 'brier', 'ece', 'mean_pred', 'win_rate'])
+
+    rows = []
+    if not hist.empty:
+        reference = hist[hist['is_reference']].groupby(['feature', 'bin'])['n'].sum()
+        ref_features = set(reference.index.get_level_values(0))
+        for (bucket, feature), g in hist.groupby(['bucket', 'feature'], sort=True):
+            if feature in ref_features:
+                rows.append({'bucket': bucket, 'feature': feature, 'psi': psi(reference.loc[feature], g.groupby('bin')['n'].sum())})
+    drift = pd.DataFrame(rows, columns=['bucket', 'feature', 'psi'])
+
+    alerts = []
+    overall = metrics[(metrics['scope'] == 'all') & (metrics['prob_kind'] == 'calibrated') & (metrics['n'] >= cfg['min_rows'])]
+    if overall.empty: return metrics, drift, alerts
+    latest = overall.iloc[-1]
+    ref_rows = rel[(rel['scope'] == 'all') & (rel['prob_kind'] == 'calibrated') & rel['is_reference']]
+    reference = reliability_metrics(ref_rows)
+    # Só compara com a referência uma janela que já está inteira depois dela
+    if reference['n'] and latest['bucket'] > ref_rows['bucket'].max() and latest['brier'] - reference['brier'] > cfg['brier_delta_max']:
+        alerts.append(f"Brier {latest['brier']:.4f} vs. referência {reference['brier']:.4f} (janela {latest['bucket']})")
+    if latest['ece'] > cfg['ece_max']:
+        alerts.append(f"ECE {latest['ece']:.3f} > {cfg['ece_max']} (janela {latest['bucket']})")
+    recent = drift[(drift['bucket'] == latest['bucket']) & (drift['psi'] > cfg['psi_max'])]
+    if not recent.empty:
+        alerts.append(f"PSI > {cfg['psi_max']}: " + ", ".join(f"{r.feature} ({r.psi:.2f})" for r in recent.itertuples()))
+    return metrics, drift, alerts
+
+def monitor_report(version=None, window=None, engine=None):
+    """{'version', 'metrics', 'drift', 'alerts'} a partir dos agregados (sem reler predições)."""
+    from models.registry import LEGACY_VERSION, get_pointer  # Import tardio
+    cfg = monitor_config()
+    window = window or cfg['window']
+    if window not in ('day', 'week', 'month'): raise ValueError(f"Janela inválida: {window}")
+    engine = engine or get_engine()
+    ensure_monitor_tables(engine)
+    version = version or get_pointer('CURRENT') or LEGACY_VERSION
+    rel, hist = _load(engine, version, window, cfg['reference_days'])
+    metrics, drift, alerts = build_report(rel, hist, cfg)
+    return {'version': version, 'window': window, 'metrics': metrics, 'drift': drift, 'alerts': alerts}
+
+def trigger_retrain(reason):
+    """Retreina o modelo base e as cabeças de calibração e publica como SHADOW (uma candidata por vez)."""
+    from models.registry import get_pointer, publish_bundle  # Import tardio
+    if get_pointer('SHADOW'):
+        print(f"   ⏸️ Já existe candidata em SHADOW ({get_pointer('SHADOW')}): avalie/promova antes de retreinar.")
+        return None
+    from models.trainer import train_model_scalable
+    from models.stacking import train_calibration_layer
+    train_model_scalable()
+    train_calibration_layer()  # As cabeças dependem da prob. do modelo novo; os arquétipos não
+    return publish_bundle(note=f"Retreino automático: {reason}", shadow=True)
+
+def run_monitor(version=None, window=None, retrain=False):
+    report = monitor_report(version, window)
+    metrics, drift = report['metrics'], report['drift']
+    print(f"📡 Monitor do modelo {report['version']} (janela: {report['window']})")
+    if metrics.empty:
+        print("   ⚠️ Sem agregados ainda. Rode 'python main.py predict' primeiro.")
+        return report
+
+    overall = metrics[metrics['scope'] == 'all'].pivot(index='bucket', columns='prob_kind', values=['n', 'brier', 'ece'])
+    print(f"\n{'JANELA':<12} {'N':>8} {'BRIER':>8} {'BRIER CAL':>10} {'ECE':>7} {'ECE CAL':>8} {'PSI MÁX':>8}")
+    max_psi = drift.groupby('bucket')['psi'].max() if not drift.empty else pd.Series(dtype=float)
+    fmt = lambda v, w, p: f"{v:>{w}.{p}f}" if pd.notna(v) else f"{'-':>{w}}"
+    for bucket, row in overall.iterrows():
+        n = row.get(('n', 'calibrated'), row.get(('n', 'raw')))
+        print(f"{str(bucket):<12} {int(n):>8} {fmt(row.get(('brier', 'raw')), 8, 4)} {fmt(row.get(('brier', 'calibrated')), 10, 4)}"
+              f" {fmt(row.get(('ece', 'raw')), 7, 3)} {fmt(row.get(('ece', 'calibrated')), 8, 3)} {fmt(max_psi.get(bucket), 8, 3)}")
+
+    latest = metrics['bucket'].max()
+    by_segment = metrics[(metrics['bucket'] == latest) & (metrics['scope'] != 'all') & (metrics['prob_kind'] == 'calibrated')]
+    print(f"\n🔎 Última janela ({latest}) por segmento (calibrado):")
+    for r in by_segment.itertuples():
+        print(f"   {r.scope:<10} {r.segment:<10} n={r.n:>7} | Brier {r.brier:.4f} | ECE {r.ece:.3f} | prob. média {r.mean_pred:.2f} vs. vitórias {r.win_rate:.2f}")
+
+    if not report['alerts']:
+        print("\n✅ Calibração e distribuição das features dentro dos limites.")
+        return report
+    print("\n🚨 ALERTAS:")
+    for alert in report['alerts']: print(f"   - {alert}")
+    if retrain or monitor_config()['auto_retrain']:
+        print("🔁 Disparando retreino...")
+        report['retrained'] = trigger_retrain("; ".join(report['alerts']))
+    else:
+        print("   -> Retreino recomendado (rode com --retrain ou ligue model.monitoring.auto_retrain).")
+    return report
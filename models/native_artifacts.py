@@ -0,0 +1,120 @@
+import json
+import numpy as np
+
+# Formatos nativos dos artefatos (sem pickle):
+#   modelo       -> UBJSON do XGBoost (estável entre versões, carrega sem unpickle)
+#   arquétipos   -> .npz com média/escala do scaler, PCA e centróides do KMeans
+#   calibração   -> .npz com coef/intercept de cada cabeça logística
+# Os objetos carregados têm a mesma interface que o coach usa dos originais do sklearn
+# (transform / predict / predict_proba), só com NumPy: a API não importa sklearn.decomposition,
+# sklearn.cluster nem sklearn.linear_model para subir.
+
+NATIVE_FILES = {'model': 'model.ubj', 'archetypes': 'archetypes.npz', 'calibration': 'calibration.npz'}
+
+class NumpyScaler:
+    def __init__(self, mean, scale):
+        self.mean_, self.scale_ = mean, scale
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.mean_ is not None: X = X - self.mean_
+        return X / self.scale_ if self.scale_ is not None else X
+
+class NumpyPCA:
+    def __init__(self, mean, components, explained_variance=None):
+        self.mean_, self.components_, self.explained_variance_ = mean, components, explained_variance
+
+    def transform(self, X):
+        X_t = (np.asarray(X, dtype=np.float64) - self.mean_) @ self.components_.T
+        return X_t / np.sqrt(self.explained_variance_) if self.explained_variance_ is not None else X_t
+
+class NumpyKMeans:
+    def __init__(self, centers):
+        self.cluster_centers_ = centers
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=self.cluster_centers_.dtype)
+        # ||x - c||² = ||x||² - 2x·c + ||c||² (o termo ||x||² não muda o argmin)
+        dist = -2 * X @ self.cluster_centers_.T + (self.cluster_centers_ ** 2).sum(axis=1)
+        return dist.argmin(axis=1).astype(np.int32)
+
+class NumpyLogisticHead:
+    def __init__(self, coef, intercept, classes):
+        self.coef_, self.intercept_, self.classes_ = coef, intercept, classes
+
+    def decision_function(self, X):
+        scores = np.asarray(X, dtype=np.float64) @ self.coef_.T + self.intercept_
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict_proba(self, X):
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            p = 1 / (1 + np.exp(-scores))
+            return np.column_stack([1 - p, p])
+        exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+# ==============================================================================
+# EXPORTAÇÃO (a partir dos objetos do sklearn / XGBoost)
+# ==============================================================================
+def _str_keys(value):
+    return {str(k): v for k, v in value.items()} if isinstance(value, dict) else value
+
+def _optional(arr):
+    return np.array([]) if arr is None else np.asarray(arr)
+
+def save_native(role, obj, path):
+    if role == 'model':
+        obj.save_model(path)  # XGBClassifier: .ubj guarda o booster + metadados do sklearn
+    elif role == 'archetypes':
+        scaler, pca, kmeans = obj['scaler'], obj['pca'], obj['kmeans']
+        np.savez(path,
+                 scaler_mean=_optional(scaler.mean_ if scaler.with_mean else None),
+                 scaler_scale=_optional(scaler.scale_ if scaler.with_std else None),
+                 pca_mean=pca.mean_, pca_components=pca.components_,
+                 pca_variance=_optional(pca.explained_variance_ if pca.whiten else None),
+                 kmeans_centers=kmeans.cluster_centers_,
+                 extras=np.array(json.dumps({k: _str_keys(v) for k, v in obj.items() if k not in ('scaler', 'pca', 'kmeans')},
+                                            ensure_ascii=False, default=str)))
+    elif role == 'calibration':
+        arrays = {}
+        for key, head in obj.items():
+            arrays[f"{key}__coef"] = head.coef_
+            arrays[f"{key}__intercept"] = head.intercept_
+            arrays[f"{key}__classes"] = head.classes_
+        np.savez(path, keys=np.array(json.dumps([[str(k), type(k).__name__] for k in obj])), **arrays)
+    else:
+        raise ValueError(f"Papel desconhecido: {role}")
+
+# ==============================================================================
+# CARGA
+# ==============================================================================
+def _restore_key(key, type_name):
+    return int(key) if type_name.startswith(('int', 'uint')) else key
+
+def load_native(role, path):
+    if role == 'model':
+        from xgboost import XGBClassifier  # Import tardio (só quem prevê precisa do XGBoost)
+        model = XGBClassifier()
+        model.load_model(path)
+        return model
+    with np.load(path, allow_pickle=False) as data:
+        if role == 'archetypes':
+            none_if_empty = lambda a: a if a.size else None
+            pipe = {
+                'scaler': NumpyScaler(none_if_empty(data['scaler_mean']), none_if_empty(data['scaler_scale'])),
+                'pca': NumpyPCA(data['pca_mean'], data['pca_components'], none_if_empty(data['pca_variance'])),
+                'kmeans': NumpyKMeans(data['kmeans_centers']),
+            }
+            extras = json.loads(str(data['extras']))
+            # Chaves numéricas (ex.: labels {0: "..."}) voltam como int
+            for k, v in extras.items():
+                pipe[k] = {int(i) if str(i).lstrip('-').isdigit() else i: lbl for i, lbl in v.items()} if isinstance(v, dict) else v
+            return pipe
+        if role == 'calibration':
+            heads = {}
+            for key, type_name in json.loads(str(data['keys'])):
+                heads[_restore_key(key, type_name)] = NumpyLogisticHead(
+                    data[f"{key}__coef"], data[f"{key}__intercept"], data[f"{key}__classes"])
+            return heads
+    raise ValueError(f"Papel desconhecido: {role}")
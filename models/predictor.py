@@ -1,89 +1,181 @@
+import time
 import pandas as pd
 import numpy as np
-import joblib
 from sqlalchemy import text
 
-from database import get_engine
-from config import FEATURES_MODEL, MODEL_FILENAME
-from features.engine import prepare_data_for_ml
-from features.post_processing import calculate_ai_score
+from database import get_engine, copy_dataframe
+from config import FEATURES_MODEL, settings
+from features.post_processing import calculate_ai_score, RANK_LABELS
+from models.ranking import ensure_ranking_table, compute_rollup_delta, compute_rescore_delta, merge_rollup_deltas, apply_rollup_delta
+from etl.versions import RANKING_SCOPE, ensure_version_table, bump_versions
+from etl.watermarks import PREDICTIONS_PIPELINE, ensure_watermark_table, read_watermark, advance_watermark, safe_upper
+from models.registry import LEGACY_VERSION, load_bundle
+from models.explainability import attribution_config, feature_contributions, top_contributions
+from models.scoring import ScoringBundle
+from models.monitoring import monitor_config, ensure_monitor_tables, ensure_feature_edges, update_monitor
 
-# Constante de Versionamento
-MODEL_VERSION = 'v8.0'
+# Blocos de tamanho fixo: memória limitada pelo bloco, não pelo tamanho do backlog
+PREDICT_DEFAULTS = {
+    'chunk_size': 5000,
+    'watermark_lag_s': 30,  # Folga extra além do limite por transações abertas (ver etl/watermarks.safe_upper)
+    'watermark_stall_warn_s': 300,  # Avisa quando uma ingestão aberta segura o limite por mais que isso
+}
 
-def get_new_matches(engine, limit=50000):
+def _predict_config():
+    return {**PREDICT_DEFAULTS, **(settings['model'].get('prediction') or {})}
+
+def pending_query(filters):
     """
-    Busca partidas pendentes usando LEFT JOIN (Mais robusto que NOT IN).
+    Próximo bloco após a marca (keyset em idx_perf_ingest), com `filters` extras sobre `p`.
+    invade_kills é calculado apenas para as linhas do bloco.
     """
-    # 1. Debug: Contagem Rápida
-    with engine.connect() as conn:
-        total_source = conn.execute(text("SELECT COUNT(DISTINCT match_id) FROM fact_match_player_performance")).scalar()
-        
-        # Verifica se a tabela de predições existe antes de contar
-        try:
-            total_preds = conn.execute(text("SELECT COUNT(DISTINCT match_id) FROM fact_match_predictions")).scalar()
-        except:
-            total_preds = 0 # Tabela ainda não existe
-            
-        print(f"   📊 DIAGNÓSTICO: Origem={total_source} jogos | Já Previstos={total_preds} jogos")
-        
-        if total_source == 0:
-            print("   ⚠️ AVISO: Sua tabela de performance está VAZIA! Baixe jogos primeiro.")
-            return pd.DataFrame()
-
-    # 2. Query com LEFT JOIN (Anti-Join Pattern)
-    # Traz tudo da tabela 'p' (Performance) que NÃO tem correspondência na tabela 'pred' (Predictions)
-    query = f"""
-    SELECT 
-        p.*,
-        (SELECT COUNT(*) FROM fact_kill_events k 
-         WHERE k.match_id = p.match_id AND k.killer_puuid = p.puuid 
-         AND k.event_time_min <= 15
-         AND ((p.team_id = 100 AND (k.pos_x > 8000 OR k.pos_y > 8000)) OR 
-              (p.team_id = 200 AND (k.pos_x < 7000 OR k.pos_y < 7000)))) as invade_kills
+    return f"""
+WITH pending AS (
+    SELECT p.*
     FROM fact_match_player_performance p
-    LEFT JOIN fact_match_predictions pred 
-        ON p.match_id = pred.match_id 
-        AND p.puuid = pred.puuid
-    WHERE p.team_position != 'UNKNOWN'
-      AND pred.match_id IS NULL -- <--- O PULO DO GATO: Só traz o que não existe lá
-    ORDER BY p.game_start_timestamp DESC
-    LIMIT {limit}
+    WHERE (p.ingested_at, p.match_id, p.puuid) > (CAST(:wm_ts AS TIMESTAMPTZ), :wm_match, :wm_puuid)
+      AND p.ingested_at < :upper
+      AND p.team_position != 'UNKNOWN'
+      {filters}
+    ORDER BY p.ingested_at, p.match_id, p.puuid
+    LIMIT :chunk_size
+)
+SELECT
+    pending.*,
+    (SELECT COUNT(*) FROM fact_kill_events k
+     WHERE k.match_id = pending.match_id AND k.killer_puuid = pending.puuid
+     AND k.event_time_min <= 15
+     AND ((pending.team_id = 100 AND (k.pos_x > 8000 OR k.pos_y > 8000)) OR
+          (pending.team_id = 200 AND (k.pos_x < 7000 OR k.pos_y < 7000)))) as invade_kills
+FROM pending
+ORDER BY ingested_at, match_id, puuid
+"""
+
+# O NOT EXISTS é uma busca pela PK por linha do bloco: só filtra algo na 1ª rodada
+# (linhas já previstas antes de existir a marca).
+PENDING_QUERY = pending_query("""AND NOT EXISTS (SELECT 1 FROM fact_match_predictions pred
+                      WHERE pred.match_id = p.match_id AND pred.puuid = p.puuid)""")
+
+BACKLOG_QUERY = """
+SELECT COUNT(*) FROM fact_match_player_performance
+WHERE (ingested_at, match_id, puuid) > (CAST(:wm_ts AS TIMESTAMPTZ), :wm_match, :wm_puuid)
+  AND ingested_at < :upper AND team_position != 'UNKNOWN'
+"""
+
+def _watermark_params(watermark):
+    if watermark is None or watermark['ingested_at'] is None:
+        return {'wm_ts': '-infinity', 'wm_match': '', 'wm_puuid': ''}
+    return {'wm_ts': watermark['ingested_at'], 'wm_match': watermark['match_id'], 'wm_puuid': watermark['puuid']}
+
+def iter_pending_chunks(engine, watermark, upper, chunk_size, query=PENDING_QUERY, params=None):
     """
-    
-    return pd.read_sql(query, engine)
+    Linhas pendentes em blocos de até `chunk_size`, em ordem de ingestão, de `watermark` até `upper`.
+    Cada bloco retoma da última chave do anterior; termina quando um bloco vem incompleto.
+    """
+    params = {**(params or {}), **_watermark_params(watermark), 'upper': upper, 'chunk_size': chunk_size}
+    while True:
+        with engine.connect() as conn:
+            df = pd.read_sql(text(query), conn, params=params)
+        if df.empty: return
+        yield df
+        if len(df) < chunk_size: return
+        last = df.iloc[-1]
+        params.update(wm_ts=last['ingested_at'], wm_match=last['match_id'], wm_puuid=last['puuid'])
 
-def run_predictions():
-    print(f"🔮 Iniciando Pipeline de Predição ({MODEL_VERSION})...")
-    engine = get_engine()
-    
-    # 1. Carregar Modelo
-    try:
-        model = joblib.load(MODEL_FILENAME)
-    except FileNotFoundError:
-        print("❌ Modelo não encontrado. Rode 'python main.py train' primeiro!")
-        return
+# --- GRAVAÇÃO EM MASSA (COPY -> staging -> merge) ---
+PRED_TABLE = 'fact_match_predictions'
+STAGE_TABLE = 'stage_match_predictions'
+PRED_COLS = ['match_id', 'puuid', 'game_start_timestamp', 'team_position', 'win_probability', 'ai_score',
+             'ai_rank', 'model_version', 'ai_score_role_norm', 'ai_rating_text',
+             'attr_features', 'attr_values', 'attr_base', 'win_probability_calibrated', 'archetype_id']
+ARRAY_COLS = ['attr_features', 'attr_values']
 
-    # 2. Carregar Apenas Dados Novos (Incremental)
-    print("   📥 Buscando partidas pendentes no PostgreSQL...")
-    df_raw = get_new_matches(engine)
-    
-    if df_raw.empty:
-        print("   ✅ Todas as partidas já estão atualizadas (ou banco vazio). Nada a fazer.")
-        return
+# Atribuições top-k ao lado da predição (ver models/explainability.py)
+ATTRIBUTION_DDL = f"""
+ALTER TABLE {PRED_TABLE} ADD COLUMN IF NOT EXISTS attr_features SMALLINT[];
+ALTER TABLE {PRED_TABLE} ADD COLUMN IF NOT EXISTS attr_values REAL[];
+ALTER TABLE {PRED_TABLE} ADD COLUMN IF NOT EXISTS attr_base REAL;
+"""
+# Saída do pipeline fundido (ver models/scoring.py): prob. calibrada e arquétipo
+SCORING_DDL = f"""
+ALTER TABLE {PRED_TABLE} ADD COLUMN IF NOT EXISTS win_probability_calibrated REAL;
+ALTER TABLE {PRED_TABLE} ADD COLUMN IF NOT EXISTS archetype_id SMALLINT;
+"""
 
-    print(f"   ⚙️ Processando {len(df_raw)} novas linhas de performance...")
+_table_ready = False
 
-    # 3. Engenharia de Features
-    df_processed = prepare_data_for_ml(df_raw)
-    
-    # 4. Predição (Win Probability)
+def ensure_prediction_columns(engine=None):
+    """Colunas de atribuição e de calibração na tabela de predições (1ª utilização do processo, idempotente)."""
+    global _table_ready
+    if _table_ready: return
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(ATTRIBUTION_DDL))
+        conn.execute(text(SCORING_DDL))
+    _table_ready = True
+
+def _pg_array(values):
+    """Lista -> literal de array do PostgreSQL para o COPY em CSV."""
+    return None if values is None else '{' + ','.join(map(str, values)) + '}'
+
+# Conflito em (match_id, puuid) só sobrescreve se a versão do modelo mudou: rodar de novo com a
+# mesma versão (ou duas rodadas sobrepostas) não grava nada. `old` lê o estado anterior no mesmo
+# snapshot para o delta do ranking; xmax = 0 marca linha inserida (vs. atualizada).
+MERGE_SQL = f"""
+WITH old AS (
+    SELECT t.match_id, t.puuid, t.ai_score
+    FROM {PRED_TABLE} t JOIN {STAGE_TABLE} s ON s.match_id = t.match_id AND s.puuid = t.puuid
+), merged AS (
+    INSERT INTO {PRED_TABLE} ({', '.join(PRED_COLS)})
+    SELECT DISTINCT ON (match_id, puuid) {', '.join(PRED_COLS)} FROM {STAGE_TABLE}
+    ON CONFLICT (match_id, puuid) DO UPDATE SET
+        {', '.join(f"{c} = EXCLUDED.{c}" for c in PRED_COLS if c not in ('match_id', 'puuid'))},
+        created_at = CURRENT_TIMESTAMP
+    WHERE {PRED_TABLE}.model_version IS DISTINCT FROM EXCLUDED.model_version
+    RETURNING match_id, puuid, ai_score, (xmax = 0) AS inserted
+)
+SELECT m.match_id, m.puuid, m.inserted, m.ai_score, o.ai_score AS old_ai_score
+FROM merged m LEFT JOIN old o ON o.match_id = m.match_id AND o.puuid = m.puuid
+"""
+
+def write_predictions(conn, output_df):
+    """
+    COPY do lote para uma tabela temporária + merge idempotente na fato (rode dentro de uma transação).
+    Retorna só as linhas efetivamente gravadas: match_id, puuid, inserted, ai_score, old_ai_score.
+    """
+    conn.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (LIKE {PRED_TABLE} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"))
+    staged = output_df.assign(**{c: output_df[c].map(_pg_array) for c in ARRAY_COLS if c in output_df.columns})
+    copy_dataframe(conn, staged, STAGE_TABLE, columns=PRED_COLS)
+    result = conn.execute(text(MERGE_SQL))
+    written = pd.DataFrame(result.fetchall(), columns=['match_id', 'puuid', 'inserted', 'ai_score', 'old_ai_score'])
+    written['inserted'] = written['inserted'].astype(bool)
+    return written
+
+# Constantes Globais (Hardcoded do Treino): média/desvio do AI Score por role, + default no fim
+GLOBAL_ROLES = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY']
+GLOBAL_MEAN = np.array([52.0, 51.5, 50.0, 51.0, 49.5, 50.0])
+GLOBAL_STD = np.array([14.5, 15.0, 16.0, 14.0, 13.5, 15.0])
+
+RATING_TEXTS = ['MVP (Smurf)', 'Bom (Carry)', 'Neutro', 'Ruim (Tilt)']
+RANK_RATING = {'S+': 'MVP (Smurf)', 'S': 'MVP (Smurf)', 'A': 'Bom (Carry)', 'C': 'Ruim (Tilt)'}  # Demais: Neutro
+RATING_BY_RANK = np.array([RATING_TEXTS.index(RANK_RATING.get(r, 'Neutro')) for r in RANK_LABELS])  # código do rank -> texto
+
+def score_predictions(df_raw, scorer, model_version=LEGACY_VERSION, top_k=None):
+    """
+    Features -> Predição -> AI Score -> Output no formato de 'fact_match_predictions'.
+    Função pura (sem I/O) para poder ser reutilizada em benchmark e reprocessamentos.
+    `scorer`: ScoringBundle (prob. bruta + arquétipo + calibrada) ou só o modelo base.
+    `top_k` atribuições por linha (padrão: model.prediction.attribution.top_k; 0 desliga).
+    """
+    scorer = ScoringBundle.wrap(scorer)
+    attr_cfg = attribution_config()
+    top_k = attr_cfg['top_k'] if top_k is None else top_k
+    # 3-4. Engenharia de Features + Predição (pipeline fundido, uma chamada por lote)
+    df_processed, scored = scorer.score(df_raw)
     X = df_processed[FEATURES_MODEL]
-    probs = model.predict_proba(X)[:, 1]
-    df_processed['win_prob'] = probs
+    df_processed['win_prob'] = scored['win_probability']
     
     # 5. Cálculo do AI Score (0-100)
-    print("   🧮 Calculando AI Scores e Métricas Relativas...")
     df_scores = calculate_ai_score(df_processed)
     
     # 6. Montagem do Output Final
@@ -95,50 +187,110 @@ def run_predictions():
     
     # Métricas do Modelo
     output_df['win_probability'] = df_processed['win_prob'].round(4)
+    output_df['win_probability_calibrated'] = scored['win_probability_calibrated'].round(4)
+    output_df['archetype_id'] = scored['archetype_id'].astype('Int16').mask(scored['archetype_id'] < 0)  # Sem arquétipos -> NULL
     output_df['ai_score'] = df_scores['ai_score']
     output_df['ai_rank'] = df_scores['ai_rank']
     
     # Versionamento
-    output_df['model_version'] = MODEL_VERSION
-    
-    # 7. Normalização Relativa Global
-    def get_global_zscore(row):
-        # Constantes Globais (Hardcoded do Treino)
-        GLOBAL_STATS = {
-            'TOP':     {'mean': 52.0, 'std': 14.5},
-            'JUNGLE':  {'mean': 51.5, 'std': 15.0},
-            'MIDDLE':  {'mean': 50.0, 'std': 16.0},
-            'BOTTOM':  {'mean': 51.0, 'std': 14.0},
-            'UTILITY': {'mean': 49.5, 'std': 13.5}
-        }
-        role = row['team_position']
-        score = row['ai_score']
-        stats = GLOBAL_STATS.get(role, {'mean': 50, 'std': 15})
-        return (score - stats['mean']) / stats['std']
-
-    output_df['ai_score_role_norm'] = output_df.apply(get_global_zscore, axis=1).round(2)
-
-    # Texto Descritivo
-    conditions = [
-        (output_df['ai_rank'].str.contains('S')),
-        (output_df['ai_rank'].str.contains('A')),
-        (output_df['ai_rank'].str.contains('B')),
-        (output_df['ai_rank'].str.contains('C'))
-    ]
-    choices = ['MVP (Smurf)', 'Bom (Carry)', 'Neutro', 'Ruim (Tilt)']
-    output_df['ai_rating_text'] = np.select(conditions, choices, default='Neutro')
+    output_df['model_version'] = model_version
     
-    # 8. Salvamento Incremental (Append)
-    print(f"   💾 Gravando {len(output_df)} registros em 'fact_match_predictions'...")
+    # 7. Normalização Relativa Global (lookup por código da role; role desconhecida -> última posição)
+    role_codes = pd.Categorical(output_df['team_position'], categories=GLOBAL_ROLES).codes
+    z = (output_df['ai_score'].to_numpy(dtype=np.float64) - GLOBAL_MEAN[role_codes]) / GLOBAL_STD[role_codes]
+    output_df['ai_score_role_norm'] = np.round(z, 2)
+
+    # Texto Descritivo (por código do rank: S+/S, A, B, C; D/F ficam Neutro)
+    output_df['ai_rating_text'] = pd.Categorical.from_codes(
+        RATING_BY_RANK[output_df['ai_rank'].cat.codes], categories=RATING_TEXTS)
+
+    # 8. Atribuições top-k (mesmas features da predição, em lote; listas curtas por linha)
+    if top_k:
+        idx, vals, base = top_contributions(feature_contributions(scorer.model, X, exact=attr_cfg['exact']), top_k)
+        output_df['attr_features'] = idx.tolist()
+        output_df['attr_values'] = np.round(vals.astype(np.float64), 4).tolist()  # float64: sem ruído do float32 no texto do COPY
+        output_df['attr_base'] = np.round(base.astype(np.float64), 4)
+    else:
+        output_df['attr_features'] = output_df['attr_values'] = output_df['attr_base'] = None
+
+    # 9. Features do modelo para os histogramas de drift (fora de PRED_COLS: não vão para a tabela)
+    if monitor_config()['enabled']:
+        output_df[FEATURES_MODEL] = X
+
+    return output_df
+
+def write_chunk(engine, df_raw, output_df, key, pipeline=PREDICTIONS_PIPELINE):
+    """Predições + rollup do ranking + versão do cache + monitor + marca d'água: tudo ou nada, por bloco."""
+    monitor = monitor_config()['enabled']
+    if monitor:  # Bordas dos histogramas em transação própria (1x por versão)
+        edges = ensure_feature_edges(engine, output_df['model_version'].iloc[0], output_df) if len(output_df) else {}
+    with engine.begin() as conn:
+        written = write_predictions(conn, output_df)
+        # Rollup só com o que foi gravado: inseridas somam um jogo; reescritas só trocam o AI Score
+        inserted = written.loc[written['inserted'], ['match_id', 'puuid']]
+        ranking_input = output_df[['match_id', 'puuid', 'team_position', 'game_start_timestamp', 'ai_score']].merge(
+            inserted, on=['match_id', 'puuid']).merge(
+            df_raw[['match_id', 'puuid', 'summoner_name', 'win', 'gold_diff_at_15']], on=['match_id', 'puuid'], how='left')
+        rescored = written.loc[~written['inserted']].merge(output_df[['match_id', 'puuid', 'team_position']], on=['match_id', 'puuid'])
+        pairs = apply_rollup_delta(conn, merge_rollup_deltas(compute_rollup_delta(ranking_input), compute_rescore_delta(rescored)))
+        # Invalida ranking e o histórico de cada jogador gravado (predições novas/reescoradas), na mesma transação
+        if len(written): bump_versions(conn, [RANKING_SCOPE, *written['puuid'].unique()])
+        if monitor and len(written):
+            # Calibração/drift só das linhas gravadas, com o resultado da partida (depois do bump: gravadores em série)
+            monitored = output_df.merge(written[['match_id', 'puuid']], on=['match_id', 'puuid']).merge(
+                df_raw[['match_id', 'puuid', 'win']], on=['match_id', 'puuid'], how='left')
+            update_monitor(conn, monitored, edges)
+        advance_watermark(conn, pipeline, key, len(written))
+    return pairs
+
+def run_predictions(chunk_size=None):
+    engine = get_engine()
+    cfg = _predict_config()
+    chunk_size = int(chunk_size or cfg['chunk_size'])
     
-    output_df.to_sql(
-        'fact_match_predictions', 
-        engine, 
-        if_exists='append', 
-        index=False,
-        chunksize=1000 
-    )
-    print("✅ Pipeline concluído com sucesso.")
+    # 1. Carregar Bundle (versão CURRENT do registro; artefatos soltos se o registro estiver vazio)
+    try:
+        bundle = load_bundle()
+    except FileNotFoundError:
+        print("❌ Modelo não encontrado. Rode 'python main.py train' primeiro!")
+        return
+    scorer, model_version = ScoringBundle.from_bundle(bundle), bundle['version']
+    print(f"🔮 Iniciando Pipeline de Predição ({model_version})...")
+
+    # 2. Marca d'água: de onde parou até o limite seguro (fixo durante a rodada; ver safe_upper)
+    ensure_ranking_table(engine)
+    ensure_version_table(engine)
+    ensure_watermark_table(engine)
+    ensure_prediction_columns(engine)
+    if monitor_config()['enabled']: ensure_monitor_tables(engine)
+    with engine.connect() as conn:
+        watermark = read_watermark(conn, PREDICTIONS_PIPELINE)
+        upper = safe_upper(conn, cfg['watermark_lag_s'], cfg['watermark_stall_warn_s'])
+        backlog = conn.execute(text(BACKLOG_QUERY), {**_watermark_params(watermark), 'upper': upper}).scalar()
+    since = watermark['ingested_at'] if watermark else 'início'
+    print(f"   📥 Pendentes desde {since}: até {backlog} linhas (blocos de {chunk_size}).")
+    if not backlog:
+        print("   ✅ Todas as partidas já estão atualizadas (ou banco vazio). Nada a fazer.")
+        return
+
+    # 3. Blocos: Features -> Predição -> Score -> Gravação (com a marca avançando a cada bloco)
+    done, pairs, chunks, start = 0, 0, 0, time.perf_counter()
+    for df_raw in iter_pending_chunks(engine, watermark, upper, chunk_size):
+        output_df = score_predictions(df_raw, scorer, model_version)
+        last = df_raw.iloc[-1]
+        pairs += write_chunk(engine, df_raw, output_df, (last['ingested_at'], last['match_id'], last['puuid']))
+        done += len(output_df)
+        chunks += 1
+        elapsed = time.perf_counter() - start
+        print(f"   💾 Bloco {chunks}: {len(output_df)} linhas | {done}/{backlog} ({done / backlog:.0%}) | {done / elapsed:,.0f} linhas/s")
+
+    # 4. Alcançou o limite: a marca vai para `upper` (linhas puladas -- UNKNOWN/já previstas -- não são relidas).
+    #    Seguro porque `upper` não passa de nenhuma transação de ingestão em voo (safe_upper).
+    with engine.begin() as conn:
+        advance_watermark(conn, PREDICTIONS_PIPELINE, (upper, '', ''), 0)
+    elapsed = time.perf_counter() - start
+    print(f"   🏆 Ranking atualizado: {pairs} pares (jogador, role) em {chunks} bloco(s).")
+    print(f"✅ Pipeline concluído: {done} predições em {elapsed:.1f}s ({done / max(elapsed, 1e-9):,.0f} linhas/s).")
 
 if __name__ == "__main__":
     run_predictions()
\ No newline at end of file
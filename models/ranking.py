@@ -0,0 +1,215 @@
+import pandas as pd
+from sqlalchemy import text
+
+from database import get_engine
+from etl.versions import RANKING_SCOPE, ensure_version_table, bump_versions
+
+# Rollup do ranking por (puuid, role): contagens, somas e somas de quadrados acumuladas.
+# Mantido de forma incremental pelo run_predictions (mesma transação das predições), o que
+# transforma /ranking numa leitura indexada em vez de GROUP BY sobre a tabela fato inteira.
+
+RANKING_TABLE = 'agg_player_role_ranking'
+
+# Expressões SQL (reusadas na coluna gerada e nas leituras)
+WIN_RATE_SQL = "(wins::float8 / GREATEST(games, 1))"
+AI_SCORE_SQL = (f"(CASE WHEN scored_games > 0 AND sum_ai_score > 0 THEN sum_ai_score / scored_games "
+                f"ELSE LEAST(GREATEST(70 + {WIN_RATE_SQL} * 20, 0), 100) END)")
+RANKING_SCORE_SQL = f"({AI_SCORE_SQL} * 0.6 + {WIN_RATE_SQL} * 100 * 0.3 + LN(1 + games::float8) * 5)"
+VOLATILITY_SQL = ("(CASE WHEN gd15_n > 1 THEN SQRT(GREATEST((sum_gd15_sq - sum_gd15 * sum_gd15 / gd15_n) / (gd15_n - 1), 0)) END)")
+
+RANKING_DDL = f"""
+CREATE TABLE IF NOT EXISTS {RANKING_TABLE} (
+    puuid VARCHAR(100) NOT NULL,
+    team_position VARCHAR(20) NOT NULL,
+    summoner_name VARCHAR(100),
+    summoner_name_lower VARCHAR(100) GENERATED ALWAYS AS (LOWER(summoner_name)) STORED,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    scored_games INTEGER NOT NULL DEFAULT 0,
+    sum_ai_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    gd15_n INTEGER NOT NULL DEFAULT 0,
+    sum_gd15 DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_gd15_sq DOUBLE PRECISION NOT NULL DEFAULT 0,
+    last_game_ts BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ranking_score DOUBLE PRECISION GENERATED ALWAYS AS {RANKING_SCORE_SQL} STORED,
+    CONSTRAINT pk_ranking PRIMARY KEY (puuid, team_position)
+);
+CREATE INDEX IF NOT EXISTS idx_ranking_games ON {RANKING_TABLE}(games DESC);
+CREATE INDEX IF NOT EXISTS idx_ranking_role_games ON {RANKING_TABLE}(team_position, games DESC);
+CREATE INDEX IF NOT EXISTS idx_ranking_name ON {RANKING_TABLE}(summoner_name_lower);
+"""
+
+ROLLUP_COLS = ['puuid', 'team_position', 'summoner_name', 'games', 'wins', 'scored_games', 'sum_ai_score',
+               'gd15_n', 'sum_gd15', 'sum_gd15_sq', 'last_game_ts']
+
+_table_ready = False
+
+def ensure_ranking_table(engine=None):
+    """Cria o rollup na 1ª utilização; se acabou de ser criado, popula com o histórico já previsto."""
+    global _table_ready
+    if _table_ready: return
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass(:t)"), {"t": RANKING_TABLE}).scalar() is not None
+        conn.execute(text(RANKING_DDL))
+    if not exists: rebuild_ranking_rollup(engine)
+    _table_ready = True
+
+# ==============================================================================
+# 1. MANUTENÇÃO (incremental + reconstrução completa)
+# ==============================================================================
+def compute_rollup_delta(df):
+    """
+    Agrega um lote de predições novas em deltas por (puuid, role).
+    `df` precisa de: puuid, team_position, summoner_name, win, ai_score, gold_diff_at_15, game_start_timestamp.
+    """
+    if df.empty: return pd.DataFrame(columns=ROLLUP_COLS)
+    df = df.sort_values('game_start_timestamp')
+    gd15 = pd.to_numeric(df['gold_diff_at_15'], errors='coerce')
+    work = pd.DataFrame({
+        'puuid': df['puuid'], 'team_position': df['team_position'], 'summoner_name': df['summoner_name'],
+        'games': 1, 'wins': df['win'].fillna(False).astype(bool).astype(int),
+        'scored_games': df['ai_score'].notna().astype(int), 'sum_ai_score': df['ai_score'].fillna(0).astype(float),
+        'gd15_n': gd15.notna().astype(int), 'sum_gd15': gd15.fillna(0), 'sum_gd15_sq': gd15.fillna(0) ** 2,
+        'last_game_ts': df['game_start_timestamp'],
+    })
+    delta = work.groupby(['puuid', 'team_position'], sort=False).agg({
+        'summoner_name': 'last', 'games': 'sum', 'wins': 'sum', 'scored_games': 'sum', 'sum_ai_score': 'sum',
+        'gd15_n': 'sum', 'sum_gd15': 'sum', 'sum_gd15_sq': 'sum', 'last_game_ts': 'max',
+    }).reset_index()
+    return delta[ROLLUP_COLS]
+
+def compute_rescore_delta(df):
+    """
+    Deltas de predições já contadas que trocaram de versão do modelo: só o AI Score muda.
+    `df` precisa de: puuid, team_position, ai_score, old_ai_score. Jogos/vitórias/gd15 ficam em 0 e
+    nome/último jogo em NULL (o upsert mantém os atuais).
+    """
+    if df.empty: return pd.DataFrame(columns=ROLLUP_COLS)
+    work = pd.DataFrame({
+        'puuid': df['puuid'], 'team_position': df['team_position'],
+        'scored_games': df['ai_score'].notna().astype(int) - df['old_ai_score'].notna().astype(int),
+        'sum_ai_score': df['ai_score'].fillna(0).astype(float) - df['old_ai_score'].fillna(0).astype(float),
+    })
+    delta = work.groupby(['puuid', 'team_position'], sort=False).sum().reset_index()
+    for col in ['games', 'wins', 'gd15_n']: delta[col] = 0
+    for col in ['sum_gd15', 'sum_gd15_sq']: delta[col] = 0.0
+    delta['summoner_name'], delta['last_game_ts'] = None, None
+    return delta[ROLLUP_COLS]
+
+def merge_rollup_deltas(*deltas):
+    """Junta deltas (ex.: inseridas + reescritas) numa linha por (puuid, role), para um único upsert."""
+    deltas = [d for d in deltas if not d.empty]
+    if not deltas: return pd.DataFrame(columns=ROLLUP_COLS)
+    if len(deltas) == 1: return deltas[0]
+    sums = {c: 'sum' for c in ROLLUP_COLS if c not in ('puuid', 'team_position', 'summoner_name', 'last_game_ts')}
+    merged = pd.concat(deltas, ignore_index=True).groupby(['puuid', 'team_position'], sort=False).agg(
+        {'summoner_name': 'last', 'last_game_ts': 'max', **sums}).reset_index()
+    merged['last_game_ts'] = merged['last_game_ts'].astype('Int64')  # NULL das reescritas virou NaN no concat
+    return merged[ROLLUP_COLS]
+
+def apply_rollup_delta(conn, delta):
+    """Soma os deltas no rollup (upsert). Rode na MESMA transação que grava as predições."""
+    if delta.empty: return 0
+    # Ordem fixa das chaves: gravadores em paralelo (rescore) travam as linhas na mesma ordem, sem deadlock
+    delta = delta.sort_values(['puuid', 'team_position'])
+    stmt = text(f"""
+        INSERT INTO {RANKING_TABLE} ({', '.join(ROLLUP_COLS)})
+        VALUES ({', '.join(':' + c for c in ROLLUP_COLS)})
+        ON CONFLICT (puuid, team_position) DO UPDATE SET
+            games = {RANKING_TABLE}.games + EXCLUDED.games,
+            wins = {RANKING_TABLE}.wins + EXCLUDED.wins,
+            scored_games = {RANKING_TABLE}.scored_games + EXCLUDED.scored_games,
+            sum_ai_score = {RANKING_TABLE}.sum_ai_score + EXCLUDED.sum_ai_score,
+            gd15_n = {RANKING_TABLE}.gd15_n + EXCLUDED.gd15_n,
+            sum_gd15 = {RANKING_TABLE}.sum_gd15 + EXCLUDED.sum_gd15,
+            sum_gd15_sq = {RANKING_TABLE}.sum_gd15_sq + EXCLUDED.sum_gd15_sq,
+            summoner_name = CASE WHEN EXCLUDED.last_game_ts >= COALESCE({RANKING_TABLE}.last_game_ts, 0)
+                                 THEN EXCLUDED.summoner_name ELSE {RANKING_TABLE}.summoner_name END,
+            last_game_ts = GREATEST({RANKING_TABLE}.last_game_ts, EXCLUDED.last_game_ts),
+            updated_at = CURRENT_TIMESTAMP
+    """)
+    records = delta.astype(object).where(delta.notna(), None).to_dict('records')
+    conn.execute(stmt, records)
+    return len(records)
+
+def rebuild_ranking_rollup(engine=None):
+    """Recalcula o rollup inteiro a partir de performance + predições (backfill / correção)."""
+    engine = engine or get_engine()
+    ensure_version_table(engine)
+    print(f"🧮 Reconstruindo '{RANKING_TABLE}' a partir das predições...")
+    with engine.begin() as conn:
+        conn.execute(text(RANKING_DDL))
+        conn.execute(text(f"TRUNCATE {RANKING_TABLE}"))
+        result = conn.execute(text(f"""
+            INSERT INTO {RANKING_TABLE} ({', '.join(ROLLUP_COLS)})
+            SELECT p.puuid, p.team_position,
+                   (ARRAY_AGG(p.summoner_name ORDER BY p.game_start_timestamp DESC))[1],
+                   COUNT(*), SUM(CASE WHEN p.win THEN 1 ELSE 0 END),
+                   COUNT(pred.ai_score), COALESCE(SUM(pred.ai_score), 0),
+                   COUNT(p.gold_diff_at_15), COALESCE(SUM(p.gold_diff_at_15::float8), 0),
+                   COALESCE(SUM(p.gold_diff_at_15::float8 * p.gold_diff_at_15::float8), 0),
+                   MAX(p.game_start_timestamp)
+            FROM fact_match_player_performance p
+            JOIN fact_match_predictions pred ON p.match_id = pred.match_id AND p.puuid = pred.puuid
+            GROUP BY p.puuid, p.team_position
+        """))
+        bump_versions(conn, [RANKING_SCOPE])
+    print(f"✅ {result.rowcount} linhas (jogador, role) no rollup.")
+    return result.rowcount
+
+# ==============================================================================
+# 2. LEITURA (top-N indexado, linhas leves)
+# ==============================================================================
+def _ranking_select(where, order_limit):
+    return f"""
+        SELECT summoner_name, team_position AS main_role, games, {WIN_RATE_SQL} AS win_rate,
+               {AI_SCORE_SQL} AS avg_ai_score, {VOLATILITY_SQL} AS volatility_proxy, ranking_score
+        FROM {RANKING_TABLE} {where} {order_limit}
+    """
+
+def read_ranking(conn, role=None, candidates=200, limit=50):
+    """
+    Mesmo critério do ranking original: os `candidates` jogadores com mais jogos,
+    reordenados por ranking_score. O corte por jogos usa o índice; a reordenação só
+    toca os candidatos. Devolve linhas (mappings), sem DataFrame.
+    """
+    where = "WHERE team_position = :role" if role else ""
+    query = f"""
+        SELECT * FROM ({_ranking_select(where, 'ORDER BY games DESC LIMIT :candidates')}) top_games
+        ORDER BY ranking_score DESC LIMIT :limit
+    """
+    params = {"candidates": candidates, "limit": limit}
+    if role: params["role"] = role.upper()
+    return conn.execute(text(query), params).mappings().all()
+
+def read_friends_ranking(conn, puuids=None, names=None):
+    """Por puuid (resolvidos no dim_player) ou, se o diretório ainda estiver vazio, pelo nome."""
+    if puuids:
+        query = _ranking_select("WHERE puuid = ANY(:puuids)", "ORDER BY ranking_score DESC")
+        return conn.execute(text(query), {"puuids": list(puuids)}).mappings().all()
+    query = _ranking_select("WHERE summoner_name_lower = ANY(:names)", "ORDER BY ranking_score DESC")
+    return conn.execute(text(query), {"names": [n.lower().strip() for n in names or []]}).mappings().all()
+
+def format_ranking(rows, region):
+    """Rótulos e arredondamentos do ranking direto sobre as linhas (no máximo algumas dezenas)."""
+    out = []
+    for rank, r in enumerate(rows, start=1):
+        wr = float(r['win_rate'])
+        games = int(r['games'])
+        volatility = float(r['volatility_proxy']) if r['volatility_proxy'] is not None else 1000.0
+        out.append({
+            'rank': rank,
+            'summoner_name': r['summoner_name'],
+            'region': region,
+            'main_role': r['main_role'],
+            'consistency_label': "🔒 Alta" if volatility < 800 else "⚖️ Média" if volatility < 1500 else "🎲 Volátil",
+            'reliability_label': "🟢 Verificado" if games >= 50 else "🟡 Moderado" if games >= 20 else "🔴 Amostra Baixa",
+            'trend': "📈 Subindo" if wr >= 0.65 else "📉 Caindo" if wr <= 0.45 else "➖ Estável",
+            'games_played': games,
+            'win_rate': wr,
+            'avg_ai_score': round(float(r['avg_ai_score']), 1),
+            'ranking_score': round(float(r['ranking_score']), 1),
+        })
+    return out
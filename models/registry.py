@@ -0,0 +1,306 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+import joblib
+
+from config import settings, MODEL_FILENAME
+from models.native_artifacts import NATIVE_FILES, save_native, load_native
+
+# Registro versionado de modelos: cada versão é um diretório imutável com os artefatos
+# do coach/predictor + manifest.json (checksums e metadados do treino). Ponteiros CURRENT
+# e SHADOW (arquivos de texto, trocados com os.replace) dizem o que está em produção e o
+# que roda em sombra. A API observa os ponteiros e troca o bundle sem reiniciar.
+#
+#   models/registry/
+#     v001/ model.pkl  archetypes.joblib  calibration.joblib  manifest.json
+#           model.ubj  archetypes.npz     calibration.npz     (formatos nativos, carga rápida)
+#     CURRENT   -> "v001"
+#     SHADOW    -> "v002" (opcional)
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DEFAULTS = {
+    'dir': 'models/registry',
+    'poll_s': 10,           # Intervalo do watcher da API
+    'native': True,         # Carrega UBJSON/.npz quando a versão tiver (sem unpickle nem sklearn)
+}
+LEGACY_VERSION = 'v8.0'     # Nome usado quando o registro ainda está vazio (artefatos soltos)
+POINTERS = ('CURRENT', 'SHADOW')
+
+# Papel -> (arquivo de trabalho gravado pelo treino, nome dentro do bundle)
+BUNDLE_FILES = {
+    'model': (MODEL_FILENAME, 'model.pkl'),
+    'archetypes': ('models/artifacts/archetypes_v10.joblib', 'archetypes.joblib'),
+    'calibration': ('models/artifacts/calibration_heads_v10.joblib', 'calibration.joblib'),
+}
+TRAINING_REPORT_FILE = 'models/artifacts/training_report.json'
+
+def _registry_config():
+    cfg = dict(REGISTRY_DEFAULTS)
+    cfg.update(settings['model'].get('registry') or {})
+    return cfg
+
+def registry_dir():
+    return _registry_config()['dir']
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def artifacts_fingerprint(paths):
+    """Hash curto do conteúdo dos artefatos: muda a cada retreino, mesmo sem mudar o nome do arquivo."""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:10]
+
+# ==============================================================================
+# 1. PONTEIROS E MANIFESTOS
+# ==============================================================================
+def _write_atomic(path, content):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+def get_pointer(name):
+    try:
+        with open(os.path.join(registry_dir(), name), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def set_pointer(name, version):
+    """Aponta CURRENT/SHADOW para uma versão existente (None remove o ponteiro)."""
+    path = os.path.join(registry_dir(), name)
+    if version is None:
+        if os.path.exists(path): os.remove(path)
+        return
+    if version not in list_versions():
+        raise ValueError(f"Versão '{version}' não existe no registro ({registry_dir()}).")
+    _write_atomic(path, version + '\n')
+
+def list_versions():
+    base = registry_dir()
+    if not os.path.isdir(base): return []
+    found = [d for d in os.listdir(base) if re.fullmatch(r'v\d+', d) and os.path.isfile(os.path.join(base, d, 'manifest.json'))]
+    return sorted(found, key=lambda v: int(v[1:]))
+
+def read_manifest(version):
+    with open(os.path.join(registry_dir(), version, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+def verify_bundle(version):
+    """Confere os checksums do manifest; ValueError se algum arquivo foi alterado/corrompido."""
+    manifest = read_manifest(version)
+    for role, info in [*manifest['files'].items(), *manifest.get('native', {}).items()]:
+        path = os.path.join(registry_dir(), version, info['file'])
+        if file_sha256(path) != info['sha256']:
+            raise ValueError(f"Checksum inválido em {version}/{info['file']} ({role}).")
+    return manifest
+
+# ==============================================================================
+# 2. PUBLICAÇÃO
+# ==============================================================================
+def _next_version():
+    versions = list_versions()
+    return f"v{int(versions[-1][1:]) + 1 if versions else 1:03d}"
+
+def _training_metadata(model_sha256):
+    """Relatório do último treino (gravado pelo trainer), marcando se é deste modelo."""
+    try:
+        with open(TRAINING_REPORT_FILE, encoding='utf-8') as f:
+            report = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    report['matches_model'] = report.get('model_sha256') == model_sha256
+    return report
+
+def publish_bundle(note=None, promote=False, shadow=False):
+    """
+    Copia os artefatos de trabalho atuais para uma nova versão imutável do registro.
+    O diretório é montado num temporário e renomeado no fim: leitores nunca veem versão pela metade.
+    """
+    missing = [path for path, _ in BUNDLE_FILES.values() if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Artefatos ausentes (rode train/clustering/stacking): {missing}")
+
+    base = registry_dir()
+    os.makedirs(base, exist_ok=True)
+    version = _next_version()
+    tmp_dir = os.path.join(base, f".tmp-{version}-{os.getpid()}")
+    os.makedirs(tmp_dir)
+    files, native = {}, {}
+    for role, (src, name) in BUNDLE_FILES.items():
+        dst = os.path.join(tmp_dir, name)
+        shutil.copy2(src, dst)
+        files[role] = {'file': name, 'sha256': file_sha256(dst), 'bytes': os.path.getsize(dst), 'source': src}
+        native_dst = os.path.join(tmp_dir, NATIVE_FILES[role])
+        save_native(role, joblib.load(dst), native_dst)
+        native[role] = {'file': NATIVE_FILES[role], 'sha256': file_sha256(native_dst), 'bytes': os.path.getsize(native_dst)}
+
+    manifest = {
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'fingerprint': artifacts_fingerprint([os.path.join(tmp_dir, files[r]['file']) for r in BUNDLE_FILES]),
+        'files': files,
+        'native': native,
+        'training': _training_metadata(files['model']['sha256']),
+        'note': note,
+    }
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.rename(tmp_dir, os.path.join(base, version))
+    print(f"📦 Versão {version} publicada em {base} (fingerprint {manifest['fingerprint']}).")
+
+    if promote: promote_version(version)
+    elif shadow: set_shadow(version)
+    return version
+
+def promote_version(version=None):
+    """CURRENT -> `version` (sem argumento, promove a versão que está em SHADOW)."""
+    version = version or get_pointer('SHADOW')
+    if not version: raise ValueError("Nenhuma versão informada e nenhuma em SHADOW.")
+    verify_bundle(version)
+    previous = get_pointer('CURRENT')
+    set_pointer('CURRENT', version)
+    if get_pointer('SHADOW') == version: set_pointer('SHADOW', None)
+    print(f"🚀 CURRENT: {previous or LEGACY_VERSION} -> {version}")
+    return version
+
+def set_shadow(version=None):
+    if version: verify_bundle(version)
+    set_pointer('SHADOW', version)
+    print(f"👥 SHADOW: {version or '(desligado)'}")
+
+def print_registry():
+    current, shadow = get_pointer('CURRENT'), get_pointer('SHADOW')
+    versions = list_versions()
+    print(f"🗂️ Registro: {registry_dir()} ({len(versions)} versões)")
+    if not current: print(f"   (sem CURRENT: a API usa os artefatos soltos como '{LEGACY_VERSION}')")
+    for v in versions:
+        m = read_manifest(v)
+        tag = ' <- CURRENT' if v == current else ' <- SHADOW' if v == shadow else ''
+        metrics = {k: m['training'][k] for k in ('accuracy', 'brier') if k in m.get('training', {})}
+        print(f"   {v}  {m['created_at']}  {m['fingerprint']}  {metrics or ''} {m.get('note') or ''}{tag}")
+
+# ==============================================================================
+# 3. CARGA (API / predictor)
+# ==============================================================================
+def load_bundle(version=None, parts=None):
+    """
+    Carrega os artefatos de uma versão (checksums conferidos antes do joblib.load).
+    Sem versão: usa CURRENT; se o registro estiver vazio, os arquivos de trabalho (legado).
+    Com `native` (padrão), papéis com arquivo UBJSON/.npz no manifest não passam pelo pickle.
+    Retorna {'version', 'fingerprint', 'manifest', 'formats', <papel>: objeto, ...}.
+    """
+    parts = list(parts or BUNDLE_FILES)
+    version = version or get_pointer('CURRENT')
+    native = {}
+    if version is None:
+        paths = {role: BUNDLE_FILES[role][0] for role in BUNDLE_FILES}
+        bundle = {'version': LEGACY_VERSION, 'manifest': None,
+                  'fingerprint': artifacts_fingerprint(list(paths.values()))}
+    else:
+        manifest = verify_bundle(version)
+        version_dir = os.path.join(registry_dir(), version)
+        paths = {role: os.path.join(version_dir, info['file']) for role, info in manifest['files'].items()}
+        if _registry_config()['native']:
+            native = {role: os.path.join(version_dir, info['file']) for role, info in manifest.get('native', {}).items()}
+        bundle = {'version': version, 'manifest': manifest, 'fingerprint': manifest['fingerprint']}
+    bundle['formats'] = {}
+    for role in parts:
+        if role in native:
+            bundle[role], bundle['formats'][role] = load_native(role, native[role]), 'native'
+        else:
+            bundle[role], bundle['formats'][role] = joblib.load(paths[role]), 'pickle'
+    return bundle
+
+class RegistryWatcher:
+    """
+    Thread que relê os ponteiros a cada `poll_s` e chama on_change(ponteiro, versão) quando
+    mudam. A carga acontece nessa thread; quem chama só troca a referência no fim.
+    """
+    def __init__(self, on_change, poll_s=None):
+        self.on_change = on_change
+        self.poll_s = poll_s or _registry_config()['poll_s']
+        self.seen = {name: get_pointer(name) for name in POINTERS}
+        self.last_check = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='registry-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        for name in POINTERS:
+            version = get_pointer(name)
+            if version == self.seen[name]: continue
+            # Marca como visto mesmo se falhar: uma versão quebrada não é recarregada em loop
+            self.seen[name] = version
+            try:
+                self.on_change(name, version)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{name}={version}: {e}"
+                logger.error(f"❌ Falha ao carregar {name}={version}: {e}")
+        self.last_check = time.time()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_s):
+            self.check()
+
+# ==============================================================================
+# 4. SHADOW SCORING (comparação com a versão em produção)
+# ==============================================================================
+class ShadowStats:
+    """Acumula a diferença entre as análises da versão SHADOW e as servidas (CURRENT)."""
+    def __init__(self, version):
+        self.version = version
+        self.requests = self.matches = self.skipped = self.errors = 0
+        self.sum_abs_score = self.sum_abs_win_prob = 0.0
+        self.same_archetype = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def record(self, primary, shadow):
+        common = [k for k in primary if k in shadow]
+        with self._lock:
+            self.requests += 1
+            for k in common:
+                self.matches += 1
+                self.sum_abs_score += abs(primary[k]['score'] - shadow[k]['score'])
+                self.sum_abs_win_prob += abs(primary[k].get('ai_prediction', 50) - shadow[k].get('ai_prediction', 50))
+                self.same_archetype += primary[k]['archetype_label'] == shadow[k]['archetype_label']
+
+    def fail(self, error):
+        with self._lock:
+            self.errors += 1
+            self.last_error = str(error)
+
+    def summary(self):
+        n = max(self.matches, 1)
+        return {
+            'version': self.version, 'requests': self.requests, 'matches': self.matches,
+            'skipped': self.skipped, 'errors': self.errors, 'last_error': self.last_error,
+            'mean_abs_score_diff': round(self.sum_abs_score / n, 2),
+            'mean_abs_win_prob_diff': round(self.sum_abs_win_prob / n, 2),
+            'archetype_agreement': round(self.same_archetype / n, 4) if self.matches else None,
+        }
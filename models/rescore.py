@@ -0,0 +1,131 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+from sqlalchemy import text
+
+from config import settings
+from database import get_engine
+from models.predictor import score_predictions, write_chunk, pending_query, iter_pending_chunks, ensure_prediction_columns, _predict_config
+from models.ranking import ensure_ranking_table
+from models.registry import LEGACY_VERSION, get_pointer, load_bundle
+from models.scoring import ScoringBundle
+from models.monitoring import monitor_config, ensure_monitor_tables
+from etl.versions import ensure_version_table
+from etl.watermarks import WATERMARK_TABLE, ensure_watermark_table, read_watermark, advance_watermark, safe_upper
+from profiling import Timer
+
+# Re-scoring do histórico inteiro com uma versão do modelo, em paralelo:
+#   - shards por hash do match_id (partidas inteiras no mesmo shard; shards disjuntos entre processos);
+#   - cada processo carrega o bundle 1x e grava pela própria conexão (COPY + merge idempotente);
+#   - checkpoint por shard em etl_watermark ('rescore:<versão>:<shard>/<total>'), avançado na mesma
+#     transação de cada bloco: interrompeu, roda de novo e cada shard continua de onde parou.
+# Linhas que já estão na versão alvo são puladas na leitura (o run_predictions pode ter gravado).
+
+RESCORE_DEFAULTS = {'shards_per_worker': 4, 'chunk_size': 20000, 'progress_s': 5}
+
+VERSION_FILTER = """AND NOT EXISTS (SELECT 1 FROM fact_match_predictions pred
+                      WHERE pred.match_id = p.match_id AND pred.puuid = p.puuid
+                        AND pred.model_version = :model_version)"""
+SHARD_FILTER = "AND mod(hashtext(p.match_id)::bigint + 2147483648, :n_shards) = :shard"
+RESCORE_QUERY = pending_query(f"{SHARD_FILTER}\n      {VERSION_FILTER}")
+
+def _rescore_config():
+    return {**RESCORE_DEFAULTS, **(settings['model'].get('rescore') or {})}
+
+def shard_pipeline(version, shard, n_shards):
+    return f"rescore:{version}:{shard}/{n_shards}"
+
+# ==============================================================================
+# 1. WORKER (um processo por vez em cada shard)
+# ==============================================================================
+_worker = {}
+
+def _init_rescore_worker(version, nthread):
+    import database
+    if database._engine is not None: database._engine.dispose(close=False)  # Conexões nunca atravessam o fork
+    bundle = load_bundle(version)
+    bundle['model'].set_params(n_jobs=nthread)
+    _worker.update(scorer=ScoringBundle.from_bundle(bundle), version=bundle['version'], engine=get_engine())
+
+def _rescore_shard(shard, n_shards, upper, chunk_size):
+    engine, scorer, version = _worker['engine'], _worker['scorer'], _worker['version']
+    pipeline = shard_pipeline(version, shard, n_shards)
+    with engine.connect() as conn:
+        watermark = read_watermark(conn, pipeline)
+    rows = 0
+    with Timer() as t:
+        params = {'n_shards': n_shards, 'shard': shard, 'model_version': version}
+        for df_raw in iter_pending_chunks(engine, watermark, upper, chunk_size, RESCORE_QUERY, params):
+            output_df = score_predictions(df_raw, scorer, version)
+            last = df_raw.iloc[-1]
+            write_chunk(engine, df_raw, output_df, (last['ingested_at'], last['match_id'], last['puuid']), pipeline)
+            rows += len(output_df)
+        # Shard no limite: a marca vai para `upper`, nunca para trás (uma rodada anterior pode ter
+        # marcado um limite maior que o desta; recuar faria a próxima reler o intervalo inteiro)
+        if watermark is None or watermark['ingested_at'] is None or upper > watermark['ingested_at']:
+            with engine.begin() as conn:
+                advance_watermark(conn, pipeline, (upper, '', ''), 0)
+    return shard, rows, t.seconds
+
+# ==============================================================================
+# 2. ORQUESTRAÇÃO
+# ==============================================================================
+def _shard_totals(engine, version, n_shards):
+    """rows_total somado dos checkpoints dos shards (progresso agregado, lido do banco)."""
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT COALESCE(SUM(rows_total), 0) FROM {WATERMARK_TABLE} WHERE pipeline LIKE :prefix"),
+                            {"prefix": f"rescore:{version}:%/{n_shards}"}).scalar()
+
+def run_rescore(workers=None, shards=None, thread_budget=None, chunk_size=None, version=None, fresh=False):
+    """
+    Recalcula as predições de todo o histórico com `version` (padrão: CURRENT do registro)
+    em `workers` processos. Retomável: shards concluídos ou parciais não refazem o que já gravaram.
+    """
+    cfg = _rescore_config()
+    total_threads = thread_budget or os.cpu_count()
+    workers = max(1, min(workers or total_threads, total_threads))
+    nthread = max(1, total_threads // workers)
+    n_shards = int(shards or workers * cfg['shards_per_worker'])
+    chunk_size = int(chunk_size or cfg['chunk_size'])
+    bundle_version = version or get_pointer('CURRENT')  # Fixa a versão: o CURRENT pode mudar durante a rodada
+    target = bundle_version or LEGACY_VERSION
+    print(f"♻️ Re-scoring do histórico com {target}: {n_shards} shards | {workers} processos x {nthread} threads | blocos de {chunk_size}")
+
+    engine = get_engine()
+    ensure_ranking_table(engine)
+    ensure_version_table(engine)
+    ensure_watermark_table(engine)
+    ensure_prediction_columns(engine)
+    if monitor_config()['enabled']: ensure_monitor_tables(engine)
+    with engine.begin() as conn:
+        if fresh:
+            conn.execute(text(f"DELETE FROM {WATERMARK_TABLE} WHERE pipeline LIKE :prefix"), {"prefix": f"rescore:{target}:%"})
+        pred_cfg = _predict_config()
+        upper = safe_upper(conn, pred_cfg['watermark_lag_s'], pred_cfg['watermark_stall_warn_s'])  # Nada em voo abaixo dele: os shards podem marcá-lo
+        pending = conn.execute(text(f"""
+            SELECT COUNT(*) FROM fact_match_player_performance p
+            WHERE p.ingested_at < :upper AND p.team_position != 'UNKNOWN' {VERSION_FILTER}
+        """), {'upper': upper, 'model_version': target}).scalar()
+    print(f"   📥 {pending:,} linhas fora da versão {target}.")
+    if not pending:
+        print("   ✅ Histórico já está na versão alvo. Nada a fazer.")
+        return
+
+    base = _shard_totals(engine, target, n_shards)
+    results = []
+    with Timer() as t:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_rescore_worker,
+                                 initargs=(bundle_version, nthread)) as pool:
+            futures = {pool.submit(_rescore_shard, s, n_shards, upper, chunk_size) for s in range(n_shards)}
+            while futures:
+                done, futures = wait(futures, timeout=cfg['progress_s'], return_when=FIRST_EXCEPTION)
+                results += [f.result() for f in done]
+                rows = _shard_totals(engine, target, n_shards) - base
+                elapsed = max(time.perf_counter() - t.start, 1e-9)
+                print(f"   ⏳ {len(results)}/{n_shards} shards | {rows:,}/{pending:,} linhas ({rows / pending:.0%}) | {rows / elapsed:,.0f} linhas/s")
+
+    rows = sum(r for _, r, _ in results)
+    print(f"✅ Re-scoring concluído: {rows:,} linhas em {t.seconds:.1f}s ({rows / max(t.seconds, 1e-9):,.0f} linhas/s agregadas).")
+    slowest = max(results, key=lambda r: r[2])
+    print(f"   🐢 Shard mais lento: {slowest[0]} ({slowest[1]:,} linhas em {slowest[2]:.1f}s)")
+    return {'version': target, 'rows': rows, 'seconds': t.seconds, 'shards': n_shards, 'workers': workers}
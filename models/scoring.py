@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from config import FEATURES_MODEL
+from features.engine import prepare_data_for_ml
+
+# Pipeline de pontuação fundido (um artefato, uma chamada por lote):
+#   features -> XGBoost (prob. bruta) -> arquétipo -> cabeça logística do arquétipo (prob. calibrada)
+# Na construção o scaler + PCA viram uma única transformação afim (W, b) e as cabeças de calibração
+# viram uma matriz de coeficientes (K x 4) + interceptos: o lote inteiro passa por 3 produtos de
+# matrizes, sem laço por arquétipo. Funciona com os objetos do sklearn e com os nativos (.npz).
+# Coach, predictor, rescore e os scripts de avaliação usam este módulo: a prob. calibrada é a
+# mesma em todo lugar (antes existia só no treino do stacking).
+
+STYLE_FEATURES = ['dpm', 'damage_self_mitigated', 'vision_score', 'gold_earned', 'total_minions_killed',
+                  'damage_to_objectives', 'time_ccing_others']
+CALIBRATION_FEATURES = ['xgb_prob', 'pressure_absorption_rel', 'passivity_index', 'resilience_rel']
+
+def _affine_archetypes(pipe):
+    """scaler -> PCA (com ou sem whiten) como z = x @ W + b."""
+    scaler, pca = pipe['scaler'], pipe['pca']
+    mean = scaler.mean_ if getattr(scaler, 'with_mean', True) and scaler.mean_ is not None else 0.0
+    scale = scaler.scale_ if getattr(scaler, 'with_std', True) and scaler.scale_ is not None else 1.0
+    components = np.asarray(pca.components_, dtype=np.float64)
+    W = (components / scale).T
+    b = -(np.asarray(mean) / scale) @ components.T - np.asarray(pca.mean_) @ components.T
+    # NumpyPCA só guarda a variância quando houve whiten; o PCA do sklearn diz pelo atributo
+    variance = pca.explained_variance_ if getattr(pca, 'whiten', True) else None
+    if variance is not None:
+        W, b = W / np.sqrt(variance), b / np.sqrt(variance)
+    return W, b
+
+def _stack_heads(calibration, n_clusters):
+    """Cabeças {arquétipo: LogisticRegression binária} -> coef (K x F) e intercepto (K); NaN = sem cabeça."""
+    coef = np.full((n_clusters, len(CALIBRATION_FEATURES)), np.nan)
+    intercept = np.full(n_clusters, np.nan)
+    for arch_id, head in (calibration or {}).items():
+        if 0 <= int(arch_id) < n_clusters:
+            coef[int(arch_id)] = np.asarray(head.coef_).ravel()
+            intercept[int(arch_id)] = np.asarray(head.intercept_).ravel()[0]
+    return coef, intercept
+
+class ScoringBundle:
+    def __init__(self, model, archetypes=None, calibration=None, version=None):
+        self.model, self.archetypes, self.calibration, self.version = model, archetypes, calibration, version
+        self.labels = (archetypes or {}).get('labels', {})
+        if archetypes is not None:
+            self._W, self._b = _affine_archetypes(archetypes)
+            self._centers = np.asarray(archetypes['kmeans'].cluster_centers_, dtype=np.float64)
+            self._centers_sq = (self._centers ** 2).sum(axis=1)
+            self._coef, self._intercept = _stack_heads(calibration, len(self._centers))
+        else:
+            self._centers = None
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        """A partir de models.registry.load_bundle (papéis ausentes = etapa desligada)."""
+        return cls(bundle['model'], bundle.get('archetypes'), bundle.get('calibration'), bundle.get('version'))
+
+    @classmethod
+    def wrap(cls, scorer):
+        """Aceita um ScoringBundle ou só o modelo base (sem arquétipo/calibração)."""
+        return scorer if isinstance(scorer, cls) else cls(scorer)
+
+    @property
+    def calibrated(self):
+        return self._centers is not None and not np.isnan(self._intercept).all()
+
+    def assign_archetypes(self, df_processed):
+        """ID do K-Means (antes das regras por role do coach); -1 sem artefato de arquétipos."""
+        if self._centers is None: return np.full(len(df_processed), -1, dtype=np.int32)
+        X = df_processed.reindex(columns=STYLE_FEATURES).fillna(0).to_numpy(dtype=np.float64)
+        Z = X @ self._W + self._b
+        # ||z - c||² = ||z||² - 2z·c + ||c||² (o termo ||z||² não muda o argmin)
+        return (self._centers_sq - 2 * Z @ self._centers.T).argmin(axis=1).astype(np.int32)
+
+    def predict(self, df_processed):
+        """
+        Lote já processado (prepare_data_for_ml) -> DataFrame alinhado ao índice com
+        win_probability (XGBoost), archetype_id e win_probability_calibrated
+        (arquétipo sem cabeça -> a probabilidade bruta).
+        """
+        probs = self.model.predict_proba(df_processed[FEATURES_MODEL])[:, 1]
+        arch = self.assign_archetypes(df_processed)
+        calibrated = probs.astype(np.float64)
+        if self.calibrated:
+            X_cal = df_processed.reindex(columns=CALIBRATION_FEATURES[1:]).fillna(0).to_numpy(dtype=np.float64)
+            X_cal = np.column_stack([probs, X_cal])
+            coef, intercept = self._coef[arch], self._intercept[arch]
+            logits = np.einsum('ij,ij->i', X_cal, coef) + intercept
+            has_head = ~np.isnan(intercept)
+            calibrated = np.where(has_head, 1 / (1 + np.exp(-np.where(has_head, logits, 0))), calibrated)
+        return pd.DataFrame({'win_probability': probs, 'archetype_id': arch,
+                             'win_probability_calibrated': calibrated}, index=df_processed.index)
+
+    def score(self, df_raw, partition_col=None):
+        """Linhas brutas -> (df_processed, predict(df_processed)) numa chamada."""
+        df_processed = prepare_data_for_ml(df_raw, partition_col=partition_col)
+        return df_processed, self.predict(df_processed)
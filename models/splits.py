@@ -0,0 +1,76 @@
+import numpy as np
+
+# Cortes temporais compartilhados por treino, tuning e validação.
+# Todos assumem linhas JÁ ORDENADAS por game_start_timestamp (como em train_model).
+
+def temporal_holdout_index(n_rows, test_size=0.2):
+    """Índice do corte treino/teste do train_model: os `test_size` finais são o futuro."""
+    return int(n_rows * (1 - test_size))
+
+def _align_to_timestamp(timestamps, idx):
+    """Move o corte para o início do timestamp, para a mesma partida não cair dos dois lados."""
+    if idx <= 0 or idx >= len(timestamps): return idx
+    return int(np.searchsorted(timestamps, timestamps[idx], side='left'))
+
+def rolling_origin_folds(timestamps, n_folds=3, valid_size=0.1, min_train_size=0.4, window='expanding', train_size=None):
+    """
+    Folds de origem móvel sobre dados ordenados no tempo.
+    Cada fold treina no passado e valida na janela seguinte:
+
+        expanding:
+        fold 0: [ treino ........ ][ valid ]
+        fold 1: [ treino ................. ][ valid ]
+        fold 2: [ treino .......................... ][ valid ]
+
+        sliding:
+        fold 0: [ treino ........ ][ valid ]
+        fold 1:          [ treino ........ ][ valid ]
+        fold 2:                   [ treino ........ ][ valid ]
+
+    `train_size` (fração, só no sliding; padrão = min_train_size) é o tamanho da janela de treino.
+    Retorna uma lista de (slice_treino, slice_validação).
+    """
+    timestamps = np.asarray(timestamps)
+    n = len(timestamps)
+    if n_folds < 1:
+        raise ValueError("n_folds deve ser >= 1")
+    if window not in ('expanding', 'sliding'):
+        raise ValueError(f"window deve ser 'expanding' ou 'sliding': {window}")
+    if np.any(timestamps[1:] < timestamps[:-1]):
+        raise ValueError("timestamps precisam estar ordenados (ordem temporal)")
+    if min_train_size + n_folds * valid_size > 1 + 1e-9:
+        raise ValueError(f"min_train_size + n_folds * valid_size excede 100% ({min_train_size} + {n_folds} x {valid_size})")
+
+    n_valid = int(n * valid_size)
+    n_train = int(n * (train_size or min_train_size))
+    first_start = n - n_folds * n_valid
+    folds = []
+    for k in range(n_folds):
+        start = _align_to_timestamp(timestamps, first_start + k * n_valid)
+        end = n if k == n_folds - 1 else _align_to_timestamp(timestamps, first_start + (k + 1) * n_valid)
+        if start <= 0 or end <= start:
+            raise ValueError(f"Fold {k} vazio: poucos dados ({n} linhas) para {n_folds} folds")
+        train_start = _align_to_timestamp(timestamps, start - n_train) if window == 'sliding' and start > n_train else 0
+        folds.append((slice(train_start, start), slice(start, end)))
+    return folds
+
+def patch_folds(patch_keys, n_folds=3, window='expanding', train_patches=None):
+    """
+    Folds por patch: cada um dos `n_folds` patches mais recentes é validado com um modelo treinado
+    nos patches anteriores (todos, ou só os `train_patches` mais recentes no sliding).
+    `patch_keys`: chave ordinal do patch por linha, JÁ ORDENADA (ver models.backtest.patch_ordinal).
+    """
+    patch_keys = np.asarray(patch_keys)
+    if np.any(patch_keys[1:] < patch_keys[:-1]):
+        raise ValueError("linhas precisam estar ordenadas por patch")
+    if window not in ('expanding', 'sliding'):
+        raise ValueError(f"window deve ser 'expanding' ou 'sliding': {window}")
+    patches = np.unique(patch_keys)
+    if n_folds < 1 or len(patches) < n_folds + 1:
+        raise ValueError(f"{len(patches)} patches: poucos para {n_folds} folds (precisa de n_folds + 1)")
+    bounds = np.searchsorted(patch_keys, patches, side='left').tolist() + [len(patch_keys)]
+    folds = []
+    for i in range(len(patches) - n_folds, len(patches)):
+        first = max(0, i - train_patches) if window == 'sliding' and train_patches else 0
+        folds.append((slice(bounds[first], bounds[i]), slice(bounds[i], bounds[i + 1])))
+    return folds
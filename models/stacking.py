@@ -9,7 +9,8 @@ from sklearn.metrics import brier_score_loss
 sys.path.append(os.getcwd())
 from database import get_engine
 from features.engine import prepare_data_for_ml
-from config import FEATURES_MODEL, MODEL_FILENAME
+from config import MODEL_FILENAME
+from models.scoring import ScoringBundle, CALIBRATION_FEATURES
 
 ARTIFACTS_DIR = 'models/artifacts'
 CLUSTERS_FILENAME = f'{ARTIFACTS_DIR}/archetypes_v10.joblib'
@@ -29,21 +30,15 @@ def train_calibration_layer():
 
     df = prepare_data_for_ml(df_raw)
     
-    # Aplica Arquétipos
-    style_features = ['dpm', 'damage_self_mitigated', 'vision_score', 'gold_earned', 'total_minions_killed', 'damage_to_objectives', 'time_ccing_others']
-    X_style = df[style_features].fillna(0)
-    X_scaled = archetype_pipe['scaler'].transform(X_style)
-    X_pca = archetype_pipe['pca'].transform(X_scaled)
-    df['archetype_id'] = archetype_pipe['kmeans'].predict(X_pca)
-    
-    labels_map = archetype_pipe['labels']
+    # Predição Base + Arquétipos (mesmo pipeline fundido do coach/predictor, sem as cabeças)
+    scored = ScoringBundle(base_model, archetype_pipe).predict(df)
+    df['archetype_id'] = scored['archetype_id']
+    df['xgb_prob'] = scored['win_probability']
 
-    # Predição Base
-    X_base = df[FEATURES_MODEL]
-    df['xgb_prob'] = base_model.predict_proba(X_base)[:, 1]
+    labels_map = archetype_pipe['labels']
 
     # Features de Calibração
-    features_v10 = ['xgb_prob', 'pressure_absorption_rel', 'passivity_index', 'resilience_rel']
+    features_v10 = CALIBRATION_FEATURES
     
     archetype_models = {}
     
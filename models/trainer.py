@@ -1,15 +1,38 @@
 import pandas as pd
+import numpy as np
 import joblib
-import matplotlib.pyplot as plt
+import json
 import os
 from datetime import datetime
+import xgboost as xgb
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support, brier_score_loss
-from sklearn.calibration import calibration_curve
 
 from database import get_engine
 from config import settings, FEATURES_MODEL, MODEL_FILENAME
-from features.engine import prepare_data_for_ml
+from features.engine import prepare_data_for_ml, group_moments, merge_moments, apply_global_zscores, apply_rolling_history
+from etl.sources import iter_performance_chunks, timestamp_quantile
+from profiling import Timer, peak_rss_mb
+from models.registry import TRAINING_REPORT_FILE, file_sha256
+
+# Padrões do modo escalável (sobrescreva em settings.yaml -> model.training)
+TRAINING_DEFAULTS = {
+    'chunk_size': 200_000,         # Linhas por bloco lido do banco/Parquet
+    'valid_fraction': 0.2,         # Fatia temporal final usada para early stopping
+    'early_stopping_rounds': 50,
+    'max_bin': 256,
+    'nthread': 0,                  # 0 = todos os núcleos
+    'external_memory': False,      # True = páginas quantizadas em disco (dados > RAM)
+    'cache_dir': 'models/artifacts/xgb_cache',
+}
+
+def _save_training_report(report):
+    """Metadados do treino para o manifest do registro (python main.py registry publish)."""
+    report = {**report, 'trained_at': datetime.now().isoformat(timespec='seconds'),
+              'params': settings['model']['params'], 'model_sha256': file_sha256(MODEL_FILENAME)}
+    with open(TRAINING_REPORT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    print("💡 Publique no registro com: python main.py registry publish --shadow")
 
 def train_model():
     print("🎓 Iniciando Treinamento (Protocolo Temporal + Calibração)...")
@@ -71,6 +94,8 @@ def train_model():
         
         # --- CALIBRATION CURVE ---
         print("   📉 Gerando Curva de Calibração...")
+        import matplotlib.pyplot as plt  # Import tardio (só o treino clássico plota)
+        from sklearn.calibration import calibration_curve
         prob_true, prob_pred = calibration_curve(y_test, y_probs, n_bins=10, strategy='uniform')
         
         plt.figure(figsize=(10, 10))
@@ -120,6 +145,165 @@ def train_model():
 
     # Salvar Modelo
     joblib.dump(model, MODEL_FILENAME)
+    report = {'mode': 'classic', 'rows_train': len(X_train), 'rows_valid': len(X_test)}
+    if len(X_test) > 0: report.update({'accuracy': round(global_acc, 4), 'brier': round(global_brier, 4)})
+    _save_training_report(report)
+
+# ==============================================================================
+# MODO ESCALÁVEL: QuantileDMatrix / memória externa + early stopping temporal
+# ==============================================================================
+class ChunkIter(xgb.DataIter):
+    """
+    Alimenta o XGBoost bloco a bloco. `make_chunks` é uma fábrica que devolve um
+    gerador novo de (X, y) a cada reset() -- o XGBoost percorre os dados várias vezes.
+    """
+    def __init__(self, make_chunks, cache_prefix=None):
+        self._make_chunks = make_chunks
+        self._it = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._it is None:
+            self._it = self._make_chunks()
+        try:
+            X, y = next(self._it)
+        except StopIteration:
+            return False
+        input_data(data=X, label=y)
+        return True
+
+    def reset(self):
+        self._it = None
+
+def _training_config(overrides=None):
+    cfg = dict(TRAINING_DEFAULTS)
+    cfg.update(settings['model'].get('training') or {})
+    cfg.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return cfg
+
+def _booster_params(cfg):
+    """Traduz os parâmetros do XGBClassifier (settings) para a API nativa xgb.train."""
+    params = dict(settings['model']['params'])
+    num_rounds = int(params.pop('n_estimators', 500))
+    params.update({
+        'objective': 'binary:logistic',
+        'tree_method': 'hist',
+        'max_bin': cfg['max_bin'],
+        'nthread': cfg['nthread'] or os.cpu_count(),
+    })
+    params.setdefault('eval_metric', 'logloss')
+    return params, num_rounds
+
+def _global_moments(source, chunk_size):
+    """1ª passada: média/desvio por role das colunas z-score sobre o histórico inteiro."""
+    moments = {}
+    for df_raw in iter_performance_chunks(source, chunk_size):
+        moments = merge_moments(moments, group_moments(prepare_data_for_ml(df_raw)))
+    return moments
+
+def _feature_chunks(source, chunk_size, cutoff, part, moments, with_roles=False):
+    """
+    Gera (X, y[, roles]) já com features, filtrando o lado do corte temporal pedido.
+    As features saem do bloco INTEIRO antes do filtro, com z-scores por role globais (`moments`)
+    e janelas por jogador que continuam entre blocos: mesmos valores do train_model, e a
+    validação enxerga o histórico anterior ao corte.
+    """
+    tail = None
+    for df_raw in iter_performance_chunks(source, chunk_size):
+        df, tail = apply_rolling_history(prepare_data_for_ml(df_raw), tail)
+        ts = df['game_start_timestamp']
+        df = df[ts < cutoff] if part == 'train' else df[ts >= cutoff]
+        if df.empty: continue
+        df = apply_global_zscores(df, moments)
+        X = df[FEATURES_MODEL].astype(np.float32)
+        y = df['win'].astype(int)
+        yield (X, y, df['team_position']) if with_roles else (X, y)
+
+def _build_matrix(make_chunks, cfg, name, ref=None):
+    if cfg['external_memory']:
+        os.makedirs(cfg['cache_dir'], exist_ok=True)
+        it = ChunkIter(make_chunks, cache_prefix=os.path.join(cfg['cache_dir'], name))
+        if hasattr(xgb, 'ExtMemQuantileDMatrix'):  # XGBoost >= 3.0
+            return xgb.ExtMemQuantileDMatrix(it, max_bin=cfg['max_bin'], ref=ref)
+        return xgb.DMatrix(it)
+    return xgb.QuantileDMatrix(ChunkIter(make_chunks), max_bin=cfg['max_bin'], ref=ref)
+
+def train_model_scalable(source=None, chunk_size=None, external_memory=None):
+    """
+    Treino para histórico completo (multi-região) sem carregar tudo num DataFrame:
+    dados lidos em blocos -> QuantileDMatrix (ou memória externa) -> 'hist' em todos os
+    núcleos -> early stopping na fatia temporal mais recente.
+    """
+    cfg = _training_config({'chunk_size': chunk_size, 'external_memory': external_memory})
+    print("🎓 Iniciando Treinamento Escalável (hist + Split Temporal + Early Stopping)...")
+    print(f"   ⚙️ Blocos de {cfg['chunk_size']:,} linhas | memória externa: {'sim' if cfg['external_memory'] else 'não'}")
+
+    with Timer() as t_total:
+        cutoff = timestamp_quantile(1 - cfg['valid_fraction'], source)
+        if cutoff is None:
+            print("❌ Dados insuficientes.")
+            return None
+
+        with Timer() as t_stats:
+            moments = _global_moments(source, cfg['chunk_size'])
+        print(f"   📐 Estatísticas globais por role para os z-scores ({t_stats.seconds:.1f}s)")
+
+        train_chunks = lambda: _feature_chunks(source, cfg['chunk_size'], cutoff, 'train', moments)
+        valid_chunks = lambda: _feature_chunks(source, cfg['chunk_size'], cutoff, 'valid', moments)
+
+        with Timer() as t_build:
+            dtrain = _build_matrix(train_chunks, cfg, 'train')
+            dvalid = _build_matrix(valid_chunks, cfg, 'valid', ref=dtrain)
+        print(f"   📦 Matrizes quantizadas: treino={dtrain.num_row():,} | validação={dvalid.num_row():,} ({t_build.seconds:.1f}s)")
+
+        if dtrain.num_row() < 50:
+            print(f"❌ Dados insuficientes ({dtrain.num_row()}).")
+            return None
+
+        params, num_rounds = _booster_params(cfg)
+        with Timer() as t_fit:
+            booster = xgb.train(
+                params, dtrain, num_boost_round=num_rounds,
+                evals=[(dtrain, 'train'), (dvalid, 'valid')],
+                early_stopping_rounds=cfg['early_stopping_rounds'] if dvalid.num_row() > 0 else None,
+                verbose_eval=50
+            )
+        best_iter = getattr(booster, 'best_iteration', booster.num_boosted_rounds() - 1)
+
+        # Avaliação na fatia temporal (bloco a bloco, só até a melhor iteração)
+        y_all, p_all, roles_all = [], [], []
+        for X, y, roles in _feature_chunks(source, cfg['chunk_size'], cutoff, 'valid', moments, with_roles=True):
+            p_all.append(booster.inplace_predict(X, iteration_range=(0, best_iter + 1)))
+            y_all.append(y.to_numpy()); roles_all.append(roles.to_numpy())
+
+    report = {
+        'wall_time_sec': round(t_total.seconds, 1), 'fit_time_sec': round(t_fit.seconds, 1),
+        'peak_rss_mb': peak_rss_mb(), 'best_iteration': int(best_iter),
+        'rows_train': int(dtrain.num_row()), 'rows_valid': int(dvalid.num_row()),
+    }
+    print("-" * 30)
+    print(f"⏱️ Tempo total: {report['wall_time_sec']}s (fit {report['fit_time_sec']}s) | 🧠 Pico RSS: {report['peak_rss_mb']} MB")
+    print(f"🌲 Melhor iteração: {best_iter} de {num_rounds}")
+
+    if p_all:
+        y_test, y_probs, roles_test = np.concatenate(y_all), np.concatenate(p_all), np.concatenate(roles_all)
+        y_pred = (y_probs >= 0.5).astype(int)
+        report['accuracy'] = round(accuracy_score(y_test, y_pred), 4)
+        report['brier'] = round(brier_score_loss(y_test, y_probs), 4)
+        print(f"📊 ACURÁCIA (validação temporal): {report['accuracy']:.2%}")
+        print(f"🎯 BRIER SCORE: {report['brier']:.4f}")
+        for role in sorted(set(roles_test)):
+            mask = roles_test == role
+            acc = accuracy_score(y_test[mask], y_pred[mask])
+            print(f"      -> {role}: Acc={acc:.1%} | N={mask.sum()}")
+
+    # Salva no formato do sklearn (predict_proba usa a melhor iteração automaticamente)
+    model = XGBClassifier()
+    model.load_model(booster.save_raw('ubj'))
+    joblib.dump(model, MODEL_FILENAME)
+    print(f"💾 Modelo salvo em: {MODEL_FILENAME}")
+    _save_training_report({'mode': 'scalable', **report})
+    return report
 
 if __name__ == "__main__":
     train_model()
\ No newline at end of file
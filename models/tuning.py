@@ -0,0 +1,229 @@
+import os
+import json
+import math
+import tempfile
+import numpy as np
+import yaml
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import settings, FEATURES_MODEL
+from features.engine import prepare_data_for_ml
+from models.splits import temporal_holdout_index, rolling_origin_folds
+from profiling import Timer
+
+# Busca de hiperparâmetros do XGBoost por Successive Halving (Hyperband de 1 bracket):
+# muitos candidatos com poucas árvores -> só o melhor 1/eta sobe de degrau com eta x mais árvores.
+# Validação por origem móvel DENTRO do treino (os 20% finais do train_model ficam intocados).
+
+# Padrões (sobrescreva em settings.yaml -> model.tuning)
+TUNING_DEFAULTS = {
+    'n_trials': 27,
+    'eta': 3,                      # Fator de corte por degrau
+    'min_rounds': 50,              # Árvores no primeiro degrau
+    'max_rounds': 1000,            # Árvores no último degrau
+    'n_folds': 3,
+    'valid_size': 0.1,             # Fração (do treino) de cada janela de validação
+    'early_stopping_rounds': 50,
+    'seed': 42,
+    'state_file': 'models/artifacts/tuning/state.json',
+    'candidate_file': 'models/artifacts/tuning/candidate_params.yaml',
+}
+
+# Espaço de busca: (tipo, mínimo, máximo)
+SEARCH_SPACE = {
+    'learning_rate': ('log', 0.01, 0.3),
+    'max_depth': ('int', 3, 10),
+    'min_child_weight': ('log', 1.0, 20.0),
+    'subsample': ('float', 0.5, 1.0),
+    'colsample_bytree': ('float', 0.4, 1.0),
+    'gamma': ('float', 0.0, 5.0),
+    'reg_lambda': ('log', 0.1, 10.0),
+}
+
+def _tuning_config(overrides=None):
+    cfg = dict(TUNING_DEFAULTS)
+    cfg.update(settings['model'].get('tuning') or {})
+    cfg.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return cfg
+
+def sample_params(rng):
+    params = {}
+    for name, (kind, lo, hi) in SEARCH_SPACE.items():
+        if kind == 'int': params[name] = int(rng.integers(lo, hi + 1))
+        elif kind == 'log': params[name] = round(float(math.exp(rng.uniform(math.log(lo), math.log(hi)))), 5)
+        else: params[name] = round(float(rng.uniform(lo, hi)), 4)
+    return params
+
+def rung_schedule(min_rounds, max_rounds, eta):
+    """Nº de árvores por degrau: min_rounds, min_rounds*eta, ... até max_rounds."""
+    rungs, r = [], min_rounds
+    while r < max_rounds:
+        rungs.append(int(r))
+        r *= eta
+    rungs.append(int(max_rounds))
+    return rungs
+
+# ==============================================================================
+# 1. ESTADO PERSISTENTE (retomada da busca)
+# ==============================================================================
+def _load_state(path):
+    if not os.path.exists(path): return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_state(state, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)  # Escrita atômica: um Ctrl+C nunca corrompe o estado
+
+def _new_state(cfg):
+    rng = np.random.default_rng(cfg['seed'])
+    search = {k: cfg[k] for k in ('n_trials', 'eta', 'min_rounds', 'max_rounds', 'n_folds', 'valid_size', 'seed')}
+    return {
+        'search': search,
+        'rungs': rung_schedule(cfg['min_rounds'], cfg['max_rounds'], cfg['eta']),
+        'trials': {str(i): {'params': sample_params(rng), 'results': {}} for i in range(cfg['n_trials'])},
+        'current_rung': 0,
+        'survivors': [str(i) for i in range(cfg['n_trials'])],
+    }
+
+# ==============================================================================
+# 2. WORKERS (uma QuantileDMatrix por fold, montada uma vez por processo)
+# ==============================================================================
+_WORKER = {}
+
+def _init_tuning_worker(data_dir, folds, base_params, nthread):
+    X = np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(data_dir, 'y.npy'), mmap_mode='r')
+    matrices = []
+    for train_sl, valid_sl in folds:
+        dtrain = xgb.QuantileDMatrix(X[train_sl], y[train_sl], nthread=nthread)
+        dvalid = xgb.QuantileDMatrix(X[valid_sl], y[valid_sl], ref=dtrain, nthread=nthread)
+        matrices.append((dtrain, dvalid))
+    _WORKER.update({'matrices': matrices, 'base_params': base_params, 'nthread': nthread})
+
+def _evaluate_trial(trial_id, params, num_rounds, early_stopping_rounds):
+    """Treina o candidato em todos os folds; retorna logloss médio e melhor iteração por fold."""
+    booster_params = dict(_WORKER['base_params'])
+    booster_params.update(params)
+    booster_params.update({'objective': 'binary:logistic', 'tree_method': 'hist',
+                           'eval_metric': 'logloss', 'nthread': _WORKER['nthread']})
+    losses, best_iters = [], []
+    for dtrain, dvalid in _WORKER['matrices']:
+        history = {}
+        xgb.train(booster_params, dtrain, num_boost_round=num_rounds,
+                            evals=[(dvalid, 'valid')], evals_result=history,
+                            early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+        curve = history['valid']['logloss']
+        best = int(np.argmin(curve))
+        losses.append(float(curve[best]))
+        best_iters.append(best + 1)
+    return trial_id, num_rounds, {'logloss': float(np.mean(losses)), 'fold_logloss': losses, 'best_rounds': best_iters}
+
+# ==============================================================================
+# 3. ORQUESTRAÇÃO
+# ==============================================================================
+def _load_dev_data(source=None):
+    """Mesma base do train_model, SEM os `test_size` finais (reservados à avaliação)."""
+    from etl.sources import load_performance
+    print("🧪 Carregando dados para tuning...")
+    df = prepare_data_for_ml(load_performance(source))
+    df = df.sort_values('game_start_timestamp', kind='stable').reset_index(drop=True)
+    split_idx = temporal_holdout_index(len(df), settings['model'].get('test_size', 0.2))
+    df = df.iloc[:split_idx]
+    return df[FEATURES_MODEL].to_numpy(np.float32), df['win'].astype(int).to_numpy(), df['game_start_timestamp'].to_numpy()
+
+def _write_candidate(state, best_id, path):
+    trial = state['trials'][best_id]
+    final = trial['results'][str(state['rungs'][-1])]
+    params = dict(settings['model']['params'])
+    params.update(trial['params'])
+    params['n_estimators'] = int(np.mean(final['best_rounds']))  # Árvores úteis (early stopping)
+    candidate = {
+        'tuning': {'trial': int(best_id), 'cv_logloss': round(final['logloss'], 5),
+                   'folds': state['search']['n_folds'], 'trials': state['search']['n_trials']},
+        'model': {'params': params},
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# Candidato gerado por `python main.py tune`. Revise e copie `model.params` para o settings.yaml.\n")
+        yaml.safe_dump(candidate, f, sort_keys=False, allow_unicode=True)
+    return params
+
+def _run_search(state, cfg, source, workers, thread_budget):
+    search = state['search']
+    X, y, ts = _load_dev_data(source)
+    folds = rolling_origin_folds(ts, search['n_folds'], search['valid_size'])
+    print(f"   📅 {len(X):,} linhas de treino | {len(folds)} folds de origem móvel")
+
+    total_threads = thread_budget or os.cpu_count()
+    workers = max(1, min(workers or total_threads, search['n_trials'], total_threads))
+    nthread = max(1, total_threads // workers)
+    print(f"   ⚙️ {workers} processos x {nthread} threads (orçamento: {total_threads})")
+
+    base_params = {k: v for k, v in settings['model']['params'].items() if k != 'n_estimators'}
+    with tempfile.TemporaryDirectory() as data_dir, Timer() as t:
+        np.save(os.path.join(data_dir, 'X.npy'), X)
+        np.save(os.path.join(data_dir, 'y.npy'), y)
+        del X
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_tuning_worker,
+                                 initargs=(data_dir, folds, base_params, nthread)) as pool:
+            while state['current_rung'] < len(state['rungs']):
+                rung = state['current_rung']
+                rounds = state['rungs'][rung]
+                survivors = state['survivors']
+                pending = [tid for tid in survivors if str(rounds) not in state['trials'][tid]['results']]
+                print(f"\n   🪜 Degrau {rung + 1}/{len(state['rungs'])}: {len(survivors)} candidatos x {rounds} árvores ({len(pending)} pendentes)")
+
+                futures = [pool.submit(_evaluate_trial, tid, state['trials'][tid]['params'], rounds,
+                                       cfg['early_stopping_rounds']) for tid in pending]
+                for fut in as_completed(futures):
+                    tid, r, result = fut.result()
+                    state['trials'][tid]['results'][str(r)] = result
+                    _save_state(state, cfg['state_file'])  # Checkpoint por trial
+                    print(f"      -> trial {tid:>3}: logloss={result['logloss']:.5f} (árvores úteis ~{int(np.mean(result['best_rounds']))})")
+
+                # Poda: só o melhor 1/eta segue para o próximo degrau
+                ranked = sorted(survivors, key=lambda tid: state['trials'][tid]['results'][str(rounds)]['logloss'])
+                keep = max(1, len(ranked) // search['eta'])
+                state['survivors'] = ranked if rung == len(state['rungs']) - 1 else ranked[:keep]
+                state['current_rung'] = rung + 1
+                _save_state(state, cfg['state_file'])
+    print(f"⏱️ Degraus concluídos em {t.seconds:.1f}s")
+
+def run_tuning(n_trials=None, eta=None, min_rounds=None, max_rounds=None, n_folds=None,
+               workers=None, thread_budget=None, source=None, fresh=False):
+    cfg = _tuning_config({'n_trials': n_trials, 'eta': eta, 'min_rounds': min_rounds,
+                          'max_rounds': max_rounds, 'n_folds': n_folds})
+    print("🎛️ Iniciando busca de hiperparâmetros (Successive Halving + CV temporal)...")
+
+    state = None if fresh else _load_state(cfg['state_file'])
+    if state is not None:
+        done = state['current_rung'] >= len(state['rungs'])
+        progress = "concluída" if done else f"degrau {state['current_rung'] + 1}/{len(state['rungs'])}"
+        print(f"   ♻️ Retomando busca salva em {cfg['state_file']} ({progress}; use --fresh para recomeçar)")
+    else:
+        state = _new_state(cfg)
+        _save_state(state, cfg['state_file'])
+    search = state['search']
+    print(f"   📐 {search['n_trials']} candidatos | degraus (árvores): {state['rungs']} | eta={search['eta']}")
+
+    if state['current_rung'] < len(state['rungs']):
+        _run_search(state, cfg, source, workers, thread_budget)
+
+    best_id = state['survivors'][0]
+    final = state['trials'][best_id]['results'][str(state['rungs'][-1])]
+    params = _write_candidate(state, best_id, cfg['candidate_file'])
+
+    print("-" * 30)
+    print(f"🏆 Melhor trial: {best_id} | logloss CV = {final['logloss']:.5f} (folds: {', '.join(f'{l:.4f}' for l in final['fold_logloss'])})")
+    current = settings['model']['params']
+    for k, v in params.items():
+        marker = '' if current.get(k) == v else f"   (atual: {current.get(k)})"
+        print(f"      {k}: {v}{marker}")
+    print(f"💾 Candidato salvo em: {cfg['candidate_file']}")
+    return params
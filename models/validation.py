@@ -1,81 +1,229 @@
 import pandas as pd
-import joblib
+import numpy as np
 import xgboost as xgb
-import matplotlib.pyplot as plt
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.metrics import brier_score_loss, accuracy_score
-from sklearn.model_selection import train_test_split
-from database import get_engine
-from config import FEATURES_MODEL, MODEL_FILENAME, settings
+from config import FEATURES_MODEL, FEATURE_GROUPS, settings
 from features.engine import prepare_data_for_ml
+from models.splits import temporal_holdout_index
+from profiling import Timer
 
-def load_science_data():
-    """Carrega dados brutos e aplica feature engineering"""
-    engine = get_engine()
+def load_science_data(source=None):
+    """
+    Carrega dados brutos (mesma query do treino, com invade_kills) e aplica feature engineering,
+    em ordem temporal: os cortes de avaliação saem de models.splits, como no train_model.
+    `source`: snapshot Parquet opcional.
+    """
+    from etl.sources import load_performance  # Import tardio
     print("🧪 Carregando dados para validação científica...")
-    query = "SELECT * FROM fact_match_player_performance WHERE team_position != 'UNKNOWN'"
-    # Nota: Simplifiquei a query para o exemplo, use a sua query completa com kills se precisar
-    with engine.connect() as conn:
-        df_raw = pd.read_sql(query, conn)
-    return prepare_data_for_ml(df_raw)
+    df = prepare_data_for_ml(load_performance(source))
+    return df.sort_values('game_start_timestamp', kind='stable').reset_index(drop=True)
 
 def run_brier_check():
-    """Calcula Brier Score por Role"""
-    if not os.path.exists(MODEL_FILENAME):
+    """Calcula Brier Score por Role (probabilidade bruta do XGBoost e calibrada por arquétipo)"""
+    from models.registry import load_bundle
+    from models.scoring import ScoringBundle
+    try:
+        scorer = ScoringBundle.from_bundle(load_bundle())
+    except FileNotFoundError:
         print("❌ Modelo não encontrado.")
         return
 
-    model = joblib.load(MODEL_FILENAME)
     df = load_science_data()
     
-    # Split consistente (mesmo seed do treino)
-    split_idx = int(len(df) * 0.8)
-    X_test = df[FEATURES_MODEL].iloc[split_idx:]
-    y_test = df['win'].astype(int).iloc[split_idx:]
-    roles_test = df['team_position'].iloc[split_idx:]
+    # Split temporal (mesmo corte do train_model: os `test_size` finais são o futuro)
+    split_idx = temporal_holdout_index(len(df), settings['model'].get('test_size', 0.2))
+    df_test = df.iloc[split_idx:]
+    y_test = df_test['win'].astype(int)
+    roles_test = df_test['team_position']
     
-    y_probs = model.predict_proba(X_test)[:, 1]
+    scored = scorer.predict(df_test)
+    y_probs, y_cal = scored['win_probability'], scored['win_probability_calibrated']
     
-    print(f"\n{'ROLE':<10} | {'BRIER':<10} | STATUS")
-    print("-" * 35)
+    print(f"\n{'ROLE':<10} | {'BRIER':<10} | {'CALIBRADO':<10} | STATUS")
+    print("-" * 48)
     for role in sorted(roles_test.unique()):
         mask = (roles_test == role)
         if mask.sum() == 0: continue
         score = brier_score_loss(y_test[mask], y_probs[mask])
-        print(f"{role:<10} | {score:.4f}     | {'💎' if score < 0.1 else '⚠️'}")
+        score_cal = brier_score_loss(y_test[mask], y_cal[mask])
+        print(f"{role:<10} | {score:.4f}     | {score_cal:.4f}     | {'💎' if min(score, score_cal) < 0.1 else '⚠️'}")
 
-def run_ablation_study():
-    """Roda o estudo de importância de features"""
+# ==============================================================================
+# ABLATION STUDY (paralelo, matriz quantizada compartilhada)
+# ==============================================================================
+_WORKER = {}
+
+def _ablation_params(params, n_features, n_dropped, nthread):
+    """
+    Parâmetros nativos para treinar "sem" `n_dropped` features usando feature_weights=0.
+    O colsample_bytree é ajustado para sortear exatamente o mesmo número de colunas
+    que um retreino com (n_features - n_dropped) colunas sortearia.
+    """
+    p = dict(params)
+    num_rounds = int(p.pop('n_estimators', 500))
+    p.update({'objective': 'binary:logistic', 'tree_method': 'hist', 'nthread': nthread})
+    if n_dropped:
+        kept = n_features - n_dropped
+        colsample = float(p.get('colsample_bytree', 1.0))
+        n_sampled = max(1, int(colsample * kept)) if colsample < 1 else kept
+        p['colsample_bytree'] = (n_sampled + 0.5) / n_features
+    return p, num_rounds
+
+def _init_ablation_worker(data_dir, params, nthread):
+    """Cada processo monta a QuantileDMatrix UMA vez a partir dos arrays em memmap."""
+    X_train = np.load(os.path.join(data_dir, 'X_train.npy'), mmap_mode='r')
+    y_train = np.load(os.path.join(data_dir, 'y_train.npy'), mmap_mode='r')
+    _WORKER['dtrain'] = xgb.QuantileDMatrix(X_train, y_train, nthread=nthread)
+    _WORKER['X_test'] = np.load(os.path.join(data_dir, 'X_test.npy'), mmap_mode='r')
+    _WORKER['params'] = params
+    _WORKER['nthread'] = nthread
+
+def _fit_ablation(name, dropped_idx, return_model=False):
+    dtrain = _WORKER['dtrain']
+    n_features = dtrain.num_col()
+    weights = np.ones(n_features, dtype=np.float32)
+    weights[list(dropped_idx)] = 0.0
+    dtrain.set_info(feature_weights=weights)
+    params, num_rounds = _ablation_params(_WORKER['params'], n_features, len(dropped_idx), _WORKER['nthread'])
+    booster = xgb.train(params, dtrain, num_boost_round=num_rounds)
+    probs = booster.inplace_predict(_WORKER['X_test']).astype(np.float32)
+    return name, probs, (bytes(booster.save_raw('ubj')) if return_model else None)
+
+def _bootstrap_deltas(y_test, base_probs, variant_probs, n_bootstrap=200, seed=42):
+    """
+    Deltas de acurácia e Brier contra o baseline, com IC 95% por bootstrap pareado
+    (mesmas reamostragens para baseline e variantes).
+    """
+    y = y_test.astype(np.float32)
+    P = np.vstack([base_probs] + list(variant_probs))
+    correct = ((P >= 0.5) == (y >= 0.5)).astype(np.float32)
+    sq_err = (P - y) ** 2
+
+    acc_point = correct.mean(axis=1)
+    brier_point = sq_err.mean(axis=1)
+
+    rng = np.random.default_rng(seed)
+    n = len(y)
+    acc_boot = np.empty((n_bootstrap, P.shape[0]), dtype=np.float64)
+    brier_boot = np.empty_like(acc_boot)
+    for b in range(n_bootstrap):
+        w = np.bincount(rng.integers(0, n, n), minlength=n).astype(np.float32)
+        acc_boot[b] = correct @ w / n
+        brier_boot[b] = sq_err @ w / n
+
+    d_acc = acc_boot[:, 1:] - acc_boot[:, :1]
+    d_brier = brier_boot[:, 1:] - brier_boot[:, :1]
+    return {
+        'base_acc': acc_point[0], 'base_brier': brier_point[0],
+        'delta_acc': acc_point[1:] - acc_point[0], 'delta_brier': brier_point[1:] - brier_point[0],
+        'acc_ci': np.percentile(d_acc, [2.5, 97.5], axis=0).T,
+        'brier_ci': np.percentile(d_brier, [2.5, 97.5], axis=0).T,
+    }
+
+def _permutation_probs(booster, X_test, feats_idx, n_repeats=5, seed=42):
+    """Probabilidades com a(s) coluna(s) embaralhada(s), média sobre n_repeats."""
+    rng = np.random.default_rng(seed)
+    X_perm = np.array(X_test, copy=True)
+    probs = np.zeros(len(X_test), dtype=np.float64)
+    for _ in range(n_repeats):
+        perm = rng.permutation(len(X_test))
+        X_perm[:, feats_idx] = X_test[perm][:, feats_idx]
+        probs += booster.inplace_predict(X_perm)
+        X_perm[:, feats_idx] = X_test[:, feats_idx]
+    return (probs / n_repeats).astype(np.float32)
+
+def run_ablation_study(workers=None, thread_budget=None, groups=False, method='retrain',
+                       n_bootstrap=200, n_repeats=5, source=None):
+    """
+    Estudo de importância de features.
+    - method='retrain': leave-one-out (e, com groups=True, leave-one-group-out) em paralelo
+      num pool de processos, todos sob um orçamento global de threads.
+    - method='permutation': só o baseline + importância por permutação no hold-out (barato).
+    - method='both': os dois.
+    Resultados com delta de acurácia e Brier e IC 95% por bootstrap.
+    """
     print("✂️ Iniciando Ablation Study...")
-    df = load_science_data()
-    X = df[FEATURES_MODEL]
+    df = load_science_data(source)
+    X = df[FEATURES_MODEL].astype(np.float32)
     y = df['win'].astype(int)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    # Baseline
+    split_idx = temporal_holdout_index(len(df), settings['model'].get('test_size', 0.2))
+    X_train, X_test, y_train, y_test = X.iloc[:split_idx], X.iloc[split_idx:], y.iloc[:split_idx], y.iloc[split_idx:]
+    X_test_np, y_test_np = X_test.to_numpy(), y_test.to_numpy()
+
+    variants = [(feat, [FEATURES_MODEL.index(feat)]) for feat in FEATURES_MODEL]
+    if groups:
+        variants += [(f"[{g}]", [FEATURES_MODEL.index(f) for f in feats]) for g, feats in FEATURE_GROUPS.items()]
+
+    total_threads = thread_budget or os.cpu_count()
+    n_tasks = 1 + (len(variants) if method in ('retrain', 'both') else 0)
+    workers = max(1, min(workers or total_threads, n_tasks, total_threads))
+    nthread = max(1, total_threads // workers)
+    print(f"   ⚙️ {n_tasks} treinos | {workers} processos x {nthread} threads (orçamento: {total_threads})")
+
     params = settings['model']['params']
-    base_model = xgb.XGBClassifier(**params)
-    base_model.fit(X_train, y_train)
-    base_acc = accuracy_score(y_test, base_model.predict(X_test))
-    
-    print(f"📊 Baseline Acc: {base_acc:.2%}")
     results = []
-    
-    for feat in FEATURES_MODEL:
-        feats_temp = [f for f in FEATURES_MODEL if f != feat]
-        model_temp = xgb.XGBClassifier(**params)
-        model_temp.fit(X_train[feats_temp], y_train)
-        acc = accuracy_score(y_test, model_temp.predict(X_test[feats_temp]))
-        delta = acc - base_acc
-        print(f"   - {feat}: {delta:+.2%}")
-        results.append({'feature': feat, 'delta': delta})
-        
-    # Plotagem rápida
-    if results:
-        res_df = pd.DataFrame(results).sort_values('delta')
-        plt.figure(figsize=(10, 8))
-        plt.barh(res_df['feature'], res_df['delta'], color='salmon')
-        plt.title("Ablation Study v8.0")
-        os.makedirs("models/artifacts", exist_ok=True)
-        plt.savefig("models/artifacts/ablation_new.png")
-        print("✅ Gráfico salvo em models/artifacts/ablation_new.png")
\ No newline at end of file
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Dados gravados uma vez e mapeados (memmap) por todos os processos
+        np.save(os.path.join(data_dir, 'X_train.npy'), np.ascontiguousarray(X_train.to_numpy()))
+        np.save(os.path.join(data_dir, 'y_train.npy'), y_train.to_numpy())
+        np.save(os.path.join(data_dir, 'X_test.npy'), np.ascontiguousarray(X_test_np))
+
+        with Timer() as t:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_ablation_worker,
+                                     initargs=(data_dir, params, nthread)) as pool:
+                base_future = pool.submit(_fit_ablation, 'baseline', [], True)
+                futures = []
+                if method in ('retrain', 'both'):
+                    futures = [pool.submit(_fit_ablation, name, idx) for name, idx in variants]
+                _, base_probs, base_raw = base_future.result()
+                retrain_probs = dict((name, probs) for name, probs, _ in (f.result() for f in futures))
+        print(f"   ⏱️ Treinos concluídos em {t.seconds:.1f}s")
+
+    base_acc = accuracy_score(y_test_np, base_probs >= 0.5)
+    print(f"📊 Baseline Acc: {base_acc:.2%} | Brier: {brier_score_loss(y_test_np, base_probs):.4f}")
+
+    if retrain_probs:
+        names = [name for name, _ in variants]
+        stats = _bootstrap_deltas(y_test_np, base_probs, [retrain_probs[n] for n in names], n_bootstrap)
+        results += _collect_rows('retrain', names, stats)
+
+    if method in ('permutation', 'both'):
+        booster = xgb.Booster(model_file=bytearray(base_raw))
+        names = [name for name, _ in variants]
+        perm_probs = [_permutation_probs(booster, X_test_np, idx, n_repeats) for _, idx in variants]
+        stats = _bootstrap_deltas(y_test_np, base_probs, perm_probs, n_bootstrap)
+        results += _collect_rows('permutation', names, stats)
+
+    res_df = pd.DataFrame(results)
+    for m, part in res_df.groupby('method', sort=False):
+        print(f"\n   [{m.upper()}] delta vs baseline (IC 95%):")
+        for _, r in part.sort_values('delta_acc').iterrows():
+            print(f"   - {r['feature']:<30} Acc {r['delta_acc']:+.2%} [{r['acc_ci_low']:+.2%}, {r['acc_ci_high']:+.2%}]"
+                  f" | Brier {r['delta_brier']:+.4f} [{r['brier_ci_low']:+.4f}, {r['brier_ci_high']:+.4f}]")
+
+    # Persistência + Plotagem rápida
+    os.makedirs("models/artifacts", exist_ok=True)
+    res_df.to_csv("models/artifacts/ablation_results.csv", index=False)
+    main_df = res_df[res_df['method'] == res_df['method'].iloc[0]].sort_values('delta_acc')
+    err = np.vstack([main_df['delta_acc'] - main_df['acc_ci_low'], main_df['acc_ci_high'] - main_df['delta_acc']])
+    import matplotlib.pyplot as plt  # Import tardio (workers e run_brier_check não plotam)
+    plt.figure(figsize=(10, 8))
+    plt.barh(main_df['feature'], main_df['delta_acc'], xerr=err, color='salmon')
+    plt.title(f"Ablation Study ({main_df['method'].iloc[0]}, IC 95%)")
+    plt.savefig("models/artifacts/ablation_new.png")
+    plt.close()
+    print("✅ Resultados salvos em models/artifacts/ablation_results.csv e ablation_new.png")
+    return res_df
+
+def _collect_rows(method, names, stats):
+    rows = []
+    for i, name in enumerate(names):
+        rows.append({
+            'method': method, 'feature': name,
+            'delta_acc': stats['delta_acc'][i], 'acc_ci_low': stats['acc_ci'][i, 0], 'acc_ci_high': stats['acc_ci'][i, 1],
+            'delta_brier': stats['delta_brier'][i], 'brier_ci_low': stats['brier_ci'][i, 0], 'brier_ci_high': stats['brier_ci'][i, 1],
+        })
+    return rows
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+
+# Utilitários de medição (tempo de parede e pico de memória) usados pelo benchmark,
+# pelo treino escalável e pelos pipelines em lote.
+
+def _proc_status_mb(field, pid='self'):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """Zera o pico de RSS (VmHWM) do processo. Só Linux; retorna False se não suportado."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Pico de memória residente (RSS) do processo atual, em MB. None se indisponível."""
+    hwm = _proc_status_mb('VmHWM')
+    if hwm is not None: return hwm
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta em KB, macOS em bytes
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows: não tem 'resource'
+        info = psutil.Process(os.getpid()).memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+def current_rss_mb(pid=None):
+    """RSS atual de um processo (padrão: o próprio), em MB. Lê /proc no Linux."""
+    pid = pid or os.getpid()
+    rss = _proc_status_mb('VmRSS', pid)
+    if rss is not None: return rss
+    try:
+        import psutil
+        return round(psutil.Process(pid).memory_info().rss / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+def process_memory_mb(pid=None):
+    """
+    Memória de um processo em MB: RSS, PSS (páginas compartilhadas divididas entre quem as mapeia),
+    shared e private. Com workers pré-fork, a soma dos PSS é o consumo real na máquina.
+    Lê /proc/<pid>/smaps_rollup (Linux); fora dele, só o RSS.
+    """
+    pid = pid or os.getpid()
+    fields = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+              'Private_Clean': 'private', 'Private_Dirty': 'private'}
+    try:
+        out = {'rss': 0.0, 'pss': 0.0, 'shared': 0.0, 'private': 0.0}
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key = line.split(':')[0]
+                if key in fields: out[fields[key]] += int(line.split()[1]) / 1024
+        return {k: round(v, 1) for k, v in out.items()}
+    except OSError:
+        return {'rss': current_rss_mb(pid), 'pss': None, 'shared': None, 'private': None}
+
+def child_pids(pid=None):
+    """PIDs dos filhos diretos de um processo (Linux: /proc/<pid>/task/*/children)."""
+    pid = pid or os.getpid()
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children += [int(c) for c in f.read().split()]
+    except OSError:
+        try:
+            import psutil
+            children = [c.pid for c in psutil.Process(pid).children()]
+        except Exception:
+            pass
+    return sorted(set(children))
+
+class Timer:
+    """Cronômetro de contexto: `with Timer() as t: ...` -> t.seconds"""
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        return False
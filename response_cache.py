@@ -0,0 +1,84 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Cache de respostas da API em memória (por processo): TTL por entrada, limite de
+# entradas e de bytes (LRU) e ETag para GET condicional (If-None-Match -> 304).
+# A validade também depende das versões dos dados (etl/versions.py) vistas no cálculo.
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'versions', 'expires_at')
+
+    def __init__(self, body, versions, ttl):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.versions = dict(versions)
+        self.expires_at = time.monotonic() + ttl
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match pode trazer vários ETags (e W/ fraco) ou '*'."""
+    if not if_none_match: return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or any(t.removeprefix('W/') == etag for t in tags)
+
+def server_timing(timings):
+    """{'db_user_ms': 1.2, 'matches': 10} -> 'db_user;dur=1.2, matches;desc="10"' (cabeçalho Server-Timing)."""
+    parts = []
+    for name, value in timings.items():
+        if name.endswith('_ms'): parts.append(f"{name[:-3]};dur={value}")
+        else: parts.append(f'{name};desc="{value}"')
+    return ', '.join(parts)
+
+class ResponseCache:
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Entrada viva (não expirada) ou None. As versões são conferidas por quem chama."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, versions, ttl):
+        entry = CacheEntry(body, versions, ttl)
+        if len(body) > self.max_bytes: return entry  # Nunca cabe: serve sem guardar
+        with self._lock:
+            if key in self._entries: self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries: self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+    def _remove(self, key):
+        self._bytes -= len(self._entries.pop(key).body)
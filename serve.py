@@ -0,0 +1,151 @@
+import os
+import sys
+import gc
+import time
+import signal
+import socket
+import uvicorn
+
+sys.path.append(os.getcwd())
+import api
+from models.registry import RegistryWatcher
+from profiling import process_memory_mb
+from config import settings
+
+# Modo de produção com N workers (pré-fork):
+#   1. O master carrega o bundle do modelo UMA vez (booster XGBoost, arquétipos, calibração);
+#   2. gc.freeze() tira esses objetos da varredura do GC (senão ele escreve nos cabeçalhos e
+#      as páginas deixam de ser compartilhadas);
+#   3. fork() dos workers: as páginas do bundle são compartilhadas copy-on-write (só leitura);
+#   4. O master observa o registro; quando um ponteiro muda, carrega a versão nova e recicla os
+#      workers um a um (o novo sobe antes do antigo sair), mantendo o compartilhamento.
+# Cada worker tem o próprio event loop, pool asyncpg e cache de respostas.
+
+SERVE_DEFAULTS = {'host': '0.0.0.0', 'port': 8000, 'workers': 2, 'memory_report_s': 300, 'backlog': 2048}
+
+def serve_config():
+    return {**SERVE_DEFAULTS, **((settings.get('api') or {}).get('serve') or {})}
+
+def _bind(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(sock):
+    """Processo filho: herda o bundle e o socket; conexões de banco são sempre criadas aqui."""
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, signal.SIG_DFL)
+    import database
+    if database._engine is not None: database._engine.dispose(close=False)  # Não reusar conexões do master
+    database._async_engine = None
+    server = uvicorn.Server(uvicorn.Config(api.app, log_level='info', lifespan='on'))
+    server.run(sockets=[sock])
+
+def print_memory_report(master_pid, workers):
+    rows = [(master_pid, 'master')] + [(pid, f"worker {n}") for pid, n in sorted(workers.items(), key=lambda kv: kv[1])]
+    print(f"\n🧠 Memória por processo (MB):")
+    print(f"{'PID':>8} {'Papel':<10}{'RSS':>9}{'PSS':>9}{'Shared':>9}{'Private':>9}")
+    total_pss = 0.0
+    for pid, role in rows:
+        mem = process_memory_mb(pid)
+        total_pss += mem['pss'] or 0
+        fmt = lambda v: f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+        print(f"{pid:>8} {role:<10}{fmt(mem['rss'])}{fmt(mem['pss'])}{fmt(mem['shared'])}{fmt(mem['private'])}")
+    print(f"   Total PSS (consumo real): {total_pss:.1f} MB para {len(workers)} worker(s)")
+
+class PreforkServer:
+    def __init__(self, workers=None, host=None, port=None):
+        cfg = serve_config()
+        self.n_workers = int(workers or cfg['workers'])
+        self.host, self.port = host or cfg['host'], int(port or cfg['port'])
+        self.backlog, self.memory_report_s = cfg['backlog'], cfg['memory_report_s']
+        self.workers = {}   # pid -> número do slot
+        self.sock = None
+        self._stopping = False
+        self._recycle = False
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            try: _run_worker(self.sock)
+            finally: os._exit(0)
+        self.workers[pid] = slot
+        print(f"   👷 Worker {slot} no ar (pid {pid})")
+        return pid
+
+    def _on_change(self, pointer, version):
+        """Chamado pelo watcher no master: carrega a versão nova antes de reciclar os workers."""
+        print(f"🔄 {pointer} -> {version}: recarregando no master...")
+        api._on_registry_change(pointer, version)
+        gc.freeze()
+        self._recycle = True
+
+    def _recycle_workers(self):
+        """Troca gradual: sobe o substituto e só então encerra o worker antigo."""
+        self._recycle = False
+        for pid, slot in list(self.workers.items()):
+            self._spawn(slot)
+            self.workers.pop(pid, None)
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+    def _reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0: return
+            slot = self.workers.pop(pid, None)
+            if slot is not None and not self._stopping:
+                print(f"⚠️ Worker {slot} (pid {pid}) saiu com status {status}; subindo outro.")
+                self._spawn(slot)
+
+    def _stop(self, *_):
+        self._stopping = True
+
+    def run(self):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Modo pré-fork exige fork() (Linux/macOS). Use `python api.py` neste sistema.")
+        print(f"🚀 Servidor pré-fork: {self.n_workers} worker(s) em {self.host}:{self.port}")
+        api.preload_models()
+        gc.freeze()  # Objetos do bundle ficam fora do GC: páginas seguem compartilhadas após o fork
+        # Sem thread no master (fork com threads vivas é inseguro): o watcher roda no laço principal
+        watcher = RegistryWatcher(self._on_change)
+        self.sock = _bind(self.host, self.port, self.backlog)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.n_workers): self._spawn(slot)
+
+        last_poll = time.monotonic()
+        last_report = last_poll - self.memory_report_s + 15  # Primeiro relatório ~15s após subir (workers aquecidos)
+        try:
+            while not self._stopping:
+                time.sleep(0.5)
+                self._reap()
+                now = time.monotonic()
+                if now - last_poll >= watcher.poll_s:
+                    watcher.check()
+                    last_poll = now
+                if self._recycle: self._recycle_workers()
+                if self.memory_report_s and now - last_report >= self.memory_report_s:
+                    print_memory_report(os.getpid(), self.workers)
+                    last_report = now
+        finally:
+            print("🛑 Encerrando workers...")
+            for pid in list(self.workers):
+                try: os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError: pass
+            for pid in list(self.workers):
+                try: os.waitpid(pid, 0)
+                except ChildProcessError: pass
+            self.sock.close()
+
+def run_server(workers=None, host=None, port=None):
+    PreforkServer(workers=workers, host=host, port=port).run()
+
+if __name__ == "__main__":
+    run_server()
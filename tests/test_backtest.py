@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+import pandas as pd
+from models.backtest import patch_ordinal, patch_label, make_folds, fold_metrics, BACKTEST_DEFAULTS
+
+class TestBacktest(unittest.TestCase):
+
+    def test_patch_ordinal_sorts_numerically(self):
+        """Teste: 14.10 vem depois de 14.9 (ordem numérica, não de texto)"""
+        ords = patch_ordinal(pd.Series(['14.9.1.2', '14.10.3.4', None, 'x']))
+        self.assertEqual(ords.tolist(), [14009, 14010, -1, -1])
+        self.assertEqual(patch_label(14010), '14.10')
+
+    def test_patch_folds_order_rows_by_patch(self):
+        """Teste: por patch, linhas de patches fora de ordem no tempo vão para o fold certo"""
+        arrays = {'ts': np.arange(8), 'patch': np.array([1, 1, 2, 1, 2, 3, 3, -1])}
+        order, folds = make_folds(arrays, {**BACKTEST_DEFAULTS, 'by': 'patch', 'n_folds': 2})
+        self.assertEqual(order.tolist(), [0, 1, 3, 2, 4, 5, 6])
+        train_sl, valid_sl = folds[0]
+        self.assertEqual(set(arrays['patch'][order[train_sl]]), {1})
+        self.assertEqual(set(arrays['patch'][order[valid_sl]]), {2})
+
+    def test_fold_metrics_by_role(self):
+        y = np.array([1, 0, 1, 0])
+        probs = np.array([0.9, 0.2, 0.4, 0.6])
+        rows = {r['role']: r for r in fold_metrics(y, probs, np.array(['TOP', 'TOP', 'MIDDLE', 'MIDDLE']))}
+        self.assertEqual(rows['ALL']['n'], 4)
+        self.assertAlmostEqual(rows['ALL']['brier'], np.mean((probs - y) ** 2))
+        self.assertEqual(rows['TOP']['accuracy'], 1.0)
+        self.assertEqual(rows['MIDDLE']['accuracy'], 0.0)
+        self.assertEqual(rows['MIDDLE']['f1'], 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import argparse
+import contextlib
+import io
+import unittest
+from main import build_parser
+
+class TestCli(unittest.TestCase):
+
+    def test_help_renders_for_every_command(self):
+        """Teste: --help de cada subcomando formata sem erro (ex.: '%' sem escape no help)"""
+        parser = build_parser()
+        parser.format_help()
+        subparsers = next(a for a in parser._actions if isinstance(a, argparse._SubParsersAction))
+        self.assertGreater(len(subparsers.choices), 10)
+        for name, sub in subparsers.choices.items():
+            with self.subTest(command=name):
+                with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(SystemExit) as ctx:
+                    parser.parse_args([name, '--help'])
+                self.assertEqual(ctx.exception.code, 0)
+
+if __name__ == '__main__':
+    unittest.main()
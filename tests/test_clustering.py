@@ -0,0 +1,21 @@
+import unittest
+import numpy as np
+from models.clustering import align_clusters
+
+class TestArchetypeAlignment(unittest.TestCase):
+
+    def test_align_recovers_permutation(self):
+        """Teste: centróides embaralhados (e levemente deslocados) voltam aos IDs antigos"""
+        old = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0], [10.0, 10.0]])
+        new = old[[2, 0, 3, 1]] + 0.5
+        perm = align_clusters(new, old)
+        np.testing.assert_array_equal(perm, [1, 3, 0, 2])
+        np.testing.assert_allclose(new[perm], old + 0.5)
+
+    def test_extra_clusters_get_next_ids(self):
+        old = np.array([[0.0], [10.0]])
+        new = np.array([[20.0], [9.0], [1.0]])
+        self.assertEqual(align_clusters(new, old).tolist(), [2, 1, 0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from config import FEATURES_MODEL
+from models.explainability import top_contributions, format_attribution, stratified_reservoir_sample, patch_of
+
+class TestAttributions(unittest.TestCase):
+
+    def test_top_contributions_by_magnitude(self):
+        """Teste: top-k por |contribuição|, ordenado, com o viés separado"""
+        contribs = np.array([[0.1, -2.0, 0.5, 1.0, 0.3],
+                             [0.0, 0.2, -0.1, 0.05, -0.7]], dtype=np.float32)
+        idx, vals, base = top_contributions(contribs, 2)
+        np.testing.assert_array_equal(idx, [[1, 3], [1, 2]])
+        np.testing.assert_allclose(vals, [[-2.0, 1.0], [0.2, -0.1]])
+        np.testing.assert_allclose(base, [0.3, -0.7])
+        self.assertEqual(idx.dtype, np.int16)
+
+    def test_format_attribution(self):
+        out = format_attribution([1, 0], [-0.5, 0.25], 0.1, 0.42)
+        self.assertEqual([t['feature'] for t in out['top']], [FEATURES_MODEL[1], FEATURES_MODEL[0]])
+        self.assertEqual([t['direction'] for t in out['top']], ['down', 'up'])
+        self.assertIsNone(format_attribution(None, None, None))
+
+class TestShapSample(unittest.TestCase):
+
+    def test_patch_of(self):
+        out = patch_of(pd.Series(['14.3.562.1234', '15.1', None, 'x']))
+        self.assertEqual(list(out), ['14.3', '15.1', 'unknown', 'unknown'])
+
+    def test_reservoir_caps_each_stratum(self):
+        """Teste: no máximo k linhas por role x patch, de todos os blocos, reprodutível pela semente"""
+        def chunk(n, version, offset):
+            return pd.DataFrame({'match_id': [f"m{offset + i}" for i in range(n)], 'puuid': 'p',
+                                 'team_position': np.resize(['TOP', 'JUNGLE', 'UNKNOWN'], n),
+                                 'game_version': version, 'win': True, **{f: 0.0 for f in FEATURES_MODEL}})
+        chunks = lambda: [chunk(90, '14.1.1', 0), chunk(90, '14.2.7', 90), chunk(30, '14.1.3', 180)]
+        with mock.patch('models.explainability.prepare_data_for_ml', side_effect=lambda df: df):
+            sample, seen = stratified_reservoir_sample(chunks(), per_stratum=25, seed=7)
+            again, _ = stratified_reservoir_sample(chunks(), per_stratum=25, seed=7)
+        self.assertEqual(seen, 140)
+        self.assertEqual(sample.groupby(['team_position', 'patch']).size().to_dict(),
+                         {('JUNGLE', '14.1'): 25, ('JUNGLE', '14.2'): 25, ('TOP', '14.1'): 25, ('TOP', '14.2'): 25})
+        self.assertTrue(sample['match_id'].isin([f"m{i}" for i in range(180, 210)]).any())  # Último bloco também entra
+        pd.testing.assert_frame_equal(sample, again)
+
+if __name__ == '__main__':
+    unittest.main()
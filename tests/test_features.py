@@ -1,7 +1,10 @@
 import unittest
 import pandas as pd
 import numpy as np
-from features.engine import prepare_data_for_ml, calculate_zscore_by_group
+from config import FEATURES_MODEL
+from etl.synthetic import generate_matches
+from features.engine import (prepare_data_for_ml, calculate_zscore_by_group, group_moments, merge_moments,
+                             apply_global_zscores, apply_rolling_history)
 
 class TestFeatureEngineering(unittest.TestCase):
     
@@ -12,7 +15,15 @@ class TestFeatureEngineering(unittest.TestCase):
             'game_start_timestamp': [1000, 2000, 3000, 1000, 2000],
             'team_position': ['TOP', 'TOP', 'TOP', 'JUNGLE', 'JUNGLE'],
             'gold_velocity': [100, 120, 110, 50, 60], # Top ganha mais que JG neste exemplo
-            'win': [1, 0, 1, 0, 1]
+            'win': [1, 0, 1, 0, 1],
+            # Colunas mínimas exigidas pela engenharia de features
+            'kills': [3, 1, 5, 2, 4], 'deaths': [2, 4, 1, 3, 0], 'assists': [5, 2, 7, 6, 9],
+            'total_damage_dealt': [18000, 12000, 22000, 9000, 14000],
+            'damage_to_objectives': [6000, 2000, 9000, 15000, 21000],
+            'gold_diff_at_15': [500, -800, 1200, -300, 900], 'xp_diff_at_15': [300, -600, 900, -100, 400],
+            'cs_diff_at_15': [10, -25, 18, -5, 3], 'turret_plates_taken': [2, 0, 3, 0, 1],
+            'wards_killed_at_10': [1, 0, 2, 1, 3], 'vision_score': [20, 15, 25, 35, 40],
+            'neutral_minions_killed': [8, 4, 12, 160, 175], 'total_time_spent_dead': [60, 150, 30, 90, 0]
         })
 
     def test_shape_integrity(self):
@@ -34,12 +45,39 @@ class TestFeatureEngineering(unittest.TestCase):
         # O terceiro elemento (15) é exatamente a média dos tops. Z-Score deve ser 0.
         self.assertAlmostEqual(col_rel.iloc[2], 0, places=1)
 
+    def test_partition_matches_separate_processing(self):
+        """Teste: processar em lote com partition_col == processar cada partição sozinha"""
+        df = pd.concat([self.mock_data.assign(match_id='M1'), self.mock_data.assign(match_id='M2', gold_velocity=[10, 90, 40, 70, 20])],
+                       ignore_index=True)
+        batch = prepare_data_for_ml(df, partition_col='match_id')
+        separate = pd.concat([prepare_data_for_ml(g) for _, g in df.groupby('match_id')])
+        cols = ['cs_diff_at_15', 'lethality_efficiency_rel', 'recent_form', 'performance_stability']
+        pd.testing.assert_frame_equal(batch.loc[separate.index, cols], separate[cols])
+
     def test_no_missing_values(self):
         """Teste: O modelo final não pode ter NaNs"""
         processed = prepare_data_for_ml(self.mock_data)
         # Verifica as colunas geradas
         self.assertFalse(processed['recent_form'].isna().any())
-        self.assertFalse(processed['recent_volatility'].isna().any())
+        self.assertFalse(processed['performance_stability'].isna().any())
+
+class TestStreamingFeatures(unittest.TestCase):
+
+    def test_chunks_match_full_history(self):
+        """Teste: blocos com estatísticas globais + cauda das janelas == prepare_data_for_ml no histórico inteiro"""
+        perf, _, _ = generate_matches(150, seed=3)
+        perf = perf.sort_values('game_start_timestamp', kind='stable').reset_index(drop=True)
+        full = prepare_data_for_ml(perf)
+        chunks = [perf.iloc[i:i + 400] for i in range(0, len(perf), 400)]
+        moments = {}
+        for chunk in chunks:
+            moments = merge_moments(moments, group_moments(prepare_data_for_ml(chunk)))
+        tail, parts = None, []
+        for chunk in chunks:
+            df, tail = apply_rolling_history(prepare_data_for_ml(chunk), tail)
+            parts.append(apply_global_zscores(df, moments))
+        streamed = pd.concat(parts).loc[full.index]
+        np.testing.assert_allclose(streamed[FEATURES_MODEL].to_numpy(), full[FEATURES_MODEL].to_numpy(), atol=1e-9)
 
 if __name__ == '__main__':
     print("🧪 Iniciando Bateria de Testes...")
@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+import pandas as pd
+from models.monitoring import (MONITOR_DEFAULTS, reliability_delta, reliability_metrics, feature_edges,
+                               histogram_delta, psi, build_report)
+
+DAY_MS = 86_400_000
+
+class TestMonitorAggregates(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 2000
+        p = rng.uniform(0.05, 0.95, size=n)
+        self.df = pd.DataFrame({
+            'model_version': 'v1', 'game_start_timestamp': 1_700_000_000_000 + rng.integers(0, 3, size=n) * DAY_MS,
+            'team_position': rng.choice(['TOP', 'JUNGLE', 'UTILITY'], size=n),
+            'archetype_id': pd.array(rng.integers(-1, 3, size=n), dtype='Int16'),
+            'win': rng.uniform(size=n) < p, 'win_probability': p,
+            'win_probability_calibrated': np.clip(p + 0.05, 0, 1)})
+        self.df['archetype_id'] = self.df['archetype_id'].mask(self.df['archetype_id'] < 0)
+
+    def test_bins_reproduce_brier_and_ece(self):
+        bins = reliability_delta(self.df, n_bins=10)
+        overall = bins[(bins['scope'] == 'all') & (bins['prob_kind'] == 'raw')]
+        m = reliability_metrics(overall)
+        y, p = self.df['win'].astype(float), self.df['win_probability']
+        self.assertEqual(m['n'], len(self.df))
+        self.assertAlmostEqual(m['brier'], ((p - y) ** 2).mean(), places=10)
+        b = np.minimum(np.floor(p * 10), 9)
+        ece = sum(abs(p[b == k].sum() - y[b == k].sum()) for k in range(10)) / len(p)
+        self.assertAlmostEqual(m['ece'], ece, places=10)
+        # Arquétipo ausente não entra no escopo 'archetype'
+        arch = bins[(bins['scope'] == 'archetype') & (bins['prob_kind'] == 'raw')]
+        self.assertEqual(arch['n'].sum(), self.df['archetype_id'].notna().sum())
+
+    def test_histogram_and_psi(self):
+        df = self.df.assign(x=np.r_[np.random.default_rng(1).normal(size=len(self.df) - 10), [np.nan] * 10])
+        edges = {'x': feature_edges(df['x'], n_bins=10)}
+        self.assertEqual(len(edges['x']), 9)
+        hist = histogram_delta(df, edges)
+        self.assertEqual(hist['n'].sum(), len(df))
+        self.assertEqual(hist.loc[hist['bin'] == -1, 'n'].sum(), 10)
+        counts = hist.groupby('bin')['n'].sum()
+        self.assertAlmostEqual(psi(counts, counts), 0.0)
+        shifted = counts.copy()
+        shifted.iloc[-1] *= 10
+        self.assertGreater(psi(counts, shifted), 0.25)
+
+    def test_report_alerts_on_drift(self):
+        bins = reliability_delta(self.df, n_bins=10)
+        rel = bins.assign(bucket=bins['period'], is_reference=bins['period'] == bins['period'].min())
+        first, last = rel['bucket'].min(), rel['bucket'].max()
+        hist = pd.DataFrame({'bucket': [first, first, last, last], 'is_reference': [True, True, False, False],
+                             'feature': 'x', 'bin': [0, 1, 0, 1], 'n': [500, 500, 950, 50]})
+        cfg = {**MONITOR_DEFAULTS, 'min_rows': 100, 'ece_max': 0.02}
+        metrics, drift, alerts = build_report(rel, hist, cfg)
+        self.assertEqual(set(metrics['prob_kind']), {'raw', 'calibrated'})
+        self.assertAlmostEqual(drift.loc[drift['bucket'] == first, 'psi'].iloc[0], 0.0)
+        self.assertTrue(any(a.startswith('ECE') for a in alerts))
+        self.assertTrue(any(a.startswith('PSI') for a in alerts))
+
+if __name__ == '__main__':
+    unittest.main()
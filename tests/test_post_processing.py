@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import pandas as pd
+from features.post_processing import calculate_ai_score, rank_labels, feedback_texts
+
+def _rank_reference(score):
+    """Versão linha a linha original (apply) usada como referência."""
+    if score >= 85: return 'S+'
+    if score >= 75: return 'S'
+    if score >= 65: return 'A'
+    if score >= 55: return 'B'
+    if score >= 45: return 'C'
+    if score >= 30: return 'D'
+    return 'F'
+
+def _feedback_reference(score, is_win):
+    if score >= 80: return "MVP / SVP: Performance de elite."
+    elif score >= 65: return "Muito bom: Impacto positivo consistente."
+    elif score >= 50: return "Na média: Cumpriu sua função."
+    elif score >= 40:
+        if is_win: return "Carregado: Vitória apesar do desempenho."
+        else: return "Abaixo da média: Dificuldade na partida."
+    return "Crítico: Precisa rever fundamentos (Farm/Mortes)."
+
+class TestPostProcessing(unittest.TestCase):
+
+    def setUp(self):
+        # Bordas exatas das faixas + valores quebrados + score ausente
+        self.scores = np.array([0, 29.9, 30, 39.9, 40, 44.9, 45, 50, 55, 64.9, 65, 75, 79.9, 80, 85, 100, np.nan])
+        self.wins = np.array([True, False] * 8 + [True])
+
+    def test_rank_labels_match_reference(self):
+        """Teste: searchsorted dá o mesmo rank do if/elif, inclusive nas bordas"""
+        expected = [_rank_reference(s) for s in self.scores]
+        self.assertEqual(list(rank_labels(self.scores)), expected)
+
+    def test_feedback_texts_match_reference(self):
+        expected = [_feedback_reference(s, w) for s, w in zip(self.scores, self.wins)]
+        self.assertEqual(list(feedback_texts(self.scores, self.wins)), expected)
+
+    def test_calculate_ai_score_outputs_categoricals(self):
+        df = pd.DataFrame({'win_probability': [0.9, 0.1], 'win': [True, False], 'gold_diff_at_15': [2000, -3000],
+                           'kda': [8.0, 0.5], 'dpm': [700, 300], 'deaths': [1, 12]})
+        out = calculate_ai_score(df)
+        self.assertEqual(str(out['ai_rank'].dtype), 'category')
+        self.assertEqual(list(out['ai_rank']), [_rank_reference(s) for s in out['ai_score']])
+        self.assertEqual(list(out['ai_rating_text']), [_feedback_reference(s, w) for s, w in zip(out['ai_score'], df['win'])])
+
+if __name__ == '__main__':
+    unittest.main()
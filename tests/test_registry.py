@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from config import settings
+from models import registry
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._previous = settings['model'].get('registry')
+        settings['model']['registry'] = {'dir': self.tmp}
+
+    def tearDown(self):
+        if self._previous is None: settings['model'].pop('registry', None)
+        else: settings['model']['registry'] = self._previous
+        shutil.rmtree(self.tmp)
+
+    def test_publish_promote_and_shadow(self):
+        """Teste: versões sequenciais, ponteiros e promoção do SHADOW"""
+        v1 = registry.publish_bundle(promote=True)
+        v2 = registry.publish_bundle(shadow=True)
+        self.assertEqual((v1, v2), ('v001', 'v002'))
+        self.assertEqual(registry.get_pointer('CURRENT'), v1)
+        registry.promote_version()
+        self.assertEqual(registry.get_pointer('CURRENT'), v2)
+        self.assertIsNone(registry.get_pointer('SHADOW'))
+
+    def test_fingerprint_matches_working_artifacts(self):
+        """Teste: mesma chave de cache do coach com ou sem registro"""
+        v1 = registry.publish_bundle()
+        working = registry.artifacts_fingerprint([path for path, _ in registry.BUNDLE_FILES.values()])
+        self.assertEqual(registry.read_manifest(v1)['fingerprint'], working)
+
+    def test_corrupted_bundle_is_rejected(self):
+        v1 = registry.publish_bundle()
+        with open(os.path.join(self.tmp, v1, 'model.pkl'), 'ab') as f:
+            f.write(b'x')
+        with self.assertRaises(ValueError):
+            registry.verify_bundle(v1)
+        with self.assertRaises(ValueError):
+            registry.promote_version(v1)
+
+    def test_watcher_reports_pointer_changes(self):
+        changes = []
+        watcher = registry.RegistryWatcher(lambda name, version: changes.append((name, version)))
+        v1 = registry.publish_bundle(promote=True)
+        watcher.check()
+        watcher.check()  # Sem mudança: não repete
+        self.assertEqual(changes, [('CURRENT', v1)])
+
+    def test_native_artifacts_match_pickle(self):
+        """Teste: arquétipos e calibração em .npz dão o mesmo resultado que o pickle"""
+        v1 = registry.publish_bundle()
+        native = registry.load_bundle(v1, parts=['archetypes', 'calibration'])
+        settings['model']['registry']['native'] = False
+        pickled = registry.load_bundle(v1, parts=['archetypes', 'calibration'])
+        self.assertEqual(native['formats'], {'archetypes': 'native', 'calibration': 'native'})
+        self.assertEqual(pickled['formats'], {'archetypes': 'pickle', 'calibration': 'pickle'})
+
+        arch_n, arch_p = native['archetypes'], pickled['archetypes']
+        X = np.random.default_rng(0).normal(size=(200, arch_p['scaler'].n_features_in_))
+        Z_n = arch_n['pca'].transform(arch_n['scaler'].transform(X))
+        Z_p = arch_p['pca'].transform(arch_p['scaler'].transform(X))
+        np.testing.assert_allclose(Z_n, Z_p, atol=1e-9)
+        np.testing.assert_array_equal(arch_n['kmeans'].predict(Z_p), arch_p['kmeans'].predict(Z_p))
+
+        for key, head in pickled['calibration'].items():
+            H = np.random.default_rng(1).normal(size=(50, head.coef_.shape[1]))
+            np.testing.assert_allclose(native['calibration'][key].predict_proba(H), head.predict_proba(H), atol=1e-9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import time
+import unittest
+from response_cache import ResponseCache, etag_matches, server_timing
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_lru_bound_by_entries_and_bytes(self):
+        """Teste: estourou o limite, sai o menos usado recentemente"""
+        cache = ResponseCache(max_entries=2, max_bytes=10)
+        cache.put('a', b'1234', {}, ttl=60)
+        cache.put('b', b'1234', {}, ttl=60)
+        cache.get('a')                       # 'a' passa a ser o mais recente
+        cache.put('c', b'1234', {}, ttl=60)  # 3 entradas / 12 bytes -> remove 'b'
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertLessEqual(cache.stats()['bytes'], 10)
+
+    def test_ttl_expires(self):
+        cache = ResponseCache()
+        cache.put('k', b'{}', {'global': 1}, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('k'))
+
+    def test_etag_follows_body(self):
+        """Teste: mesmo corpo -> mesmo ETag; If-None-Match aceita lista, W/ e '*'"""
+        cache = ResponseCache()
+        e1 = cache.put('k1', b'[1]', {}, ttl=60)
+        e2 = cache.put('k2', b'[1]', {}, ttl=60)
+        self.assertEqual(e1.etag, e2.etag)
+        self.assertNotEqual(e1.etag, cache.put('k3', b'[2]', {}, ttl=60).etag)
+        self.assertTrue(etag_matches(f'"x", W/{e1.etag}', e1.etag))
+        self.assertTrue(etag_matches('*', e1.etag))
+        self.assertFalse(etag_matches(None, e1.etag))
+
+    def test_server_timing_header(self):
+        self.assertEqual(server_timing({'db_user_ms': 1.5, 'matches': 10}), 'db_user;dur=1.5, matches;desc="10"')
+
+if __name__ == '__main__':
+    unittest.main()
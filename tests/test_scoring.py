@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from sklearn.decomposition import PCA
+from sklearn.cluster import KMeans
+from sklearn.linear_model import LogisticRegression
+from config import FEATURES_MODEL
+from models.native_artifacts import save_native, load_native
+from models.scoring import ScoringBundle, STYLE_FEATURES, CALIBRATION_FEATURES
+
+class _ConstantModel:
+    """Modelo base fake: probabilidade conhecida por linha."""
+    def __init__(self, probs): self.probs = probs
+    def predict_proba(self, X): return np.column_stack([1 - self.probs, self.probs])
+
+class TestScoringBundle(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 400
+        self.df = pd.DataFrame(rng.gamma(2.0, 100.0, size=(n, len(STYLE_FEATURES))), columns=STYLE_FEATURES)
+        for col in CALIBRATION_FEATURES[1:] + FEATURES_MODEL: self.df[col] = rng.normal(size=n)
+        self.probs = rng.uniform(0.05, 0.95, size=n)
+        self.df['win'] = rng.uniform(size=n) < self.probs
+        scaler = StandardScaler().fit(self.df[STYLE_FEATURES])
+        pca = PCA(n_components=3, random_state=0).fit(scaler.transform(self.df[STYLE_FEATURES]))
+        kmeans = KMeans(n_clusters=4, n_init=3, random_state=0).fit(pca.transform(scaler.transform(self.df[STYLE_FEATURES])))
+        self.pipe = {'scaler': scaler, 'pca': pca, 'kmeans': kmeans, 'labels': {i: f"C{i}" for i in range(4)}}
+        arch = kmeans.labels_
+        X_cal = self.df[CALIBRATION_FEATURES[1:]].assign(xgb_prob=self.probs)[CALIBRATION_FEATURES]
+        # Cabeças para 3 dos 4 arquétipos: o último cai na probabilidade bruta
+        self.heads = {a: LogisticRegression().fit(X_cal[arch == a], self.df['win'][arch == a]) for a in range(3)}
+        self.X_cal, self.arch = X_cal, arch
+
+    def _reference(self):
+        X_style = self.df[STYLE_FEATURES]
+        arch = self.pipe['kmeans'].predict(self.pipe['pca'].transform(self.pipe['scaler'].transform(X_style)))
+        expected = self.probs.copy()
+        for a, head in self.heads.items():
+            expected[arch == a] = head.predict_proba(self.X_cal[arch == a])[:, 1]
+        return arch, expected
+
+    def test_fused_matches_sequential_pipeline(self):
+        """Teste: afim (scaler+PCA) + cabeças empilhadas == cadeia original do sklearn"""
+        scored = ScoringBundle(_ConstantModel(self.probs), self.pipe, self.heads).predict(self.df)
+        arch, expected = self._reference()
+        np.testing.assert_array_equal(scored['archetype_id'], arch)
+        np.testing.assert_allclose(scored['win_probability_calibrated'], expected, rtol=1e-9)
+        np.testing.assert_allclose(scored['win_probability'], self.probs)
+
+    def test_native_artifacts_score_the_same(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            save_native('archetypes', self.pipe, os.path.join(tmp, 'a.npz'))
+            save_native('calibration', self.heads, os.path.join(tmp, 'c.npz'))
+            native = ScoringBundle(_ConstantModel(self.probs), load_native('archetypes', os.path.join(tmp, 'a.npz')),
+                                   load_native('calibration', os.path.join(tmp, 'c.npz'))).predict(self.df)
+        pickled = ScoringBundle(_ConstantModel(self.probs), self.pipe, self.heads).predict(self.df)
+        pd.testing.assert_frame_equal(native, pickled)
+
+    def test_model_only_passes_raw_probability(self):
+        scored = ScoringBundle.wrap(_ConstantModel(self.probs)).predict(self.df)
+        self.assertTrue((scored['archetype_id'] == -1).all())
+        np.testing.assert_allclose(scored['win_probability_calibrated'], self.probs)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from models.splits import rolling_origin_folds, temporal_holdout_index, patch_folds
+
+class TestTemporalSplits(unittest.TestCase):
+
+    def setUp(self):
+        # 10 jogadores por partida -> timestamps repetidos em blocos de 10
+        self.ts = np.repeat(np.arange(100), 10)
+
+    def test_folds_only_look_at_the_past(self):
+        """Teste: cada fold treina só com partidas anteriores à sua validação"""
+        folds = rolling_origin_folds(self.ts, n_folds=3, valid_size=0.1)
+        self.assertEqual(len(folds), 3)
+        for train_sl, valid_sl in folds:
+            self.assertEqual(train_sl.stop, valid_sl.start)
+            self.assertLess(self.ts[train_sl].max(), self.ts[valid_sl].min())
+        # Janela de treino expansiva e última validação termina no fim dos dados
+        self.assertLess(folds[0][0].stop, folds[1][0].stop)
+        self.assertEqual(folds[-1][1].stop, len(self.ts))
+
+    def test_cut_never_splits_a_match(self):
+        """Teste: o corte cai na fronteira de timestamp mesmo com fração 'quebrada'"""
+        for train_sl, valid_sl in rolling_origin_folds(self.ts, n_folds=4, valid_size=0.137):
+            self.assertEqual(valid_sl.start % 10, 0)
+
+    def test_sliding_window_keeps_train_size(self):
+        """Teste: no sliding a janela de treino anda junto com a validação"""
+        folds = rolling_origin_folds(self.ts, n_folds=3, valid_size=0.1, window='sliding', train_size=0.3)
+        for train_sl, valid_sl in folds:
+            self.assertEqual(train_sl.stop, valid_sl.start)
+            self.assertEqual(train_sl.stop - train_sl.start, 300)
+        self.assertLess(folds[0][0].start, folds[1][0].start)
+
+    def test_patch_folds(self):
+        """Teste: cada patch recente é validado com os patches anteriores"""
+        patches = np.repeat([15001, 15002, 15003, 15004, 15005], 20)
+        folds = patch_folds(patches, n_folds=2)
+        self.assertEqual([(t.start, t.stop, v.start, v.stop) for t, v in folds], [(0, 60, 60, 80), (0, 80, 80, 100)])
+        sliding = patch_folds(patches, n_folds=2, window='sliding', train_patches=1)
+        self.assertEqual([(t.start, t.stop) for t, _ in sliding], [(40, 60), (60, 80)])
+        with self.assertRaises(ValueError):
+            patch_folds(patches, n_folds=5)
+
+    def test_invalid_inputs(self):
+        with self.assertRaises(ValueError):
+            rolling_origin_folds(self.ts[::-1], n_folds=3)
+        with self.assertRaises(ValueError):
+            rolling_origin_folds(self.ts, n_folds=8, valid_size=0.1, min_train_size=0.4)
+
+    def test_holdout_matches_train_model(self):
+        self.assertEqual(temporal_holdout_index(1000, 0.2), 800)
+
+if __name__ == '__main__':
+    unittest.main()
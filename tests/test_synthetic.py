@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+from etl.synthetic import generate_matches, ROLES
+from features.engine import prepare_data_for_ml
+from config import FEATURES_MODEL
+
+class TestSyntheticGenerator(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.perf, cls.kills, cls.teams = generate_matches(200, seed=7)
+
+    def test_match_structure(self):
+        """Teste: 10 participantes por partida, 5 por time, uma role de cada por time"""
+        self.assertEqual(len(self.perf), 2000)
+        per_match = self.perf.groupby('match_id').size()
+        self.assertTrue((per_match == 10).all())
+        per_team_role = self.perf.groupby(['match_id', 'team_id', 'team_position']).size()
+        self.assertTrue((per_team_role == 1).all())
+        self.assertEqual(set(self.perf['team_position']), set(ROLES))
+        # Ninguém joga duas vezes a mesma partida
+        self.assertFalse(self.perf.duplicated(['match_id', 'puuid']).any())
+
+    def test_lane_pairing_is_antisymmetric(self):
+        """Teste: o diff de ouro de um jogador é o negativo do diff do oponente de rota"""
+        pivot = self.perf.pivot_table(index=['match_id', 'team_position'], columns='team_id', values='gold_diff_at_15')
+        np.testing.assert_array_equal(pivot[100].values, -pivot[200].values)
+
+    def test_one_winner_per_match(self):
+        wins = self.perf.groupby(['match_id', 'team_id'])['win'].all().groupby('match_id').sum()
+        self.assertTrue((wins == 1).all())
+        self.assertTrue((self.teams.groupby('match_id')['win'].sum() == 1).all())
+
+    def test_kill_events_match_kda(self):
+        """Teste: K/D da performance batem com a tabela de eventos"""
+        kills_by_player = self.kills.groupby('killer_puuid').size()
+        deaths_by_player = self.kills.groupby('victim_puuid').size()
+        totals = self.perf.groupby('puuid')[['kills', 'deaths']].sum()
+        self.assertTrue((kills_by_player == totals['kills'].loc[kills_by_player.index]).all())
+        self.assertTrue((deaths_by_player == totals['deaths'].loc[deaths_by_player.index]).all())
+        self.assertFalse(self.kills['death_id'].duplicated().any())
+
+    def test_seed_is_deterministic(self):
+        again, _, _ = generate_matches(200, seed=7)
+        self.assertTrue(again.equals(self.perf))
+
+    def test_feature_pipeline_runs(self):
+        """Teste: o dataset sintético tem as colunas que a engenharia de features exige"""
+        processed = prepare_data_for_ml(self.perf)
+        self.assertEqual(len(processed), len(self.perf))
+        self.assertFalse(processed[FEATURES_MODEL].isna().any().any())
+
+if __name__ == '__main__':
+    unittest.main()